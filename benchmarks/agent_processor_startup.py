@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Profile the cold start of the agent processor Lambda with `python -X importtime`.
+
+Each run starts a fresh interpreter and measures
+- init ms: `import agent_processor` (what Lambda runs in the INIT phase), and
+- runtime ms: get_agent_runtime(), i.e. importing strands and creating the Bedrock model and tools,
+  which the handler now loads in the background during the first invocation instead of during INIT.
+
+It then lists the imports with the largest cumulative import time for each phase,
+taken from the -X importtime output of the last run.
+Run it in an environment with the Lambda's dependencies installed (boto3 and lambda/webbackend/requirements.txt).
+No AWS calls are made; the environment variables below only need to be set to any value.
+
+Usage:
+    python benchmarks/agent_processor_startup.py [--runs 5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+WEBBACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "webbackend")
+# The agent processor imports athena_executor from its Lambda layer
+ATHENA_EXECUTOR_LAYER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "layers", "athena_executor")
+
+ENVIRONMENT = {
+    "ATHENA_DATABASE": "c360",
+    "ATHENA_OUTPUT_LOCATION": "s3://startup-benchmark/athena/",
+    "ATHENA_WORKGROUP": "primary",
+    "SESSION_TABLE": "startup-benchmark-sessions",
+    "AWS_DEFAULT_REGION": "us-west-2",
+}
+
+PHASE_MARKER = "--- agent runtime ---"
+
+SCRIPT = f"""
+import sys, time
+started = time.perf_counter()
+import agent_processor
+init_ms = (time.perf_counter() - started) * 1000
+sys.stderr.write("{PHASE_MARKER}\\n")
+started = time.perf_counter()
+agent_processor.get_agent_runtime()
+runtime_ms = (time.perf_counter() - started) * 1000
+print(f"{{init_ms:.1f}} {{runtime_ms:.1f}}")
+"""
+
+
+def parse_importtime(lines: list) -> list:
+    """
+    Imports as (cumulative ms, module) from -X importtime lines, for the top-level imports and the
+    modules they import directly (agent_processor itself is left out, its imports are listed instead).
+    """
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        # Nested imports are indented by two spaces per level under the module that imported them
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        if depth <= 1 and name.strip() != "agent_processor":
+            imports.append((int(cumulative_us) / 1000, name.strip()))
+    return imports
+
+
+def run_once() -> tuple:
+    env = {**os.environ, **ENVIRONMENT}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ATHENA_EXECUTOR_LAYER, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT], cwd=WEBBACKEND, env=env, capture_output=True, text=True, check=True
+    )
+    init_ms, runtime_ms = (float(value) for value in result.stdout.split())
+    stderr = result.stderr.splitlines()
+    marker = stderr.index(PHASE_MARKER)
+    return init_ms, runtime_ms, stderr[:marker], stderr[marker + 1 :]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of imports listed per phase")
+    args = parser.parse_args()
+
+    init_times, runtime_times = [], []
+    for _ in range(args.runs):
+        init_ms, runtime_ms, init_lines, runtime_lines = run_once()
+        init_times.append(init_ms)
+        runtime_times.append(runtime_ms)
+
+    print(f"{'phase':<10} {'median ms':>10} {'max ms':>8}")
+    print(f"{'init':<10} {statistics.median(init_times):>10.1f} {max(init_times):>8.1f}")
+    print(f"{'runtime':<10} {statistics.median(runtime_times):>10.1f} {max(runtime_times):>8.1f}")
+
+    for label, lines in (("init", init_lines), ("runtime", runtime_lines)):
+        print(f"\nSlowest imports during {label} (last run):")
+        for cumulative_ms, name in sorted(parse_importtime(lines), reverse=True)[: args.top]:
+            print(f"  {cumulative_ms:>8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
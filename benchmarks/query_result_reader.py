@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Compare reading and formatting an Athena result through the GetQueryResults JSON API
+(one {"VarCharValue": ...} dict per cell) with streaming the result CSV into column arrays.
+
+S3 and the Athena API are simulated in memory, so only the client-side parsing
+and formatting cost is measured (network time is excluded for both paths).
+
+Usage:
+    python benchmarks/query_result_reader.py [--rows 300] [--columns 50] [--repeat 50]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "webbackend"))
+
+from result_reader import read_result_columns  # noqa: E402
+
+
+class InMemoryS3:
+    """Serves ranged GETs of a single object."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = map(int, Range.replace("bytes=", "").split("-"))
+        chunk = self.data[start : end + 1]
+        return {"Body": io.BytesIO(chunk), "ContentRange": f"bytes {start}-{start + len(chunk) - 1}/{len(self.data)}"}
+
+
+def build_result(rows: int, columns: int) -> tuple:
+    """Build the same result as a GetQueryResults JSON payload and as an Athena CSV file."""
+    header = [f"column_{c}" for c in range(columns)]
+    values = [[f"value-{r}-{c}" if c % 7 else str(r * c) for c in range(columns)] for r in range(rows)]
+
+    api_rows = [{"Data": [{"VarCharValue": name} for name in header]}]
+    api_rows.extend({"Data": [{"VarCharValue": value} for value in row]} for row in values)
+    api_payload = json.dumps({"ResultSet": {"Rows": api_rows}})
+
+    lines = [",".join(f'"{name}"' for name in header)]
+    lines.extend(",".join(f'"{value}"' for value in row) for row in values)
+    csv_payload = ("\n".join(lines) + "\n").encode("utf-8")
+    return api_payload, csv_payload
+
+
+def format_from_api(api_payload: str) -> str:
+    """The previous implementation: decode the API response and loop over the per-cell dicts."""
+    rows = json.loads(api_payload)["ResultSet"]["Rows"]
+    output = [" | ".join(col["VarCharValue"] for col in rows[0]["Data"])]
+    for row in rows[1:]:
+        output.append(" | ".join(col.get("VarCharValue", "NULL") for col in row["Data"]))
+    return "\n".join(output)
+
+
+def format_from_csv(s3: InMemoryS3, max_rows: int) -> str:
+    """The streaming implementation: parse the CSV into column arrays and join rows."""
+    results = read_result_columns(s3, "s3://bucket/result.csv", max_rows)
+    output = [" | ".join(results["columns"])]
+    for row in zip(*results["data"]):
+        output.append(" | ".join("NULL" if value is None else value for value in row))
+    return "\n".join(output)
+
+
+def measure(func, repeat: int) -> tuple:
+    """Return the mean time in milliseconds and the peak allocated KiB of one call."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    api_payload, csv_payload = build_result(args.rows, args.columns)
+    s3 = InMemoryS3(csv_payload)
+    assert format_from_api(api_payload) == format_from_csv(s3, args.rows)
+
+    api_ms, api_kib = measure(lambda: format_from_api(api_payload), args.repeat)
+    csv_ms, csv_kib = measure(lambda: format_from_csv(s3, args.rows), args.repeat)
+
+    print(f"result: {args.rows} rows x {args.columns} columns (JSON {len(api_payload) // 1024} KiB, CSV {len(csv_payload) // 1024} KiB)")
+    print(f"{'reader':<18} {'time (ms)':>10} {'peak (KiB)':>11}")
+    print(f"{'GetQueryResults':<18} {api_ms:>10.2f} {api_kib:>11.0f}")
+    print(f"{'CSV column arrays':<18} {csv_ms:>10.2f} {csv_kib:>11.0f}")
+    print(f"speedup: {api_ms / csv_ms:.1f}x, memory: {api_kib / csv_kib:.1f}x less")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Report the estimated token count of typical execute_sql_query results with the previous
+" | " table formatting versus the token-budgeted result encoder (table, tsv and columnar modes).
+
+The results are built from the same value distributions as dbloader/gen_testdata.py
+(customer_master, and purchase_history joined with item_master).
+
+Usage:
+    python benchmarks/result_encoding_tokens.py [--rows 299] [--budget 4000]
+"""
+import argparse
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "lambda", "webbackend"))
+sys.path.insert(0, os.path.join(ROOT, "dbloader"))
+
+from gen_testdata import clothing_prefixes, clothing_styles, clothing_types, first_names, last_names  # noqa: E402
+from result_encoder import ENCODING_MODES, encode_result  # noqa: E402
+from tokenutils import estimate_tokens  # noqa: E402
+
+
+def unixtime(days: int) -> str:
+    return str(int((datetime.now() - timedelta(days=random.randint(0, days))).timestamp()))
+
+
+def customers(rows: int) -> tuple:
+    """SELECT * FROM customer_master WHERE gender = 'female'"""
+    data = []
+    for _ in range(rows):
+        first, last = random.choice(first_names), random.choice(last_names)
+        data.append([str(uuid.uuid4()), f"{first.lower()}.{last.lower()}@example.com", first, last, "female",
+                     str(random.randint(18, 80)), unixtime(365)])
+    return ["customer_id", "email", "firstname", "lastname", "gender", "age", "created_at"], data
+
+
+def purchases(rows: int) -> tuple:
+    """
+    SELECT p.customer_id, p.item_id, i.item_name, i.item_category, i.item_style, i.price, p.purchase_date
+    FROM purchase_history p JOIN item_master i ON p.item_id = i.item_id ORDER BY p.customer_id
+    """
+    buyers = sorted(str(uuid.uuid4()) for _ in range(rows // 4 + 1))
+    items = {}
+    for item_id in range(1, 501):
+        item_type = random.choice(clothing_types)
+        items[item_id] = [f"{random.choice(clothing_prefixes)}{item_type} {random.randint(100, 999)}", item_type,
+                          random.choice(clothing_styles), str(random.randint(3000, 50000))]
+    data = []
+    for customer_id in sorted(random.choice(buyers) for _ in range(rows)):
+        item_id = random.randint(1, 500)
+        data.append([customer_id, str(item_id), *items[item_id], unixtime(365)])
+    return ["customer_id", "item_id", "item_name", "item_category", "item_style", "price", "purchase_date"], data
+
+
+def format_previous(columns: list, rows: list) -> str:
+    """The previous formatting: every value of every row joined with " | " under a dashed header line."""
+    header = " | ".join(columns)
+    lines = [header, "-" * len(header)]
+    lines.extend(" | ".join("NULL" if value is None else value for value in row) for row in rows)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=299, help="rows per result (299 is the largest result shown in full)")
+    parser.add_argument("--budget", type=int, default=4000, help="token budget of the encoder")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    unlimited = 10**9
+    print(f"{'result':<18} {'encoding':<22} {'tokens':>7} {'saved':>6}  elided")
+    for name, build in (("customer_master", customers), ("purchase_history", purchases)):
+        columns, rows = build(args.rows)
+        data = [list(column) for column in zip(*rows)]
+        baseline = estimate_tokens(format_previous(columns, rows))
+        print(f"{name:<18} {'previous table':<22} {baseline:>7} {'-':>6}")
+        for mode in ENCODING_MODES:
+            for budget in (unlimited, args.budget):
+                text = encode_result(columns, data, budget, mode)
+                tokens = estimate_tokens(text)
+                label = f"{mode} (no budget)" if budget == unlimited else f"{mode} ({budget})"
+                elided = "rows omitted" if "omitted to fit the token budget" in text else ("values cut" if "Values cut" in text else "none")
+                print(f"{'':<18} {label:<22} {tokens:>7} {1 - tokens / baseline:>6.0%}  {elided}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Report the estimated system prompt token count for the table information,
+with the full schema of every table versus the relevance-pruned schema (BM25 top-k).
+
+Usage:
+    python benchmarks/schema_prompt_tokens.py [--extra-tables 40] [--top-k 6]
+    python benchmarks/schema_prompt_tokens.py --snapshot schema-cache.json
+
+--snapshot takes a schema cache snapshot downloaded from
+s3://<athena result bucket>/schema-cache/<database>.json to benchmark a real catalog.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "webbackend"))
+
+from schema_cache import render_table_schema  # noqa: E402
+from schema_retrieval import BM25Index, build_retrieval_query  # noqa: E402
+from tokenutils import estimate_tokens  # noqa: E402
+
+CORE_TABLES = {
+    "customer_master": (
+        "メインブランドの顧客マスターデータ。顧客の基本情報を含む",
+        [("customer_id", "string", "メインブランドシステムにおける顧客のID"), ("email", "string", "顧客のメールアドレス"),
+         ("firstname", "string", "顧客の名前"), ("lastname", "string", "顧客の姓"), ("gender", "string", "顧客の性別"),
+         ("age", "int", "顧客の年齢（年単位）"), ("created_at", "int", "顧客レコードが作成されたUNIXタイムスタンプ")],
+    ),
+    "item_master": (
+        "メインブランドの商品カタログ。商品の詳細と価格情報を含む。服を取り扱う",
+        [("item_id", "string", "商品ID"), ("item_name", "string", "商品名"), ("category", "string", "商品カテゴリ"),
+         ("price", "int", "商品の価格（円）")],
+    ),
+    "purchase_history": (
+        "メインブランドからの顧客購入取引記録",
+        [("purchase_id", "string", "購入ID"), ("customer_id", "string", "購入した顧客のID"), ("item_id", "string", "購入した商品のID"),
+         ("quantity", "int", "購入数量"), ("purchase_date", "int", "購入日時のUNIXタイムスタンプ")],
+    ),
+    "integrated_customer": (
+        "メインブランドとサブブランドの顧客レコード間のエンティティ解決から得られた統合顧客データ",
+        [("RecordId", "string", "元の顧客レコードのID"), ("MatchID", "string", "統合後の顧客ID"), ("email", "string", "顧客のメールアドレス"),
+         ("ConfidenceLevel", "string", "マッチングの信頼度スコア（0-1）")],
+    ),
+}
+
+SYNTHETIC_SUBJECTS = ["店舗来店ログ", "キャンペーン配信", "ポイント履歴", "問い合わせ", "返品", "在庫", "アプリ閲覧", "メール開封", "クーポン利用", "会員ランク"]
+
+QUESTIONS = [
+    "30代女性の顧客は何人いますか？",
+    "先月最も売れた商品カテゴリのトップ5を教えてください",
+    "メインブランドとサブブランドの両方で購入している統合顧客の数は？",
+    "クーポン利用が多い会員ランクはどれですか？",
+]
+
+
+def synthetic_table(index: int) -> dict:
+    """Build a Glue-like table definition for a synthetic table."""
+    rng = random.Random(index)
+    subject = SYNTHETIC_SUBJECTS[index % len(SYNTHETIC_SUBJECTS)]
+    columns = [{"Name": "customer_id", "Type": "string", "Comment": "顧客のID"}]
+    for col in range(rng.randint(8, 20)):
+        columns.append({"Name": f"attribute_{col}", "Type": rng.choice(["string", "bigint", "double"]), "Comment": f"{subject}の属性{col}"})
+    return {
+        "Name": f"ext_table_{index:03d}",
+        "Description": f"{subject}に関するデータ（データソース{index}）",
+        "StorageDescriptor": {"Columns": columns},
+        "Parameters": {"classification": "parquet"},
+    }
+
+
+def build_catalog(extra_tables: int) -> dict:
+    """Render the core sample tables plus synthetic tables, keyed by table name."""
+    tables = []
+    for name, (description, columns) in CORE_TABLES.items():
+        tables.append(
+            {
+                "Name": name,
+                "Description": description,
+                "StorageDescriptor": {"Columns": [{"Name": c, "Type": t, "Comment": comment} for c, t, comment in columns]},
+            }
+        )
+    tables.extend(synthetic_table(i) for i in range(extra_tables))
+    return {table["Name"]: render_table_schema(table) for table in tables}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--extra-tables", type=int, default=40, help="number of synthetic tables added to the sample tables")
+    parser.add_argument("--top-k", type=int, default=6, help="number of table schemas kept in the prompt")
+    parser.add_argument("--snapshot", help="schema cache snapshot JSON to use instead of the synthetic catalog")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        with open(args.snapshot, encoding="utf-8") as f:
+            schemas = json.load(f)["schemas"]
+    else:
+        schemas = build_catalog(args.extra_tables)
+
+    full_tokens = estimate_tokens("\n".join(schemas.values()))
+    index = BM25Index(schemas)
+
+    print(f"tables: {len(schemas)}, top_k: {args.top_k}")
+    print(f"full schema tokens: {full_tokens}")
+    print(f"{'pruned':>8} {'saving':>7}  question / selected tables")
+    for question in QUESTIONS:
+        selected = index.top_k(build_retrieval_query(question, []), args.top_k)
+        pruned_tokens = estimate_tokens("\n".join(schemas[name] for name in selected))
+        saving = 100.0 * (1 - pruned_tokens / full_tokens) if full_tokens else 0.0
+        print(f"{pruned_tokens:>8} {saving:>6.1f}%  {question}")
+        print(f"{'':>17} {', '.join(selected)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Compare storing the whole conversation in the DynamoDB session item with spilling
+message bodies to gzip-compressed S3 chunks (session_storage.SessionPayloadStore),
+for sessions of increasing length.
+
+DynamoDB and S3 are simulated in memory with a simple latency model
+(fixed request latency plus transfer time at --mbps), so the numbers show how the
+cost scales with session length rather than exact production latencies.
+Serialization, hashing and compression run for real.
+
+For each session length the benchmark reports:
+- item KiB: size of the DynamoDB session item
+- RCU/WCU: capacity units of one get_item (eventually consistent) / one update_item
+- write ms: saving the history after a new turn (warm container: earlier chunks are cached)
+- read ms: loading the full history in a cold container (no cached chunks)
+- warm read ms: loading it again in the same container (chunks come from the in-memory LRU)
+- connection ms: get_active_connection_id (reads the whole item, projection does not reduce its cost)
+
+Usage:
+    python benchmarks/session_storage_latency.py [--turns 10 50 100 300] [--mbps 50]
+"""
+import argparse
+import io
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "webbackend"))
+
+from session_storage import SessionPayloadStore, serialize_messages  # noqa: E402
+
+DYNAMODB_LATENCY_MS = 6.0
+S3_LATENCY_MS = 20.0
+DYNAMODB_ITEM_LIMIT = 400 * 1024
+INLINE_MAX_BYTES = 32 * 1024
+CHUNK_MESSAGES = 20
+
+
+class SimulatedNetwork:
+    def __init__(self, mbps: float):
+        self.bytes_per_ms = mbps * 1024 * 1024 / 8 / 1000
+
+    def wait(self, latency_ms: float, size: int) -> None:
+        time.sleep((latency_ms + size / self.bytes_per_ms) / 1000)
+
+
+class FakeS3:
+    """In-memory S3 with simulated request latency."""
+
+    def __init__(self, network: SimulatedNetwork):
+        self.network = network
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.network.wait(S3_LATENCY_MS, len(Body))
+        with self.lock:
+            self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        body = self.objects[Key]
+        self.network.wait(S3_LATENCY_MS, len(body))
+        return {"Body": io.BytesIO(body)}
+
+    def delete_objects(self, Bucket, Delete):
+        self.network.wait(S3_LATENCY_MS, 0)
+        with self.lock:
+            for obj in Delete["Objects"]:
+                self.objects.pop(obj["Key"], None)
+
+
+def build_session(turns: int) -> list:
+    """Messages of a session where earlier tool results are stubs and the last turn keeps a full result."""
+    messages = []
+    for turn in range(turns):
+        last = turn == turns - 1
+        sql = f"SELECT gender, count(*) FROM customer_master WHERE age > {random.randint(18, 60)} GROUP BY gender"
+        result = "\n".join(f"row {i} | " + "x" * 60 for i in range(300)) if last else f"[Result elided from history]\nSQL Query: {sql}\nRows: 3"
+        messages.extend(
+            [
+                {"role": "user", "content": [{"text": f"質問 {turn}: 年齢別の顧客数を教えてください"}]},
+                {"role": "assistant", "content": [{"toolUse": {"toolUseId": f"t{turn}", "name": "execute_sql_query", "input": {"sql_query": sql}}}]},
+                {"role": "user", "content": [{"toolResult": {"toolUseId": f"t{turn}", "status": "success", "content": [{"text": result}]}}]},
+                {"role": "assistant", "content": [{"text": "結果の説明です。" * 40}]},
+            ]
+        )
+    return messages
+
+
+def capacity_units(size: int) -> tuple:
+    """RCU of an eventually consistent read and WCU of a write of an item of this size."""
+    return math.ceil(size / 4096) / 2, math.ceil(size / 1024)
+
+
+def measure_inline(messages: list, network: SimulatedNetwork) -> dict:
+    started = time.perf_counter()
+    item_size = len(serialize_messages(messages))
+    network.wait(DYNAMODB_LATENCY_MS, item_size)
+    write_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    network.wait(DYNAMODB_LATENCY_MS, item_size)
+    read_ms = (time.perf_counter() - started) * 1000
+
+    rcu, wcu = capacity_units(item_size)
+    return {"item": item_size, "rcu": rcu, "wcu": wcu, "write": write_ms, "read": read_ms, "warm_read": read_ms, "connection": read_ms}
+
+
+def measure_spilled(messages: list, network: SimulatedNetwork) -> dict:
+    s3 = FakeS3(network)
+    writer = SessionPayloadStore(s3, "bucket", "session-messages/", CHUNK_MESSAGES)
+
+    # The previous turn was saved by the same warm container
+    previous_chunks = writer.write("user", "session", messages[:-4])
+    started = time.perf_counter()
+    chunks = writer.write("user", "session", messages)
+    item_size = len(serialize_messages(chunks)) + 100
+    network.wait(DYNAMODB_LATENCY_MS, item_size)
+    stale = {chunk["key"] for chunk in previous_chunks} - {chunk["key"] for chunk in chunks}
+    if stale:
+        writer.delete_keys(stale)
+    write_ms = (time.perf_counter() - started) * 1000
+
+    reader = SessionPayloadStore(s3, "bucket", "session-messages/", CHUNK_MESSAGES)
+    started = time.perf_counter()
+    network.wait(DYNAMODB_LATENCY_MS, item_size)
+    loaded = reader.read(chunks)
+    read_ms = (time.perf_counter() - started) * 1000
+    assert len(loaded) == len(messages)
+
+    started = time.perf_counter()
+    network.wait(DYNAMODB_LATENCY_MS, item_size)
+    reader.read(chunks)
+    warm_read_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    network.wait(DYNAMODB_LATENCY_MS, item_size)
+    connection_ms = (time.perf_counter() - started) * 1000
+
+    rcu, wcu = capacity_units(item_size)
+    return {"item": item_size, "rcu": rcu, "wcu": wcu, "write": write_ms, "read": read_ms, "warm_read": warm_read_ms, "connection": connection_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 100, 300])
+    parser.add_argument("--mbps", type=float, default=50.0, help="simulated transfer rate")
+    args = parser.parse_args()
+    random.seed(0)
+    network = SimulatedNetwork(args.mbps)
+
+    print(f"{'turns':>5} {'storage':<8} {'item KiB':>8} {'RCU':>6} {'WCU':>5} {'write ms':>9} {'read ms':>8} {'warm read ms':>13} {'connection ms':>14}")
+    for turns in args.turns:
+        messages = build_session(turns)
+        for label, measure in (("inline", measure_inline), ("s3", measure_spilled)):
+            if label == "s3" and len(serialize_messages(messages)) <= INLINE_MAX_BYTES:
+                continue
+            result = measure(messages, network)
+            note = "  exceeds the 400 KB item limit" if result["item"] > DYNAMODB_ITEM_LIMIT else ""
+            print(
+                f"{turns:>5} {label:<8} {result['item'] / 1024:>8.1f} {result['rcu']:>6.1f} {result['wcu']:>5} "
+                f"{result['write']:>9.1f} {result['read']:>8.1f} {result['warm_read']:>13.1f} {result['connection']:>14.1f}{note}"
+            )
+
+
+if __name__ == "__main__":
+    main()
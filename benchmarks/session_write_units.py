@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare the DynamoDB write capacity units consumed per turn by
+- full-history rewrites (SET messages = :messages on the session item), and
+- append-only per-turn storage (new turn item, stored in full, + header update).
+
+Item sizes are approximated by the compact JSON size of the stored messages
+(1 WCU per started KiB). The full-history model stores the tool results of earlier turns
+as stubs, as it did before per-turn storage; per-turn storage never rewrites earlier turns.
+Items above 400 KB cannot be written at all with full-history rewrites (without the S3 spill).
+
+For each session length N the benchmark reports the WCU of saving turn N and the total WCU of saving all N turns.
+
+Usage:
+    python benchmarks/session_write_units.py [--turns 10 100 500]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "webbackend"))
+
+from session_storage import serialize_messages  # noqa: E402
+from session_storage_latency import build_session  # noqa: E402
+
+DYNAMODB_ITEM_LIMIT = 400 * 1024
+HEADER_ITEM_BYTES = 300
+MESSAGES_PER_TURN = 4
+
+
+def write_units(size: int) -> int:
+    return math.ceil(size / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+    random.seed(0)
+
+    print(f"{'turns':>5} {'last turn full':>15} {'last turn append':>17} {'all turns full':>15} {'all turns append':>17}")
+    for turns in args.turns:
+        messages = build_session(turns)
+        # Each turn holds a full 300-row result; the full-history item keeps earlier turns as stubs
+        stub_turn = messages[:MESSAGES_PER_TURN]
+        full_turn = messages[-MESSAGES_PER_TURN:]
+
+        total_full = 0
+        total_append = 0
+        last_full = last_append = 0
+        for turn in range(1, turns + 1):
+            history_size = len(serialize_messages(stub_turn)) * (turn - 1) + len(serialize_messages(full_turn))
+            last_full = write_units(history_size + HEADER_ITEM_BYTES)
+            last_append = write_units(len(serialize_messages(full_turn))) + write_units(HEADER_ITEM_BYTES)
+            total_full += last_full
+            total_append += last_append
+
+        note = "  (full-history item exceeds 400 KB)" if history_size > DYNAMODB_ITEM_LIMIT else ""
+        print(f"{turns:>5} {last_full:>15} {last_append:>17} {total_full:>15} {total_append:>17}{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Measure how many WebSocket messages per second a warm agent processor can push to one connection with
+- a new apigatewaymanagementapi client per message (the previous send_to_connection),
+- the cached client of websocket_push (one post per message), and
+- websocket_push.ConnectionPusher (queued, consecutive small messages coalesced into one post).
+
+The management API is simulated: each post takes --post-ms, and creating a client
+(loading the service model, new HTTPS connection) takes --client-ms.
+The messages are stream frames of a few words, pushed every --interval-ms as the agent's text is generated.
+The benchmark reports messages per second, posts made, and how long the producer was blocked.
+
+Usage:
+    python benchmarks/websocket_push_throughput.py [--messages 500] [--post-ms 15] [--client-ms 30] [--interval-ms 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "webbackend"))
+
+from websocket_push import ConnectionPusher, encode_message  # noqa: E402
+
+
+class GoneException(Exception):
+    pass
+
+
+class FakeManagementClient:
+    """Simulated apigatewaymanagementapi client."""
+
+    class exceptions:
+        GoneException = GoneException
+
+    def __init__(self, post_ms: float):
+        self.post_ms = post_ms
+        self.posts = 0
+        self.bytes = 0
+
+    def post_to_connection(self, ConnectionId, Data):
+        time.sleep(self.post_ms / 1000)
+        self.posts += 1
+        self.bytes += len(Data)
+
+
+def frames(count: int) -> list:
+    return [{"type": "stream", "session_id": "session-abc1234", "segment": 0, "delta": f"token {i} of the answer "} for i in range(count)]
+
+
+def run_per_message_client(messages: list, args) -> dict:
+    posts = 0
+    started = time.perf_counter()
+    for data in messages:
+        time.sleep(args.client_ms / 1000)
+        client = FakeManagementClient(args.post_ms)
+        client.post_to_connection(ConnectionId="conn", Data=encode_message(data))
+        posts += client.posts
+        time.sleep(args.interval_ms / 1000)
+    elapsed = time.perf_counter() - started
+    return {"elapsed": elapsed, "posts": posts, "blocked": elapsed - len(messages) * args.interval_ms / 1000}
+
+
+def run_cached_client(messages: list, args) -> dict:
+    client = FakeManagementClient(args.post_ms)
+    started = time.perf_counter()
+    for data in messages:
+        client.post_to_connection(ConnectionId="conn", Data=encode_message(data))
+        time.sleep(args.interval_ms / 1000)
+    elapsed = time.perf_counter() - started
+    return {"elapsed": elapsed, "posts": client.posts, "blocked": elapsed - len(messages) * args.interval_ms / 1000}
+
+
+def run_pusher(messages: list, args) -> dict:
+    client = FakeManagementClient(args.post_ms)
+    pusher = ConnectionPusher(client, "conn")
+    blocked = 0.0
+    started = time.perf_counter()
+    for data in messages:
+        push_started = time.perf_counter()
+        pusher.push(data)
+        blocked += time.perf_counter() - push_started
+        time.sleep(args.interval_ms / 1000)
+    pusher.close()
+    elapsed = time.perf_counter() - started
+    return {"elapsed": elapsed, "posts": client.posts, "blocked": blocked}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--post-ms", type=float, default=15.0, help="simulated post_to_connection latency")
+    parser.add_argument("--client-ms", type=float, default=30.0, help="simulated client creation time")
+    parser.add_argument("--interval-ms", type=float, default=2.0, help="time between messages produced by the agent")
+    args = parser.parse_args()
+
+    messages = frames(args.messages)
+    print(f"{'sender':<22} {'msgs/s':>8} {'posts':>6} {'total s':>8} {'producer blocked s':>19}")
+    for label, run in (("client per message", run_per_message_client), ("cached client", run_cached_client), ("pusher (coalesced)", run_pusher)):
+        result = run(messages, args)
+        print(f"{label:<22} {len(messages) / result['elapsed']:>8.0f} {result['posts']:>6} {result['elapsed']:>8.2f} {result['blocked']:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
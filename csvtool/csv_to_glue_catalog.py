@@ -6,7 +6,11 @@ import pandas as pd
 from pathlib import Path
 from collections import defaultdict
 import hashlib
-import time
+import sys
+
+# athena_executor is shared with the Lambda functions as a layer (lambda/layers/athena_executor)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lambda" / "layers" / "athena_executor"))
+import athena_executor  # noqa: E402
 
 # Global variables
 S3_BUCKET_NAME = "<ここを実際のs3バケット名に置き換えてください>"
@@ -77,10 +81,14 @@ class GlueTableManager:
     def delete_all_tables(self):
         """データベース内の全テーブルを削除"""
         try:
-            tables = self.client.get_tables(DatabaseName=self.database)
-            for table in tables["TableList"]:
-                self.client.delete_table(DatabaseName=self.database, Name=table["Name"])
-                print(f"Deleted table: {table['Name']}")
+            # 全ページのテーブル名を先に取得してから削除
+            paginator = self.client.get_paginator('get_tables')
+            table_names = []
+            for page in paginator.paginate(DatabaseName=self.database):
+                table_names.extend(table["Name"] for table in page["TableList"])
+            for table_name in table_names:
+                self.client.delete_table(DatabaseName=self.database, Name=table_name)
+                print(f"Deleted table: {table_name}")
         except Exception as e:
             print(f"Error deleting tables: {e}")
     
@@ -238,15 +246,10 @@ def analyze_csv_with_bedrock(csv_path):
 
 
 def wait_for_query(query_execution_id, timeout=300):
-    """Athenaクエリの完了を待機"""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        status = athena.get_query_execution(QueryExecutionId=query_execution_id)
-        state = status['QueryExecution']['Status']['State']
-        if state in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-            return state
-        time.sleep(2)
-    return 'TIMEOUT'
+    """Athenaクエリの完了を待機（制限時間を超えた場合はクエリを停止）"""
+    outcome = athena_executor.wait_for_query(athena, query_execution_id, timeout)
+    print(f"Query {outcome['state']}: queued {outcome['queued_ms']}ms, running {outcome['running_ms']}ms")
+    return outcome['state']
 
 
 def detect_encoding(csv_path):
@@ -26,23 +26,39 @@ interface ChatInterfaceProps {
   sessionId?: string;
   initialMessages?: any[];
   onSessionCreated?: (sessionId: string) => void;
+  hasOlderMessages?: boolean;
+  onLoadOlderMessages?: () => Promise<Message[]>;
 }
 
-const ChatInterface: React.FC<ChatInterfaceProps> = ({ userId, sessionId, initialMessages = [], onSessionCreated }) => {
+const ChatInterface: React.FC<ChatInterfaceProps> = ({
+  userId,
+  sessionId,
+  initialMessages = [],
+  onSessionCreated,
+  hasOlderMessages = false,
+  onLoadOlderMessages
+}) => {
   const [inputValue, setInputValue] = useState('');
   const messagesEndRef = useRef<HTMLDivElement>(null);
   // Pass userId, sessionId, initialMessages, and onSessionCreated to useChat hook
-  const { messages, isLoading, isConnected, sendMessage } = useChat(
+  const { messages, isLoading, progressText, isConnected, sendMessage, prependMessages } = useChat(
     userId,
     sessionId,
     initialMessages,
     onSessionCreated
   );
 
-  // Scroll to bottom whenever messages change
+  // Scroll to bottom whenever a message is added or updated at the end (not when older messages are prepended)
+  const lastMessage = messages[messages.length - 1];
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [messages]);
+  }, [lastMessage]);
+
+  const handleLoadOlderMessages = async () => {
+    if (onLoadOlderMessages) {
+      prependMessages(await onLoadOlderMessages());
+    }
+  };
 
   const handleSendMessage = () => {
     if (inputValue.trim()) {
@@ -104,6 +120,13 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ userId, sessionId, initia
       </Box>
       <Box sx={{ flexGrow: 1, overflow: 'auto', p: 2 }}>
         <Paper elevation={3} sx={{ p: 2, overflow: 'auto' }}>
+          {hasOlderMessages && (
+            <Box sx={{ display: 'flex', justifyContent: 'center', mb: 1 }}>
+              <Button size="small" onClick={handleLoadOlderMessages}>
+                Load earlier messages
+              </Button>
+            </Box>
+          )}
           <List>
             {messages.map((message: Message, index: number) => (
               <ListItem
@@ -228,7 +251,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ userId, sessionId, initia
               <ListItem sx={{ display: 'flex', justifyContent: 'flex-start', mb: 1 }}>
                 <CircularProgress size={20} sx={{ mr: 2 }} />
                 <Typography variant="body2" color="text.secondary">
-                  Assistant is thinking...
+                  {progressText || 'Assistant is thinking...'}
                 </Typography>
               </ListItem>
             )}
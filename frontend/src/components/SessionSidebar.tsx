@@ -21,6 +21,8 @@ interface SessionSidebarProps {
   loading: boolean;
   error: string | null;
   onRefresh: () => void;
+  hasMoreSessions: boolean;
+  onLoadMore: () => void;
   onSessionSelect: (sessionId: string) => void;
   onSessionDelete: (sessionId: string) => Promise<void>;
   onNewSession: () => void;
@@ -32,6 +34,8 @@ const SessionSidebar: React.FC<SessionSidebarProps> = ({
   loading,
   error,
   onRefresh,
+  hasMoreSessions,
+  onLoadMore,
   onSessionSelect,
   onSessionDelete,
   onNewSession
@@ -134,6 +138,13 @@ const SessionSidebar: React.FC<SessionSidebarProps> = ({
               </ListItemButton>
             </ListItem>
           ))}
+          {hasMoreSessions && (
+            <ListItem sx={{ justifyContent: 'center' }}>
+              <Button size="small" onClick={onLoadMore}>
+                さらに読み込む
+              </Button>
+            </ListItem>
+          )}
         </List>
       )}
     </>
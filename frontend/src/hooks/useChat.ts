@@ -10,6 +10,10 @@ export type MessageContent = {
 export type Message = {
   role: 'user' | 'assistant' | 'url' | 'image';
   content: MessageContent[];
+  // チャート画像のメッセージのみ。以前のターンのチャートはサーバーが発行した署名付きURLで届き、発行できなかった場合はcontentが空の参照として届く
+  chart?: { sha256: string };
+  // サーバーから届いたメッセージのセッション内の連番（ローカルで追加したメッセージにはない）
+  seq?: number;
 };
 
 // Chat-specific WebSocket message type
@@ -20,8 +24,78 @@ interface ChatWebSocketMessage {
   session_id?: string;
   response?: string;
   conversation_history?: Message[];
+  base_seq?: number;
+  last_seq?: number;
+  segment?: number;
+  delta?: string;
+  tool?: string;
+  stage?: string;
+  elapsed_ms?: number;
+  data_scanned_bytes?: number;
+  chart_count?: number;
+  query_count?: number;
 }
 
+// URLのないチャートの参照を、表示中のチャートのURLで置き換える（URLが分からない参照は表示しない）
+const resolveChartReferences = (history: Message[], currentMessages: Message[]): Message[] => {
+  const chartUrls = new Map<string, string>();
+  for (const message of currentMessages) {
+    if (message.role === 'image' && message.chart && message.content[0]?.text) {
+      chartUrls.set(message.chart.sha256, message.content[0].text);
+    }
+  }
+  return history.flatMap((message) => {
+    if (message.role !== 'image' || !message.chart || message.content.length > 0) {
+      return [message];
+    }
+    const url = chartUrls.get(message.chart.sha256);
+    return url ? [{ ...message, content: [{ text: url }] }] : [];
+  });
+};
+
+// 差分の履歴を反映する。base_seqまでのサーバーのメッセージを残し、ローカルで追加したメッセージは差分で置き換える
+const applyHistoryDelta = (currentMessages: Message[], delta: Message[], baseSeq: number): Message[] => {
+  const kept = baseSeq > 0 ? currentMessages.filter((message) => message.seq !== undefined && message.seq <= baseSeq) : [];
+  return [...kept, ...resolveChartReferences(delta, currentMessages)];
+};
+
+// ツールの進捗イベントを表示用のテキストに変換
+const formatProgress = (event: ChatWebSocketMessage): string | null => {
+  const seconds = ((event.elapsed_ms ?? 0) / 1000).toFixed(1);
+  if (event.tool === 'execute_sql_query') {
+    const scanned = ((event.data_scanned_bytes ?? 0) / (1024 * 1024)).toFixed(1);
+    switch (event.stage) {
+      case 'waiting':
+        return 'Waiting to run the query...';
+      case 'queued':
+        return `Query queued (${seconds}s)`;
+      case 'running':
+        return `Running query: ${scanned} MB scanned (${seconds}s)`;
+      case 'succeeded':
+        return `Query finished: ${scanned} MB scanned (${seconds}s)`;
+      default:
+        return `Query ${event.stage} (${seconds}s)`;
+    }
+  }
+  if (event.tool === 'execute_chart_code') {
+    switch (event.stage) {
+      case 'starting_session':
+        return 'Starting the chart sandbox...';
+      case 'session_started':
+        return 'Running the chart code...';
+      case 'loading_data':
+        return `Loading ${event.query_count ?? 0} query result(s) into the chart sandbox...`;
+      case 'uploading':
+        return `Uploading ${event.chart_count ?? 0} chart(s)...`;
+      case 'completed':
+        return `Charts ready (${seconds}s)`;
+      default:
+        return `Chart ${event.stage} (${seconds}s)`;
+    }
+  }
+  return null;
+};
+
 const useChat = (
   userId: string,
   initialSessionId?: string,
@@ -37,12 +111,22 @@ const useChat = (
   }, [initialSessionId]);
   const [messages, setMessages] = useState<Message[]>([]);
 
+  // 受信済みの最後のメッセージの連番（不明な場合はnullで、次の応答で履歴全体を受け取る）
+  const lastSeqRef = useRef<number | null>(null);
+
   // initialMessagesが変更されたらmessagesも更新（常に更新）
   useEffect(() => {
-    setMessages(initialMessages);
+    // REST APIから読み込んだ履歴のチャートはURLを持たない参照のため表示しない
+    setMessages(resolveChartReferences(initialMessages, []));
+    lastSeqRef.current = initialMessages[initialMessages.length - 1]?.seq ?? null;
   }, [initialMessages]);
-  // 最後に発言したのがユーザーかどうかでローディング状態を判断
-  const isLoading = messages.length > 0 && messages[messages.length - 1].role === 'user';
+  // ストリーミング中の応答が始まるメッセージの位置（ストリーミング中でなければnull）
+  const streamStartRef = useRef<number | null>(null);
+  const [isStreaming, setIsStreaming] = useState(false);
+  // 実行中のツールの最新の進捗
+  const [progressText, setProgressText] = useState<string | null>(null);
+  // 最後に発言したのがユーザーかどうか、または応答のストリーミング中かでローディング状態を判断
+  const isLoading = isStreaming || (messages.length > 0 && messages[messages.length - 1].role === 'user');
   const { setShowError } = useStore();
   // Use the WebSocket store
   const { isConnected, lastMessage, sendData, connect } = useWebSocket();
@@ -70,9 +154,35 @@ const useChat = (
       return;
     }
 
-    if (chatMessage.type === 'response') {
-      if (chatMessage.conversation_history) {
-        setMessages(chatMessage.conversation_history);
+    if (chatMessage.type === 'progress') {
+      setProgressText(formatProgress(chatMessage));
+    } else if (chatMessage.type === 'stream' && chatMessage.delta) {
+      // 生成中のテキストを表示する。segmentはこのターンのN番目のアシスタントメッセージに対応する
+      const segment = chatMessage.segment ?? 0;
+      const delta = chatMessage.delta;
+      setIsStreaming(true);
+      setMessages((prevMessages) => {
+        if (streamStartRef.current === null) {
+          streamStartRef.current = prevMessages.length;
+        }
+        const nextMessages = [...prevMessages];
+        const index = Math.min(streamStartRef.current + segment, nextMessages.length);
+        const current = nextMessages[index];
+        const text = current && current.role === 'assistant' ? current.content[0]?.text ?? '' : '';
+        nextMessages[index] = { role: 'assistant', content: [{ text: text + delta }] };
+        return nextMessages;
+      });
+    } else if (chatMessage.type === 'response') {
+      // 最終的な応答で、ストリーミング中に表示したメッセージを置き換える
+      streamStartRef.current = null;
+      setIsStreaming(false);
+      setProgressText(null);
+      const history = chatMessage.conversation_history;
+      if (history) {
+        // 前回の応答以降のメッセージのみが届く（base_seqが0の場合は履歴全体）
+        const baseSeq = chatMessage.base_seq ?? 0;
+        setMessages((prevMessages) => applyHistoryDelta(prevMessages, history, baseSeq));
+        lastSeqRef.current = chatMessage.last_seq ?? null;
       }
       // 新しいセッションが作成され、接続が完了したときにコールバックを呼び出す
       if (!initialSessionId && onSessionCreated) {
@@ -82,6 +192,9 @@ const useChat = (
     } else if (chatMessage.type === 'error') {
       console.error('Chat error:', chatMessage.message);
       setShowError(true);
+      streamStartRef.current = null;
+      setIsStreaming(false);
+      setProgressText(null);
       // エラー時はアシスタントからのエラーメッセージを追加することでローディング状態を解除
       const errorMessage: Message = {
         role: 'assistant',
@@ -121,7 +234,9 @@ const useChat = (
       const chatPayload = {
         type: 'chat',
         message: content,
-        session_id: currentSessionId
+        session_id: currentSessionId,
+        // 受信済みの最後の連番を送り、応答では新しいメッセージのみを受け取る
+        ...(lastSeqRef.current !== null ? { last_seq: lastSeqRef.current } : {})
       };
       await sendData(chatPayload);
     } catch (error) {
@@ -138,9 +253,15 @@ const useChat = (
     }
   };
 
+  // 古いページのメッセージを先頭に追加する
+  const prependMessages = (olderMessages: Message[]) => {
+    setMessages((prevMessages) => [...resolveChartReferences(olderMessages, prevMessages), ...prevMessages]);
+  };
+
   // Function to clear the chat history
   const clearChat = () => {
     setMessages([]);
+    lastSeqRef.current = null;
   };
 
   return {
@@ -148,8 +269,10 @@ const useChat = (
     sessionId,
     messages,
     isLoading,
+    progressText,
     isConnected,
     sendMessage,
+    prependMessages,
     clearChat
   };
 };
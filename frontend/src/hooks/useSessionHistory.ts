@@ -9,37 +9,67 @@ export interface SessionInfo {
   message_count: number;
 }
 
+interface SessionListPage {
+  sessions: SessionInfo[];
+  next_cursor: string | null;
+}
+
 export interface SessionDetail {
   session_id: string;
   last_updated: string;
   messages: any[];
+  // 古いメッセージの次のページのcursor（最も古いページではnull）
+  next_cursor: number | null;
+  last_seq: number;
 }
 
 const useSessionHistory = () => {
   const [sessions, setSessions] = useState<SessionInfo[]>([]);
+  // セッション一覧の次のページのcursor（最後のページではnull）
+  const [nextSessionsCursor, setNextSessionsCursor] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
   const { get, delete: del } = useHttp();
   const { loading } = useStore();
 
-  // セッション一覧を取得する関数
+  // セッション一覧の最初のページ（最近更新されたセッション）を取得する関数
   const fetchSessions = async () => {
     setError(null);
     try {
-      const response = await get<{ sessions: SessionInfo[] }>('/sessions');
+      const response = await get<SessionListPage>('/sessions');
       console.log('fetched sessions..');
       console.log(response);
       setSessions(response.sessions || []);
+      setNextSessionsCursor(response.next_cursor ?? null);
+    } catch (err) {
+      console.error('セッション履歴の取得に失敗しました:', err);
+      setError('セッション履歴の取得に失敗しました');
+    }
+  };
+
+  // セッション一覧の次のページを取得して末尾に追加する関数
+  const loadMoreSessions = async () => {
+    if (nextSessionsCursor === null) return;
+    setError(null);
+    try {
+      const response = await get<SessionListPage>('/sessions', { params: { cursor: nextSessionsCursor } });
+      // ページの取得中に更新されたセッションは前のページにも含まれることがあるため重複を除く
+      setSessions((prevSessions) => {
+        const loaded = new Set(prevSessions.map((session) => session.session_id));
+        return [...prevSessions, ...(response.sessions || []).filter((session) => !loaded.has(session.session_id))];
+      });
+      setNextSessionsCursor(response.next_cursor ?? null);
     } catch (err) {
       console.error('セッション履歴の取得に失敗しました:', err);
       setError('セッション履歴の取得に失敗しました');
     }
   };
 
-  // 特定のセッションの詳細を取得する関数
-  const fetchSessionDetail = async (sessionId: string): Promise<SessionDetail | null> => {
+  // 特定のセッションの詳細を取得する関数（cursorを指定しない場合は最新のページ）
+  // レスポンスのETagにより、ブラウザは変更のないページを304で再検証する
+  const fetchSessionDetail = async (sessionId: string, cursor?: number): Promise<SessionDetail | null> => {
     setError(null);
     try {
-      const response = await get<SessionDetail>(`/sessions/${sessionId}`);
+      const response = await get<SessionDetail>(`/sessions/${sessionId}`, cursor ? { params: { cursor } } : undefined);
       return response;
     } catch (err) {
       console.error(`セッション ${sessionId} の詳細取得に失敗しました:`, err);
@@ -72,6 +102,8 @@ const useSessionHistory = () => {
     loading,
     error,
     fetchSessions,
+    hasMoreSessions: nextSessionsCursor !== null,
+    loadMoreSessions,
     fetchSessionDetail,
     deleteSession
   };
@@ -1,4 +1,5 @@
 import { useState, useEffect, useCallback, useRef } from 'react';
+import { flushSync } from 'react-dom';
 import { fetchAuthSession } from 'aws-amplify/auth';
 import { useStore } from './store';
 import jsonParseSafe from 'json-parse-safe';
@@ -15,6 +16,8 @@ const useWebSocket = () => {
   const socketRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const heartbeatIntervalRef = useRef<NodeJS.Timeout | null>(null);
+  // 分割して送られた大きいメッセージの受信済みの断片（chunk_idごと）
+  const chunksRef = useRef<Map<string, string[]>>(new Map());
 
   // Get WebSocket URL from environment variables
   const wsUrl = import.meta.env.VITE_APP_WEBSOCKET_URL;
@@ -80,11 +83,28 @@ const useWebSocket = () => {
 
       socketRef.current.onmessage = (event) => {
         try {
-          const parsed = jsonParseSafe(event.data);
+          let parsed = jsonParseSafe(event.data);
+          if ('value' in parsed && parsed.value.type === 'chunk') {
+            // 大きいメッセージは順序付きの断片で届くため、すべて揃ってから結合して解析する
+            const chunk = parsed.value;
+            const pieces = chunksRef.current.get(chunk.chunk_id) ?? new Array<string>(chunk.count);
+            pieces[chunk.index] = chunk.data;
+            chunksRef.current.set(chunk.chunk_id, pieces);
+            if (pieces.filter((piece) => piece !== undefined).length < chunk.count) {
+              return;
+            }
+            chunksRef.current.delete(chunk.chunk_id);
+            parsed = jsonParseSafe(pieces.join(''));
+          }
           if ('value' in parsed) {
             const data: WebSocketMessage = parsed.value;
             console.log('WebSocket message received:', data);
-            setLastMessage(data);
+            // 連続した小さいメッセージはバックエンドで1つのbatchメッセージにまとめて送られる
+            const messages: WebSocketMessage[] = data.type === 'batch' && Array.isArray(data.messages) ? data.messages : [data];
+            for (const message of messages) {
+              // ストリーミング中はメッセージが連続して届くため、バッチ処理で取りこぼさないよう同期的に反映する
+              flushSync(() => setLastMessage(message));
+            }
           } else {
             console.error('Invalid WebSocket message format:', event.data);
             setShowError(true);
@@ -17,10 +17,14 @@ function Main({ signOut, user }: MainProps) {
     loading: sessionsLoading,
     error,
     fetchSessions,
+    hasMoreSessions,
+    loadMoreSessions,
     fetchSessionDetail,
     deleteSession
   } = useSessionHistory();
   const [currentSessionMessages, setCurrentSessionMessages] = useState<any[]>([]);
+  // 現在のセッションの、まだ読み込んでいない古いメッセージのcursor
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState<number | null>(null);
 
   // セッションIDが変更されたら、そのセッションの詳細情報を取得
   useEffect(() => {
@@ -29,17 +33,33 @@ function Main({ signOut, user }: MainProps) {
         const sessionDetail = await fetchSessionDetail(currentSessionId);
         if (sessionDetail && sessionDetail.messages) {
           setCurrentSessionMessages(sessionDetail.messages);
+          setOlderMessagesCursor(sessionDetail.next_cursor ?? null);
         } else {
           setCurrentSessionMessages([]);
+          setOlderMessagesCursor(null);
         }
       } else {
         setCurrentSessionMessages([]);
+        setOlderMessagesCursor(null);
       }
     };
 
     loadSessionDetails();
   }, [currentSessionId]);
 
+  // 古いメッセージの次のページを取得する
+  const loadOlderMessages = async () => {
+    if (!currentSessionId || olderMessagesCursor === null) {
+      return [];
+    }
+    const sessionDetail = await fetchSessionDetail(currentSessionId, olderMessagesCursor);
+    if (!sessionDetail) {
+      return [];
+    }
+    setOlderMessagesCursor(sessionDetail.next_cursor ?? null);
+    return sessionDetail.messages;
+  };
+
   const onNewSessionCreated = (sessionId: string) => {
     fetchSessions();
     setCurrentSessionId(sessionId);
@@ -91,6 +111,8 @@ function Main({ signOut, user }: MainProps) {
           loading={sessionsLoading}
           error={error}
           onRefresh={fetchSessions}
+          hasMoreSessions={hasMoreSessions}
+          onLoadMore={loadMoreSessions}
           onSessionSelect={setCurrentSessionId}
           onSessionDelete={onSessionDelete}
           onNewSession={() => {
@@ -113,6 +135,8 @@ function Main({ signOut, user }: MainProps) {
             userId={userId}
             sessionId={currentSessionId}
             initialMessages={currentSessionMessages}
+            hasOlderMessages={olderMessagesCursor !== null}
+            onLoadOlderMessages={loadOlderMessages}
             onSessionCreated={(newSessionId) => onNewSessionCreated(newSessionId)} // 新しいセッションが作成されたらセッションリストを更新
           />
         </Box>
@@ -1,13 +1,18 @@
 import os
 import boto3
-import time
 import uuid
+from athena_executor import wait_for_query
 
 DATASET_ARN = os.environ.get("DATASET_ARN")
 OUTPUT_BUCKET = os.environ.get("OUTPUT_BUCKET")
 GLUE_DATABASE_NAME = os.environ.get("GLUE_DATABASE_NAME")
 PERSONALIZE_ROLE_ARN = os.environ.get("PERSONALIZE_ROLE_ARN")
 
+# Time kept back from the Lambda timeout for creating the import job after the query
+LAMBDA_TIMEOUT_MARGIN_SECONDS = 30
+# The query is always given at least this long, even when the Lambda is close to its timeout
+MIN_QUERY_TIMEOUT_SECONDS = 10
+
 athena = boto3.client("athena")
 s3 = boto3.client("s3")
 personalize = boto3.client("personalize")
@@ -72,25 +77,23 @@ def handler(event, context):
         query_execution_id = response["QueryExecutionId"]
         print(f"Started Athena query with execution ID: {query_execution_id}")
 
-        # Wait for query to complete
-        state = "RUNNING"
-        while state in ["RUNNING", "QUEUED"]:
-            response = athena.get_query_execution(QueryExecutionId=query_execution_id)
-            state = response["QueryExecution"]["Status"]["State"]
-
-            if state in ["RUNNING", "QUEUED"]:
-                time.sleep(5)
+        # Wait for query to complete, leaving time to create the import job before the Lambda times out
+        timeout_seconds = max(MIN_QUERY_TIMEOUT_SECONDS, context.get_remaining_time_in_millis() / 1000 - LAMBDA_TIMEOUT_MARGIN_SECONDS)
+        outcome = wait_for_query(athena, query_execution_id, timeout_seconds)
+        state = outcome["state"]
 
         if state == "FAILED":
-            error_message = response["QueryExecution"]["Status"].get("StateChangeReason", "Unknown error")
+            error_message = outcome["reason"] or "Unknown error"
             raise Exception(f"Athena query failed: {error_message}")
         elif state == "CANCELLED":
             raise Exception("Athena query was cancelled")
+        elif state == "TIMEOUT":
+            raise Exception(f"Athena query did not complete within {int(timeout_seconds)} seconds and was stopped")
 
-        print("Athena query completed successfully")
+        print(f"Athena query completed successfully (queued {outcome['queued_ms']}ms, running {outcome['running_ms']}ms)")
 
         # Get the S3 path of the query results
-        result_file = response["QueryExecution"]["ResultConfiguration"]["OutputLocation"]
+        result_file = outcome["query_execution"]["ResultConfiguration"]["OutputLocation"]
         print(f"Athena query results stored at: {result_file}")
 
         # Create a unique import job name with timestamp
@@ -3,8 +3,8 @@ import boto3
 import json
 import uuid
 import logging
-import time
 from datetime import datetime
+from athena_executor import wait_for_query
 
 DATASET_GROUP_ARN = os.environ["DATASET_GROUP_ARN"]
 DATASET_ARN = os.environ["DATASET_ARN"]
@@ -16,6 +16,7 @@ SOLUTION_VERSION_TABLE = os.environ["SOLUTION_VERSION_TABLE"]
 ATHENA_DATABASE = os.environ["ATHENA_DATABASE"]  # Athenaデータベース名
 ATHENA_OUTPUT_LOCATION = os.environ["ATHENA_OUTPUT_LOCATION"]  # Athenaクエリ結果の出力先
 ATHENA_WORKGROUP = os.environ["ATHENA_WORKGROUP"]  # Athenaワークグループ
+ATHENA_QUERY_TIMEOUT_SECONDS = int(os.environ.get("ATHENA_QUERY_TIMEOUT_SECONDS", "180"))  # Athenaクエリの制限時間
 
 s3 = boto3.client("s3")
 personalize = boto3.client("personalize")
@@ -86,31 +87,18 @@ def check_existing_items(item_ids):
 
 def wait_for_query_completion(query_execution_id):
     """
-    Athenaクエリの完了を待つ
+    Athenaクエリの完了を待つ（制限時間を超えた場合はクエリを停止する）
 
     Args:
         query_execution_id: クエリ実行ID
 
     Returns:
-        クエリの最終状態（'SUCCEEDED', 'FAILED', 'CANCELLED'など）
+        クエリの最終状態（'SUCCEEDED', 'FAILED', 'CANCELLED', 'TIMEOUT'など）
     """
-
-    max_retries = 60
-    retry_count = 0
-
-    while retry_count < max_retries:
-        response = athena.get_query_execution(QueryExecutionId=query_execution_id)
-        state = response["QueryExecution"]["Status"]["State"]
-        if state in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            logger.info("response of athena")
-            logger.info(response)
-
-            return state
-
-        retry_count += 1
-        time.sleep(3)  # 3秒待機
-
-    return "TIMEOUT"
+    outcome = wait_for_query(athena, query_execution_id, ATHENA_QUERY_TIMEOUT_SECONDS)
+    logger.info("response of athena")
+    logger.info(outcome["query_execution"])
+    return outcome["state"]
 
 
 def handler(event, context):
@@ -0,0 +1,158 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TERMINAL_STATES = ("SUCCEEDED", "FAILED", "CANCELLED")
+
+# Short queries finish within a few hundred milliseconds, so the first polls are fast
+FIRST_POLL_INTERVALS = (0.1, 0.2, 0.3, 0.5)
+QUEUED_POLL_INTERVAL = 1.0
+MIN_POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 5.0
+# While running, wait a fraction of the engine time spent so far (long queries are polled less often)
+RUNNING_POLL_RATIO = 0.2
+
+# Retries of start_query_execution when Athena rejects it with TooManyRequestsException
+START_MAX_ATTEMPTS = 5
+START_RETRY_BASE_SECONDS = 0.5
+
+_fanout_slots = {}
+_fanout_slots_lock = threading.Lock()
+
+
+@contextmanager
+def fanout_slot(max_parallel: int):
+    """
+    Limit how many queries the parallel tool calls of one invocation run at the same time.
+
+    The limit is per process: a Lambda container runs one invocation at a time, so it does not
+    coordinate concurrent invocations and cannot keep the account under the Athena active query quota.
+    Queries rejected by that quota are retried by start_query.
+
+    Args:
+        max_parallel: The maximum number of queries run at the same time in this process
+    """
+    with _fanout_slots_lock:
+        slot = _fanout_slots.setdefault(max_parallel, threading.BoundedSemaphore(max_parallel))
+    with slot:
+        yield
+
+
+def start_query(athena, **params) -> str:
+    """
+    Start an Athena query, retrying with jittered backoff when Athena throttles the request
+    or the active query quota is exceeded.
+
+    Args:
+        athena: The boto3 Athena client
+        **params: The parameters of start_query_execution
+
+    Returns:
+        The query execution ID
+    """
+    for attempt in range(START_MAX_ATTEMPTS):
+        try:
+            return athena.start_query_execution(**params)["QueryExecutionId"]
+        except athena.exceptions.TooManyRequestsException:
+            if attempt == START_MAX_ATTEMPTS - 1:
+                raise
+            delay = START_RETRY_BASE_SECONDS * (2**attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"Athena throttled start_query_execution, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def next_poll_interval(poll_count: int, state: str, statistics: dict) -> float:
+    """
+    Decide how long to wait before polling a query again.
+
+    Args:
+        poll_count: The number of polls already made
+        state: The current query state (QUEUED or RUNNING)
+        statistics: The Statistics of the query execution
+
+    Returns:
+        The number of seconds to wait
+    """
+    if poll_count < len(FIRST_POLL_INTERVALS):
+        return FIRST_POLL_INTERVALS[poll_count]
+    if state == "QUEUED":
+        return QUEUED_POLL_INTERVAL
+    engine_seconds = statistics.get("EngineExecutionTimeInMillis", 0) / 1000
+    return min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, engine_seconds * RUNNING_POLL_RATIO))
+
+
+def wait_for_query(athena, query_execution_id: str, timeout_seconds: float, on_poll=None) -> dict:
+    """
+    Wait for an Athena query to complete.
+    If the query is still queued or running when timeout_seconds run out, it is stopped
+    with stop_query_execution so that it does not keep scanning data.
+
+    Args:
+        athena: The boto3 Athena client
+        query_execution_id: The ID of the query execution
+        timeout_seconds: The time budget for the query
+        on_poll: Optional function called as on_poll(state, statistics) after each poll
+            of a query that is still queued or running
+
+    Returns:
+        A dictionary containing:
+        - state: The final state ('SUCCEEDED', 'FAILED', 'CANCELLED' or 'TIMEOUT')
+        - reason: The StateChangeReason of the query, if any
+        - queued_ms: Time spent in the queue
+        - running_ms: Time spent executing in the engine
+        - data_scanned_bytes: Data scanned by the query
+        - query_execution: The last QueryExecution returned by get_query_execution
+    """
+    started = time.monotonic()
+    deadline = started + timeout_seconds
+    last_poll = started
+    observed = {"QUEUED": 0.0, "RUNNING": 0.0}
+    state = "QUEUED"
+    poll_count = 0
+
+    while True:
+        execution = athena.get_query_execution(QueryExecutionId=query_execution_id)["QueryExecution"]
+        now = time.monotonic()
+        if state in observed:
+            observed[state] += now - last_poll
+        last_poll = now
+
+        state = execution["Status"]["State"]
+        statistics = execution.get("Statistics", {})
+
+        if state in TERMINAL_STATES:
+            break
+        if on_poll:
+            on_poll(state, statistics)
+
+        remaining = deadline - now
+        if remaining <= 0:
+            logger.warning(f"Query {query_execution_id} exceeded {timeout_seconds}s in state {state}, stopping it")
+            try:
+                athena.stop_query_execution(QueryExecutionId=query_execution_id)
+            except Exception as e:
+                logger.error(f"Error stopping query {query_execution_id}: {str(e)}")
+            state = "TIMEOUT"
+            break
+
+        time.sleep(min(next_poll_interval(poll_count, state, statistics), remaining))
+        poll_count += 1
+
+    outcome = {
+        "state": state,
+        "reason": execution["Status"].get("StateChangeReason"),
+        "queued_ms": statistics.get("QueryQueueTimeInMillis", int(observed["QUEUED"] * 1000)),
+        "running_ms": statistics.get("EngineExecutionTimeInMillis", int(observed["RUNNING"] * 1000)),
+        "data_scanned_bytes": statistics.get("DataScannedInBytes", 0),
+        "query_execution": execution,
+    }
+    logger.info(
+        f"Query {query_execution_id} finished with state {state} after {poll_count + 1} polls: "
+        f"queued {outcome['queued_ms']}ms, running {outcome['running_ms']}ms, scanned {outcome['data_scanned_bytes']} bytes"
+    )
+    return outcome
@@ -3,23 +3,53 @@ import json
 import logging
 import os
 import uuid
-import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List
-from sessionutils import get_conversation_history, save_conversation_history, filter_messages_for_response, get_active_connection_id
-
-from strands import Agent, tool
-from strands.models import BedrockModel
+from typing import Dict, Any, List, Optional
+from sessionutils import (
+    COMPACTION_KEEP_TURNS,
+    COMPACTION_TRIGGER_TOKENS,
+    elide_tool_results,
+    estimate_messages_tokens,
+    filter_messages_for_response,
+    get_active_connection_id,
+    get_session_state,
+    history_delta,
+    mark_connection_stale,
+    presign_chart_references,
+    render_transcript,
+    save_conversation_turn,
+    save_conversation_summary,
+    select_compaction_boundary,
+)
+from schema_cache import SchemaCatalogCache, table_version, render_table_schema
+from schema_retrieval import build_retrieval_query
+from athena_executor import fanout_slot, start_query, wait_for_query
+from result_reader import columns_from_query_results, iter_result_rows, read_result_columns
+from result_profiler import profile_rows, render_profile
+from result_encoder import encode_result
+from tokenutils import estimate_tokens
+from response_streaming import ResponseStreamer
+from progress_events import ProgressReporter
+from websocket_push import ConnectionPusher, get_management_client, post_to_connection
+from result_cache import DataVersionResolver, QueryResultCache, cache_key, is_cacheable, normalize_sql, referenced_tables
+from lazy_clients import LazyClient
+from code_interpreter_pool import EXPIRY_MARGIN_SECONDS, CodeInterpreterPool, run_code
+from chart_data import load_query_results
+from chart_uploads import CHART_FORMATS, ChartUploader, iter_chart_images, strip_chart_output
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients
-s3 = boto3.client("s3")
-athena = boto3.client("athena")
-dynamodb = boto3.resource("dynamodb")
-glue = boto3.client("glue")
-sfn = boto3.client("stepfunctions")
+# AWS clients (created on first use, so a cold start only pays for the clients the invocation needs)
+s3 = LazyClient(lambda: boto3.client("s3"))
+athena = LazyClient(lambda: boto3.client("athena"))
+dynamodb = LazyClient(lambda: boto3.resource("dynamodb"))
+glue = LazyClient(lambda: boto3.client("glue"))
+sfn = LazyClient(lambda: boto3.client("stepfunctions"))
+agentcore = LazyClient(lambda: boto3.client("bedrock-agentcore", region_name=CODE_INTERPRETER_REGION))
 
 # Required environment variables
 ATHENA_DATABASE = os.environ["ATHENA_DATABASE"]
@@ -34,14 +64,87 @@ USE_PERSONALIZE = SEGMENT_STATE_MACHINE_ARN and SOLUTION_VERSION_TABLE
 # S3 bucket for chart images (derived from Athena output location)
 CHART_IMAGE_BUCKET = ATHENA_OUTPUT_LOCATION.replace("s3://", "").split("/")[0]
 
-# Bedrock model setup
-bedrock_model = BedrockModel(
-    model_id=BEDROCK_MODEL_ID, temperature=0.0, boto_session=boto3.Session(region_name="us-west-2")
-)
-
 # SQL result threshold
 SQL_RESULT_THRESHOLD = 300
 
+# Token budget of the rows in one execute_sql_query result, and how the rows are encoded ("table", "tsv" or "columnar")
+RESULT_TOKEN_BUDGET = int(os.environ.get("RESULT_TOKEN_BUDGET", "4000"))
+RESULT_ENCODING = os.environ.get("RESULT_ENCODING", "table")
+# Appended to the marker of rows left out to fit RESULT_TOKEN_BUDGET
+OMITTED_ROWS_HINT = (
+    "Do not describe them as absent from the result. To see them, run a narrower query (filter, aggregate or select "
+    "fewer columns), or use create_downloadable_url with the query_execution_id below for the complete result"
+)
+
+# Time budget for a single Athena query before it is stopped
+ATHENA_QUERY_TIMEOUT_SECONDS = int(os.environ.get("ATHENA_QUERY_TIMEOUT_SECONDS", "30"))
+
+# Maximum number of Athena queries run at the same time by the parallel tool calls of one invocation
+# (the account-wide active query quota is handled by retrying throttled starts in start_query)
+ATHENA_MAX_PARALLEL_QUERIES = int(os.environ.get("ATHENA_MAX_PARALLEL_QUERIES", "5"))
+
+# Oversized results are profiled in one pass over the full result CSV, up to this many cells
+RESULT_PROFILE_MAX_CELLS = int(os.environ.get("RESULT_PROFILE_MAX_CELLS", "2000000"))
+
+# SQL result cache (in-memory LRU and Lambda /tmp), keyed by normalized SQL and table data versions
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "128"))
+RESULT_CACHE_DIR = "/tmp/sql-result-cache"
+RESULT_CACHE_MAX_DISK_BYTES = 256 * 1024 * 1024
+# Cached results of tables that are not Iceberg tables expire within this many seconds, because their
+# files can change without a catalog update (Iceberg tables are versioned by their current snapshot)
+RESULT_CACHE_MAX_AGE_SECONDS = int(os.environ.get("RESULT_CACHE_MAX_AGE_SECONDS", "300"))
+result_cache = QueryResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_DIR, RESULT_CACHE_MAX_DISK_BYTES)
+data_version_resolver = DataVersionResolver(glue, ATHENA_DATABASE, RESULT_CACHE_MAX_AGE_SECONDS)
+
+# Schema catalog cache (in-memory for warm invocations, S3 snapshot for cold starts)
+SCHEMA_CACHE_TTL_SECONDS = int(os.environ.get("SCHEMA_CACHE_TTL_SECONDS", "300"))
+schema_cache = SchemaCatalogCache(s3, CHART_IMAGE_BUCKET, f"schema-cache/{ATHENA_DATABASE}.json", SCHEMA_CACHE_TTL_SECONDS)
+
+# Number of table schemas included in the system prompt (the rest are available through describe_table)
+SCHEMA_TOP_K = int(os.environ.get("SCHEMA_TOP_K", "6"))
+
+# Stream the agent's text to the client while it is generated, in frames sent at most every STREAM_FRAME_INTERVAL_MS
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "true").lower() == "true"
+STREAM_FRAME_INTERVAL_MS = int(os.environ.get("STREAM_FRAME_INTERVAL_MS", "100"))
+
+# Progress events of running tools (query state, chart stages), limited per connection
+PROGRESS_EVENTS_PER_SECOND = float(os.environ.get("PROGRESS_EVENTS_PER_SECOND", "2"))
+PROGRESS_EVENTS_BURST = int(os.environ.get("PROGRESS_EVENTS_BURST", "5"))
+progress = ProgressReporter(PROGRESS_EVENTS_PER_SECOND, PROGRESS_EVENTS_BURST)
+
+# Code interpreter sessions are reused by the chart calls of a conversation until they are idle for
+# CHART_SESSION_IDLE_SECONDS; at most CHART_SESSION_POOL_SIZE idle sessions are kept per container.
+# The session timeout defaults to the idle limit plus the pool's expiry margin, so that the service stops
+# sessions left behind by a container that is frozen or recycled before it evicts them
+CHART_SESSION_IDLE_SECONDS = int(os.environ.get("CHART_SESSION_IDLE_SECONDS", "300"))
+CHART_SESSION_TIMEOUT_SECONDS = int(
+    os.environ.get("CHART_SESSION_TIMEOUT_SECONDS", str(CHART_SESSION_IDLE_SECONDS + EXPIRY_MARGIN_SECONDS))
+)
+CHART_SESSION_POOL_SIZE = int(os.environ.get("CHART_SESSION_POOL_SIZE", "4"))
+CHART_SESSION_WARMUP_CODE = (
+    "import matplotlib\n"
+    "matplotlib.use('Agg')\n"
+    "import matplotlib.pyplot as plt\n"
+    "import numpy as np\n"
+    "import pandas as pd\n"
+)
+chart_sessions = CodeInterpreterPool(
+    agentcore, CHART_SESSION_TIMEOUT_SECONDS, CHART_SESSION_IDLE_SECONDS, CHART_SESSION_POOL_SIZE, CHART_SESSION_WARMUP_CODE
+)
+
+# Query results passed to execute_chart_code are written into the sandbox in parts of CHART_DATA_PART_BYTES,
+# up to CHART_DATA_MAX_BYTES per result
+CHART_DATA_PART_BYTES = int(os.environ.get("CHART_DATA_PART_BYTES", str(4 * 1024 * 1024)))
+CHART_DATA_MAX_BYTES = int(os.environ.get("CHART_DATA_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Chart images are saved in the sandbox as optimized PNG ("png") or lossless WebP ("webp"), uploaded under
+# content-hash keys, and shared with presigned URLs valid for CHART_URL_EXPIRES_SECONDS
+CHART_IMAGE_FORMAT = os.environ.get("CHART_IMAGE_FORMAT", "png")
+if CHART_IMAGE_FORMAT not in CHART_FORMATS:
+    raise ValueError(f"CHART_IMAGE_FORMAT must be one of {', '.join(CHART_FORMATS)}")
+CHART_URL_EXPIRES_SECONDS = int(os.environ.get("CHART_URL_EXPIRES_SECONDS", "3600"))
+chart_uploader = ChartUploader(s3, CHART_IMAGE_BUCKET, "chart-images/", CHART_URL_EXPIRES_SECONDS)
+
 # Personalize-specific additions
 AGENT_INSTRUCTION_ADDITIONAL_ROLE = (
     """
@@ -96,11 +199,13 @@ Your primary role is to:
 
 You have access to the following tools:
 - execute_sql_query: Executes a SQL query on Athena and returns the results
+- describe_table: Returns the detailed schema of a table whose schema is not included in your system prompt
 - create_downloadable_url: Creates a downloadable URL for query results
-- execute_chart_code: Executes Python code in a secure sandbox to generate charts/graphs using matplotlib. The sandbox has pandas, numpy, matplotlib pre-installed. Generated charts are automatically uploaded to S3 and presigned URLs are returned.{AGENT_INSTRUCTION_ADDITIONAL_TOOLS}
+- recall_query_result: Reads the rows of a previously executed query again by its query_execution_id. Results of earlier turns are shown in the history as "[Result elided from history]" stubs; call this tool only when you need their rows again
+- execute_chart_code: Executes Python code in a secure sandbox to generate charts/graphs using matplotlib. The sandbox has pandas, numpy, matplotlib pre-installed. The full results of the queries whose query_execution_ids are passed are loaded as pandas DataFrames. Generated charts are automatically uploaded to S3 and presigned URLs are returned.{AGENT_INSTRUCTION_ADDITIONAL_TOOLS}
 
 When a user asks a question about data, follow this process:
-1. Based on the table structure provided in your system prompt and the user's question, formulate an appropriate SQL query
+1. Based on the table structure provided in your system prompt and the user's question, formulate an appropriate SQL query. If a table you need is listed but its detailed schema is not included, call describe_table first
 2. Execute the query using execute_sql_query
 3. Present the results in a clear, readable format
 4. Explain what the results mean in the context of the user's question
@@ -109,6 +214,7 @@ When a user asks a question about data, follow this process:
 When generating charts with execute_chart_code:
 - matplotlib.use('Agg') is already set, do NOT call it again.
 - Do NOT use seaborn. Use only matplotlib.
+- To chart the result of a query, pass its query_execution_id in query_execution_ids and use the DataFrame df (the first result) or dfs["<query_execution_id>"]. Do NOT copy result rows into python_code as literals.
 - IMPORTANT: Use English for all chart labels, titles, axis labels, and legends because the sandbox does not have Japanese fonts. Explain the chart in Japanese in your text response.
 - Include clear titles, axis labels, and legends
 - Choose appropriate chart types (bar, line, pie, scatter, etc.) based on the data
@@ -131,9 +237,80 @@ Always maintain a conversational tone and refer to previous interactions when ap
 If the user refers to previous conversations, use that context to provide better answers.
 """
 
+# Instruction for folding old turns into the rolling conversation summary
+SUMMARY_INSTRUCTION = """
+You maintain the running summary of a conversation between a user and an SQL assistant that queries Amazon Athena.
+Update the previous summary with the new turns and output only the updated summary.
+Keep everything needed to continue the conversation:
+- The user's goals, questions and stated preferences
+- Tables, columns, filters and the SQL queries that were used, with their query_execution_id
+- Key numbers and findings from the results, segments that were created, and chart descriptions
+- Open questions and follow-ups
+Drop greetings, repetition and raw result rows. Write the summary in the language the user uses.
+"""
+
 
-@tool
-def execute_sql_query(sql_query: str) -> str:
+def query_tool_result(formatted_results: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the tool result of a successful query.
+    The metadata block lets elide_tool_results replace the rows with a stub in later turns.
+
+    Args:
+        formatted_results: The formatted query results
+        metadata: The query_execution_id, row_count, more_rows and columns of the result
+
+    Returns:
+        A ToolResult dictionary with the text and the metadata
+    """
+    return {
+        "status": "success",
+        "content": [
+            {"text": f"{formatted_results}\n\nQuery Execution ID: {metadata['query_execution_id']}"},
+            {"json": metadata},
+        ],
+    }
+
+
+def chart_tool_result(text: str, charts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the tool result of execute_chart_code calls that generated charts.
+    The metadata block lets the handler collect the charts of a turn without parsing the text.
+
+    Args:
+        text: The code output and the chart URLs
+        charts: The uploaded charts from ChartUploader.upload
+
+    Returns:
+        A ToolResult dictionary with the text and the chart metadata
+    """
+    metadata = {"charts": [{"sha256": chart["sha256"], "key": chart["key"], "url": chart["url"]} for chart in charts]}
+    return {"status": "success", "content": [{"text": text}, {"json": metadata}]}
+
+
+def read_query_result(sql_query: str, query_execution: Dict[str, Any]) -> tuple:
+    """
+    Read and format the result of a succeeded query.
+
+    Args:
+        sql_query: The SQL query that was executed
+        query_execution: The QueryExecution of the completed query
+
+    Returns:
+        A tuple of (formatted_results, metadata)
+    """
+    results = get_query_results(query_execution)
+    profile = profile_query_result(query_execution) if results["row_count"] >= SQL_RESULT_THRESHOLD else ""
+    formatted_results = format_query_results(sql_query, results, profile)
+    metadata = {
+        "query_execution_id": query_execution["QueryExecutionId"],
+        "row_count": results["row_count"],
+        "more_rows": results["row_count"] >= SQL_RESULT_THRESHOLD,
+        "columns": results["columns"],
+    }
+    return formatted_results, metadata
+
+
+def execute_sql_query(sql_query: str):
     """
     Execute a SQL query on Amazon Athena.
 
@@ -141,28 +318,57 @@ def execute_sql_query(sql_query: str) -> str:
         sql_query: The SQL query to execute
 
     Returns:
-        The query results as a formatted string, including the query_execution_id
+        The query results as a formatted string, including the query_execution_id,
+        followed by the result metadata (row count and columns)
     """
     try:
         logger.info(sql_query)
-        response = athena.start_query_execution(
-            QueryString=sql_query,
-            QueryExecutionContext={"Database": ATHENA_DATABASE},
-            ResultConfiguration={"OutputLocation": ATHENA_OUTPUT_LOCATION},
-            WorkGroup=ATHENA_WORKGROUP,
-        )
 
-        query_execution_id = response["QueryExecutionId"]
-        # Wait for the query to complete
-        query_status = wait_for_query_completion(query_execution_id)
+        # Reuse the result of an identical query if none of the referenced tables changed
+        result_key = get_result_cache_key(sql_query)
+        if result_key:
+            cached = result_cache.get(result_key)
+            if cached and "metadata" in cached:
+                logger.info(f"Result cache hit, reusing Query Execution ID: {cached['metadata']['query_execution_id']}")
+                return query_tool_result(cached["formatted_results"], cached["metadata"])
+
+        # Limit how many queries the parallel tool calls of this invocation run at once
+        task_id = uuid.uuid4().hex[:8]
+        progress.report("execute_sql_query", task_id, "waiting")
+        with fanout_slot(ATHENA_MAX_PARALLEL_QUERIES):
+            query_execution_id = start_query(
+                athena,
+                QueryString=sql_query,
+                QueryExecutionContext={"Database": ATHENA_DATABASE},
+                ResultConfiguration={"OutputLocation": ATHENA_OUTPUT_LOCATION},
+                WorkGroup=ATHENA_WORKGROUP,
+            )
+
+            # Wait for the query to complete
+            outcome = wait_for_query_completion(query_execution_id, task_id)
+        query_status = outcome["state"]
+        progress.report(
+            "execute_sql_query",
+            task_id,
+            query_status.lower(),
+            query_execution_id=query_execution_id,
+            data_scanned_bytes=outcome["data_scanned_bytes"],
+            queue_ms=outcome["queued_ms"],
+            engine_ms=outcome["running_ms"],
+        )
         logger.info(f"Query Execution ID: {query_execution_id}, query_status: {query_status}")
         if query_status == "SUCCEEDED":
             # Get the query results
-            results = get_query_results(query_execution_id)
-            formatted_results = format_query_results(sql_query, results)
+            formatted_results, metadata = read_query_result(sql_query, outcome["query_execution"])
+            if result_key and not formatted_results.startswith("Error formatting results"):
+                result_cache.put(result_key, {"formatted_results": formatted_results, "metadata": metadata})
 
             # Add query_execution_id to the response
-            return f"{formatted_results}\n\nQuery Execution ID: {query_execution_id}"
+            return query_tool_result(formatted_results, metadata)
+        elif query_status == "TIMEOUT":
+            return f"Query failed with status: TIMEOUT (the query was stopped after {ATHENA_QUERY_TIMEOUT_SECONDS} seconds)"
+        elif outcome["reason"]:
+            return f"Query failed with status: {query_status}. Reason: {outcome['reason']}"
         else:
             return f"Query failed with status: {query_status}"
 
@@ -171,7 +377,56 @@ def execute_sql_query(sql_query: str) -> str:
         return f"Error executing query: {str(e)}"
 
 
-@tool
+def get_own_query_execution(query_execution_id: str) -> Dict[str, Any]:
+    """
+    Get a succeeded query execution of this application's workgroup.
+
+    Args:
+        query_execution_id: The Athena query execution ID
+
+    Returns:
+        The QueryExecution
+
+    Raises:
+        ValueError: If the query was not executed in ATHENA_WORKGROUP or did not succeed
+    """
+    query_execution = athena.get_query_execution(QueryExecutionId=query_execution_id)["QueryExecution"]
+
+    # Only results of this application's workgroup can be read
+    if query_execution.get("WorkGroup") != ATHENA_WORKGROUP:
+        raise ValueError(f"Query {query_execution_id} was not executed by this assistant")
+    if query_execution["Status"]["State"] != "SUCCEEDED":
+        raise ValueError(f"Query {query_execution_id} has no result (status: {query_execution['Status']['State']})")
+    return query_execution
+
+
+def recall_query_result(query_execution_id: str):
+    """
+    Read the result of a previously executed query again from its Athena output.
+    Use this when you need the rows of a query from an earlier turn, whose result is shown
+    only as a "[Result elided from history]" stub. The query is not executed again.
+
+    Args:
+        query_execution_id: The Athena query execution ID shown in the stub
+
+    Returns:
+        The query results as a formatted string, including the query_execution_id,
+        followed by the result metadata (row count and columns)
+    """
+    try:
+        try:
+            query_execution = get_own_query_execution(query_execution_id)
+        except ValueError as e:
+            return f"Error: {str(e)}"
+
+        formatted_results, metadata = read_query_result(query_execution["Query"], query_execution)
+        return query_tool_result(formatted_results, metadata)
+
+    except Exception as e:
+        logger.error(f"Error recalling query result: {str(e)}")
+        return f"Error recalling query result: {str(e)}"
+
+
 def create_downloadable_url(query_execution_id: str) -> str:
     """
     Create a downloadable file from Athena query results and generate a presigned URL.
@@ -216,23 +471,7 @@ def create_downloadable_url(query_execution_id: str) -> str:
         return f"Error creating downloadable URL: {str(e)}"
 
 
-MAX_CHART_FILE_SIZE = 10 * 1024 * 1024  # 10MB limit per chart image
-PNG_HEADER = b'\x89PNG\r\n\x1a\n'
-
-
-def _validate_png(data: bytes) -> bool:
-    """Validate that data starts with a valid PNG header and is within size limit."""
-    if len(data) > MAX_CHART_FILE_SIZE:
-        logger.warning(f"Chart image too large: {len(data)} bytes (limit: {MAX_CHART_FILE_SIZE})")
-        return False
-    if not data.startswith(PNG_HEADER):
-        logger.warning("Chart image does not have valid PNG header")
-        return False
-    return True
-
-
-@tool
-def execute_chart_code(python_code: str, description: str = "") -> str:
+def execute_chart_code(python_code: str, description: str = "", query_execution_ids: Optional[List[str]] = None) -> str:
     """
     Execute Python code in a secure sandbox to generate charts/graphs using matplotlib.
     Generated chart images are saved as files in the sandbox, then retrieved by the Lambda
@@ -241,44 +480,58 @@ def execute_chart_code(python_code: str, description: str = "") -> str:
     IMPORTANT: The code MUST use matplotlib. matplotlib.use('Agg') is already set.
     Do NOT use seaborn. Use only matplotlib.
 
+    To chart query results, pass their query_execution_ids instead of copying rows into the code.
+    The full results are loaded before the code runs, as pandas DataFrames in the dictionary
+    dfs (keyed by query_execution_id); the first one is also available as df.
+
     Args:
         python_code: Python code that generates charts using matplotlib.
         description: Brief description of what the chart shows.
+        query_execution_ids: Athena query execution IDs whose results are loaded as DataFrames.
 
     Returns:
         A string containing presigned S3 URLs for each generated chart image,
         or an error/status message if no charts were generated.
     """
-    # Wrap user code: intercept savefig/show/close to capture chart files
+    # Wrap user code: intercept savefig/show/close to capture chart files.
+    # The session may be reused from an earlier call, so figures left open by it are closed and
+    # savefig is only patched on top of the original method.
     wrapped_code = (
         "import matplotlib\n"
         "matplotlib.use('Agg')\n"
         "import warnings\n"
         "warnings.filterwarnings('ignore')\n"
         "import matplotlib.pyplot as plt\n"
-        "import json, os, base64, io\n"
+        "import base64, hashlib, io\n"
+        "plt.close('all')\n"
         "_chart_images = []\n"
-        "_chart_counter = [0]\n"
+        "_chart_hashes = set()\n"
+        f"_CHART_FORMAT = {CHART_IMAGE_FORMAT!r}\n"
+        f"_CHART_PIL_KWARGS = {CHART_FORMATS[CHART_IMAGE_FORMAT]['pil_kwargs']!r}\n"
         "\n"
-        "# Patch savefig to capture images as base64\n"
-        "_orig_savefig = plt.Figure.savefig\n"
+        "# Capture a figure once per distinct image (a figure saved and then shown is the same image)\n"
+        "if not hasattr(plt.Figure, '_unpatched_savefig'):\n"
+        "    plt.Figure._unpatched_savefig = plt.Figure.savefig\n"
+        "_orig_savefig = plt.Figure._unpatched_savefig\n"
+        "def _capture(fig):\n"
+        "    _buf = io.BytesIO()\n"
+        "    _orig_savefig(fig, _buf, format=_CHART_FORMAT, bbox_inches='tight', dpi=150, pil_kwargs=_CHART_PIL_KWARGS)\n"
+        "    _data = _buf.getvalue()\n"
+        "    _digest = hashlib.sha256(_data).hexdigest()\n"
+        "    if _digest not in _chart_hashes:\n"
+        "        _chart_hashes.add(_digest)\n"
+        "        _chart_images.append(_data)\n"
+        "\n"
+        "# Patch savefig to capture images\n"
         "def _patched_savefig(self, fname, *a, **k):\n"
         "    _orig_savefig(self, fname, *a, **k)\n"
-        "    _buf = io.BytesIO()\n"
-        "    _orig_savefig(self, _buf, format='png', bbox_inches='tight', dpi=150)\n"
-        "    _buf.seek(0)\n"
-        "    _chart_counter[0] += 1\n"
-        "    _chart_images.append({'i': _chart_counter[0], 'd': base64.b64encode(_buf.read()).decode()})\n"
+        "    _capture(self)\n"
         "plt.Figure.savefig = _patched_savefig\n"
         "\n"
         "# Patch show to capture all open figures\n"
         "def _capture_open_figs():\n"
         "    for _i in plt.get_fignums():\n"
-        "        _buf = io.BytesIO()\n"
-        "        _orig_savefig(plt.figure(_i), _buf, format='png', bbox_inches='tight', dpi=150)\n"
-        "        _buf.seek(0)\n"
-        "        _chart_counter[0] += 1\n"
-        "        _chart_images.append({'i': _chart_counter[0], 'd': base64.b64encode(_buf.read()).decode()})\n"
+        "        _capture(plt.figure(_i))\n"
         "def _pshow(*a, **k):\n"
         "    _capture_open_figs()\n"
         "plt.show = _pshow\n"
@@ -287,92 +540,60 @@ def execute_chart_code(python_code: str, description: str = "") -> str:
         "\n"
         "# Final capture of any remaining open figures\n"
         "_capture_open_figs()\n"
-        "# Deduplicate by index\n"
-        "_seen = set()\n"
-        "_unique = []\n"
-        "for _img in _chart_images:\n"
-        "    if _img['i'] not in _seen:\n"
-        "        _seen.add(_img['i'])\n"
-        "        _unique.append(_img)\n"
-        "print('__CHART_IMG__' + json.dumps(_unique) + '__CHART_END__')\n"
+        "# One line per image, so the Lambda decodes each image without parsing the others\n"
+        "for _data in _chart_images:\n"
+        "    print('__CHART_IMG__' + base64.b64encode(_data).decode() + '__CHART_END__')\n"
     )
 
-    agentcore_client = boto3.client("bedrock-agentcore", region_name=CODE_INTERPRETER_REGION)
-    session_id = None
+    task_id = uuid.uuid4().hex[:8]
     try:
-        # Start session
-        session_resp = agentcore_client.start_code_interpreter_session(
-            codeInterpreterIdentifier="aws.codeinterpreter.v1",
-            name=f"chart-{uuid.uuid4().hex[:8]}",
-            sessionTimeoutSeconds=300
-        )
-        session_id = session_resp["sessionId"]
-        logger.info(f"CodeInterpreter session started: {session_id}")
-
-        # Execute code
-        exec_resp = agentcore_client.invoke_code_interpreter(
-            codeInterpreterIdentifier="aws.codeinterpreter.v1",
-            sessionId=session_id,
-            name="executeCode",
-            arguments={"language": "python", "code": wrapped_code}
-        )
+        # Locate the result CSVs before a session is used, so an invalid ID fails fast
+        sources = []
+        for query_execution_id in query_execution_ids or []:
+            try:
+                query_execution = get_own_query_execution(query_execution_id)
+            except ValueError as e:
+                return f"Error: {str(e)}"
+            bucket, key = query_execution["ResultConfiguration"]["OutputLocation"][len("s3://") :].split("/", 1)
+            sources.append({"query_execution_id": query_execution_id, "bucket": bucket, "key": key})
+
+        progress.report("execute_chart_code", task_id, "starting_session")
+        # Use a pooled session of this conversation, or start one
+        with chart_sessions.session() as session_id:
+            progress.report("execute_chart_code", task_id, "session_started")
+
+            data_notes = []
+            if sources:
+                progress.report("execute_chart_code", task_id, "loading_data", query_count=len(sources))
+                loader_code, data_notes = load_query_results(
+                    agentcore, session_id, s3, sources, CHART_DATA_PART_BYTES, CHART_DATA_MAX_BYTES
+                )
+                wrapped_code = loader_code + wrapped_code
+
+            # Execute code
+            started = time.perf_counter()
+            stdout, _ = run_code(agentcore, session_id, wrapped_code)
+            logger.info(f"CodeInterpreter executed chart code in {(time.perf_counter() - started) * 1000:.0f}ms")
 
-        # Collect output from stream
-        all_text = []
-        for event in exec_resp.get("stream", []):
-            logger.info(f"CodeInterpreter event: {json.dumps(event, default=str)[:2000]}")
-            if "result" in event:
-                result = event["result"]
-                for c in result.get("content", []):
-                    if c.get("type") == "text" and c.get("text"):
-                        all_text.append(c["text"])
-                sc = result.get("structuredContent", {})
-                if sc.get("stdout"):
-                    all_text.append(sc["stdout"])
-
-        stdout = "\n".join(all_text)
         logger.info(f"CodeInterpreter stdout_len={len(stdout)}, has_marker={'__CHART_IMG__' in stdout}")
 
-        # Parse chart images from output (base64 encoded via stdout)
-        chart_images = []
-        clean_output = stdout
-        if "__CHART_IMG__" in stdout and "__CHART_END__" in stdout:
-            start = stdout.find("__CHART_IMG__") + len("__CHART_IMG__")
-            end = stdout.find("__CHART_END__")
-            img_json = stdout[start:end]
-            clean_output = stdout[:stdout.find("__CHART_IMG__")].strip()
-            try:
-                chart_images = json.loads(img_json)
-            except Exception as e:
-                logger.error(f"Error parsing chart image data: {str(e)}")
+        # Decode, validate, deduplicate, and upload the chart images to S3 in parallel
+        clean_output = strip_chart_output(stdout)
+        chart_count = stdout.count("__CHART_IMG__")
+        progress.report("execute_chart_code", task_id, "uploading", chart_count=chart_count)
+        charts = chart_uploader.upload(iter_chart_images(stdout), CHART_IMAGE_FORMAT)
 
-        # Decode, validate, and upload each chart image to S3
-        image_urls = []
-        for img_data in chart_images:
-            try:
-                img_bytes = base64.b64decode(img_data['d'])
-
-                # Validate PNG before uploading to S3
-                if not _validate_png(img_bytes):
-                    continue
-
-                ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-                file_key = f"chart-images/{ts}_{uuid.uuid4().hex[:8]}.png"
-                s3.put_object(Bucket=CHART_IMAGE_BUCKET, Key=file_key, Body=img_bytes, ContentType='image/png')
-                url = s3.generate_presigned_url('get_object', Params={'Bucket': CHART_IMAGE_BUCKET, 'Key': file_key}, ExpiresIn=3600)
-                image_urls.append(url)
-                logger.info(f"Uploaded chart to s3://{CHART_IMAGE_BUCKET}/{file_key}")
-            except Exception as e:
-                logger.error(f"Error processing chart image: {str(e)}")
-
-        if image_urls:
+        progress.report("execute_chart_code", task_id, "completed", chart_count=len(charts))
+        if data_notes:
+            clean_output = "Loaded data:\n" + "\n".join(data_notes) + (f"\n\n{clean_output}" if clean_output else "")
+        if charts:
             parts = []
             if clean_output:
                 parts.append(f"Code output:\n{clean_output}")
-            parts.append(f"Generated {len(image_urls)} chart(s):")
-            for i, url in enumerate(image_urls):
-                parts.append(f"Chart {i+1} URL: {url}")
-            return "\n".join(parts)
+            parts.append(f"Generated {len(charts)} chart(s):")
+            for i, chart in enumerate(charts):
+                parts.append(f"Chart {i+1} URL: {chart['url']}")
+            return chart_tool_result("\n".join(parts), charts)
         elif clean_output:
             return f"Code output (no charts generated):\n{clean_output}"
         else:
@@ -380,19 +601,10 @@ def execute_chart_code(python_code: str, description: str = "") -> str:
 
     except Exception as e:
         logger.error(f"Error in execute_chart_code: {str(e)}")
+        progress.report("execute_chart_code", task_id, "failed")
         return f"Error executing chart code: {str(e)}"
-    finally:
-        if session_id:
-            try:
-                agentcore_client.stop_code_interpreter_session(
-                    codeInterpreterIdentifier="aws.codeinterpreter.v1",
-                    sessionId=session_id
-                )
-            except Exception:
-                pass
 
 
-@tool
 def create_personalize_item_based_segment(item_ids: List[str]) -> str:
     """
     Create an item-based segment using Amazon Personalize's batch segment job.
@@ -443,7 +655,6 @@ def create_personalize_item_based_segment(item_ids: List[str]) -> str:
         return f"Error creating Amazon Personalize item-based segment: {str(e)}"
 
 
-@tool
 def check_personalize_segment_status() -> str:
     """
     Check the status of the Amazon Personalize batch segment job.
@@ -492,70 +703,140 @@ def check_personalize_segment_status() -> str:
         return f"Error checking Amazon Personalize batch segment job status: {str(e)}"
 
 
-def wait_for_query_completion(query_execution_id: str) -> str:
+def get_result_cache_key(sql_query: str):
+    """
+    Build the result cache key for a SQL query.
+    The key combines the normalized SQL with the data version of every referenced table,
+    so a cached result is never reused after one of those tables changed.
+
+    Args:
+        sql_query: The SQL query
+
+    Returns:
+        The cache key, or None if the query result must not be cached
+    """
+    try:
+        normalized_sql = normalize_sql(sql_query)
+        if not is_cacheable(normalized_sql):
+            return None
+
+        tables = referenced_tables(normalized_sql, schema_cache.schemas.keys(), ATHENA_DATABASE)
+        if not tables:
+            return None
+
+        data_versions = {}
+        for table_name in tables:
+            data_version = data_version_resolver.get(table_name)
+            if data_version is None:
+                return None
+            data_versions[table_name] = data_version
+
+        return cache_key(normalized_sql, data_versions)
+    except Exception as e:
+        logger.warning(f"Error building result cache key: {str(e)}")
+        return None
+
+
+def wait_for_query_completion(query_execution_id: str, task_id: str = None) -> Dict[str, Any]:
     """
-    Wait for an Athena query to complete and return its final state.
+    Wait for an Athena query to complete, stopping it if it exceeds ATHENA_QUERY_TIMEOUT_SECONDS.
 
     Args:
         query_execution_id: The ID of the query execution
+        task_id: If set, the query state and statistics are reported as progress events of this task
 
     Returns:
-        The final query state (e.g., 'SUCCEEDED', 'FAILED')
+        The query outcome from athena_executor.wait_for_query, whose "state" is the final
+        query state (e.g., 'SUCCEEDED', 'FAILED', 'TIMEOUT')
     """
-    import time
 
-    max_retries = 30
-    retry_count = 0
+    def report_poll(state, statistics):
+        progress.report(
+            "execute_sql_query",
+            task_id,
+            state.lower(),
+            query_execution_id=query_execution_id,
+            data_scanned_bytes=statistics.get("DataScannedInBytes", 0),
+            queue_ms=statistics.get("QueryQueueTimeInMillis", 0),
+            engine_ms=statistics.get("EngineExecutionTimeInMillis", 0),
+        )
 
-    while retry_count < max_retries:
-        response = athena.get_query_execution(QueryExecutionId=query_execution_id)
-        state = response["QueryExecution"]["Status"]["State"]
+    return wait_for_query(athena, query_execution_id, ATHENA_QUERY_TIMEOUT_SECONDS, report_poll if task_id else None)
 
-        if state in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            return state
 
-        retry_count += 1
-        time.sleep(1)  # Wait for 1 second before checking again
+def get_query_results(query_execution: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the results of a completed Athena query as column arrays.
+    The output CSV is streamed from S3 with ranged GETs and reading stops after SQL_RESULT_THRESHOLD rows.
+    Statements without a CSV output (e.g., SHOW or DESCRIBE) are read with GetQueryResults instead.
 
-    return "TIMEOUT"
+    Args:
+        query_execution: The QueryExecution of the completed query
+
+    Returns:
+        The query results (columns, data and row_count)
+    """
+    output_location = query_execution["ResultConfiguration"]["OutputLocation"]
+    if output_location.endswith(".csv"):
+        return read_result_columns(s3, output_location, SQL_RESULT_THRESHOLD)
+
+    results = athena.get_query_results(QueryExecutionId=query_execution["QueryExecutionId"], MaxResults=SQL_RESULT_THRESHOLD + 1)
+    return columns_from_query_results(results)
 
 
-def get_query_results(query_execution_id: str) -> Dict[str, Any]:
+def profile_query_result(query_execution: Dict[str, Any]) -> str:
     """
-    Get the results of a completed Athena query.
+    Profile the full result of a query in one streaming pass over its output CSV.
+    Column types come from the ResultSetMetadata, so numeric columns get min/max/mean.
+    At most RESULT_PROFILE_MAX_CELLS values are profiled.
 
     Args:
-        query_execution_id: The ID of the query execution
+        query_execution: The QueryExecution of the completed query
 
     Returns:
-        The query results
+        The rendered column profile, or an empty string if the result cannot be profiled
     """
-    return athena.get_query_results(QueryExecutionId=query_execution_id, MaxResults=SQL_RESULT_THRESHOLD + 1)
+    try:
+        output_location = query_execution["ResultConfiguration"]["OutputLocation"]
+        if not output_location.endswith(".csv"):
+            return ""
+
+        metadata = athena.get_query_results(QueryExecutionId=query_execution["QueryExecutionId"], MaxResults=1)
+        column_types = [column["Type"] for column in metadata["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]]
+        max_rows = max(1, RESULT_PROFILE_MAX_CELLS // max(1, len(column_types)))
+
+        profile = profile_rows(iter_result_rows(s3, output_location), column_types, max_rows)
+        logger.info(f"Profiled {profile['row_count']} rows (complete: {profile['complete']})")
+        return render_profile(profile)
+    except Exception as e:
+        logger.error(f"Error profiling query result: {str(e)}")
+        return ""
 
 
-def format_query_results(sql_query: str, results: Dict[str, Any]) -> str:
+def format_query_results(sql_query: str, results: Dict[str, Any], profile: str = "") -> str:
     """
     Format Athena query results into a readable string.
-    If the number of rows exceeds SQL_RESULT_THRESHOLD, suggest downloading the results as CSV.
+    The rows are encoded with result_encoder within RESULT_TOKEN_BUDGET tokens; rows that do not fit are
+    left out with a marker that tells how many rows are missing and how to get them.
+    If the number of rows exceeds SQL_RESULT_THRESHOLD, suggest downloading the results as CSV
+    and include the column profile of the full result.
 
     Args:
         sql_query: The SQL query that was executed
-        results: The query results from Athena
+        results: The query results from get_query_results
+        profile: The rendered column profile of the full result, if any
 
     Returns:
         A formatted string representation of the results
     """
     try:
-        rows = results["ResultSet"]["Rows"]
+        header = results["columns"]
 
-        if not rows:
+        if not header:
             return "Query executed successfully, but returned no results."
 
-        # Extract column names from the first row
-        header = [col["VarCharValue"] for col in rows[0]["Data"]]
-
-        # Check if the number of rows exceeds the threshold
-        row_count = len(rows) - 1  # Subtract 1 for the header row
+        row_count = results["row_count"]
+        data = results["data"]
 
         # Format the results as a table
         output = [f"SQL Query: {sql_query}\n"]
@@ -563,45 +844,33 @@ def format_query_results(sql_query: str, results: Dict[str, Any]) -> str:
         if row_count >= SQL_RESULT_THRESHOLD:
             output.append(f"Results: more than {row_count} rows returned (exceeds the threshold)")
             output.append(
-                "\nThe result set is too large as a response to an Agent. Please explain using the preview and urge client to download the full results as CSV"
+                "\nThe result set is too large as a response to an Agent. Please explain using the preview and the column profile of the full result, and urge client to download the full results as CSV. Do not run additional queries only to describe this result"
+                if profile
+                else "\nThe result set is too large as a response to an Agent. Please explain using the preview and urge client to download the full results as CSV"
             )
             output.append("\nShowing first few rows as preview:")
 
-            # Add header row
-            header_str = " | ".join(header)
-            output.append(header_str)
-            output.append("-" * len(header_str))
-
-            # Add only the first few rows as a preview
-            preview_rows = min(20, row_count)  # Show at most 20 rows as preview
-            for row in rows[1 : preview_rows + 1]:  # Skip header row
-                row_data = []
-                for col in row["Data"]:
-                    if "VarCharValue" in col:
-                        row_data.append(col["VarCharValue"])
-                    else:
-                        row_data.append("NULL")
-                output.append(" | ".join(row_data))
-
-            output.append("...")
-            output.append(f"\nTo download the complete results, use create_downloadable_url with the query_execution_id provided below.")
+            # Show at most 20 rows as preview
+            data = [column[:20] for column in data]
         else:
             output.append(f"Results: {row_count} rows returned")
 
-            # Add header row
-            header_str = " | ".join(header)
-            output.append(header_str)
-            output.append("-" * len(header_str))
-
-            # Add all data rows
-            for row in rows[1:]:  # Skip header row
-                row_data = []
-                for col in row["Data"]:
-                    if "VarCharValue" in col:
-                        row_data.append(col["VarCharValue"])
-                    else:
-                        row_data.append("NULL")
-                output.append(" | ".join(row_data))
+        output.append(
+            encode_result(
+                header,
+                data,
+                RESULT_TOKEN_BUDGET,
+                RESULT_ENCODING,
+                result_rows=row_count,
+                more_rows_hint=OMITTED_ROWS_HINT,
+            )
+        )
+
+        if row_count >= SQL_RESULT_THRESHOLD:
+            output.append("...")
+            if profile:
+                output.append(f"\n{profile}")
+            output.append(f"\nTo download the complete results, use create_downloadable_url with the query_execution_id provided below.")
 
         return "\n".join(output)
 
@@ -615,24 +884,30 @@ def list_athena_tables() -> tuple:
     List all available tables in the Athena database using AWS Glue API.
     Includes table descriptions/comments.
 
+    All pages of glue.get_tables are read, so the table definitions returned here
+    can be rendered without an additional glue.get_table call per table.
+
     Returns:
         A tuple containing:
         - A string with formatted table list for display
-        - A list of table dictionaries with name and description
+        - A list of table dictionaries with name, description, version and the Glue table definition
     """
     try:
         # Get all tables from Glue Data Catalog
-        response = glue.get_tables(DatabaseName=ATHENA_DATABASE)
+        paginator = glue.get_paginator("get_tables")
+        table_list = []
+        for page in paginator.paginate(DatabaseName=ATHENA_DATABASE):
+            table_list.extend(page.get("TableList", []))
 
-        if "TableList" not in response or not response["TableList"]:
+        if not table_list:
             return f"No tables found in database '{ATHENA_DATABASE}'.", []
 
         # Extract table information
         tables = []
-        for table in response["TableList"]:
+        for table in table_list:
             table_name = table["Name"]
             table_description = table.get("Description", "No description available")
-            tables.append({"name": table_name, "description": table_description})
+            tables.append({"name": table_name, "description": table_description, "version": table_version(table), "table": table})
 
         # Format the results for display
         tables_info = []
@@ -669,51 +944,7 @@ def describe_athena_table(table_name: str) -> str:
         if "Table" not in response:
             return f"Table '{table_name}' not found in database '{ATHENA_DATABASE}'."
 
-        table = response["Table"]
-
-        # Format the results
-        schema = []
-
-        # Add table information
-        schema.append(f"Schema for table '{table_name}':")
-        table_description = table.get("Description", "No description available")
-        schema.append(f"Table Description: {table_description}")
-        schema.append("")
-
-        # Add column information
-        schema.append("Column Name | Data Type | Description")
-        schema.append("------------|-----------|------------")
-
-        # Get columns from StorageDescriptor
-        if "StorageDescriptor" in table and "Columns" in table["StorageDescriptor"]:
-            columns = table["StorageDescriptor"]["Columns"]
-            for column in columns:
-                column_name = column["Name"]
-                column_type = column["Type"]
-                column_comment = column.get("Comment", "No description available")
-                schema.append(f"{column_name} | {column_type} | {column_comment}")
-
-        # Add partition keys if any
-        if "PartitionKeys" in table and table["PartitionKeys"]:
-            schema.append("")
-            schema.append("Partition Keys:")
-            schema.append("Column Name | Data Type | Description")
-            schema.append("------------|-----------|------------")
-
-            for column in table["PartitionKeys"]:
-                column_name = column["Name"]
-                column_type = column["Type"]
-                column_comment = column.get("Comment", "No description available")
-                schema.append(f"{column_name} | {column_type} | {column_comment}")
-
-        # Add additional table properties if available
-        if "Parameters" in table and table["Parameters"]:
-            schema.append("")
-            schema.append("Table Properties:")
-            for key, value in table["Parameters"].items():
-                schema.append(f"{key}: {value}")
-
-        return "\n".join(schema)
+        return render_table_schema(response["Table"])
 
     except Exception as e:
         logger.error(f"Error describing Athena table: {str(e)}")
@@ -725,10 +956,20 @@ def get_all_table_information() -> str:
     Get information about all available tables in the Athena database.
     This function lists all tables and describes their schemas.
 
+    The table definitions are read in a single paginated pass over glue.get_tables.
+    The rendered text is cached in memory for SCHEMA_CACHE_TTL_SECONDS and snapshotted to S3.
+    After the TTL, the table list is fetched again and only tables whose VersionId/UpdateTime
+    changed are rendered again.
+
     Returns:
         A string containing comprehensive information about all tables
     """
     try:
+        if schema_cache.is_fresh():
+            return schema_cache.text
+
+        schema_cache.load_snapshot()
+
         # Get formatted table list and table data in one call
         tables_info, tables = list_athena_tables()
 
@@ -742,20 +983,190 @@ def get_all_table_information() -> str:
         all_schemas.append(tables_info)
         all_schemas.append("\n\nDETAILED TABLE SCHEMAS:")
 
+        versions = {}
+        schemas = {}
         for table in tables:
             table_name = table["name"]
-            table_schema = describe_athena_table(table_name)
+            table_schema = schema_cache.cached_schema(table_name, table["version"])
+            if table_schema is None:
+                table_schema = render_table_schema(table["table"])
             all_schemas.append(f"\n{table_schema}")
+            versions[table_name] = table["version"]
+            schemas[table_name] = table_schema
 
-        return "\n".join(all_schemas)
+        table_information = "\n".join(all_schemas)
+        schema_cache.update(versions, schemas, tables_info, table_information)
+        return table_information
     except Exception as e:
         logger.error(f"Error getting table information: {str(e)}")
         return f"Error retrieving table information: {str(e)}"
 
 
+def get_relevant_table_information(user_input: str, messages: list, table_information: str) -> str:
+    """
+    Get table information for the system prompt, pruned to the tables relevant to the conversation.
+    The full table list is always included, but detailed schemas are only included for the
+    SCHEMA_TOP_K tables that best match the user's question and the recent conversation (BM25).
+    The agent can fetch any other schema with the describe_table tool.
+
+    Args:
+        user_input: The user's current message
+        messages: The conversation history
+        table_information: The information of all tables from get_all_table_information
+
+    Returns:
+        A string containing the table list and the relevant table schemas
+    """
+    # Fall back to the full text when the catalog is small or could not be cached
+    if table_information != schema_cache.text or len(schema_cache.schemas) <= SCHEMA_TOP_K:
+        return table_information
+
+    try:
+        query = build_retrieval_query(user_input, messages)
+        selected = set(schema_cache.get_index().top_k(query, SCHEMA_TOP_K))
+        logger.info(f"Selected table schemas for prompt: {sorted(selected)}")
+
+        all_schemas = [schema_cache.listing]
+        all_schemas.append(
+            f"\n\nDETAILED TABLE SCHEMAS (only the {len(selected)} most relevant of {len(schema_cache.schemas)} tables are shown. "
+            "Use describe_table to get the schema of any other table):"
+        )
+        for table_name, table_schema in schema_cache.schemas.items():
+            if table_name in selected:
+                all_schemas.append(f"\n{table_schema}")
+
+        return "\n".join(all_schemas)
+    except Exception as e:
+        logger.error(f"Error selecting relevant tables: {str(e)}")
+        return table_information
+
+
+def describe_table(table_name: str) -> str:
+    """
+    Get the detailed schema of an Athena table, including column types and descriptions.
+    Use this when the table is listed in the system prompt but its detailed schema is not included.
+
+    Args:
+        table_name: The name of the table to describe
+
+    Returns:
+        The table schema with column descriptions, partition keys and table properties
+    """
+    table_schema = schema_cache.schemas.get(table_name)
+    if table_schema:
+        return table_schema
+    return describe_athena_table(table_name)
+
+
 # filter_messages_for_response is now imported from sessionutils
 
 
+class AgentRuntime:
+    """
+    The strands classes, the Bedrock model and the agent tools.
+    Importing strands and creating the model take most of the cold start, so they are loaded on first use,
+    in the background while the handler reads the session (see preload_agent_runtime).
+    """
+
+    def __init__(self):
+        from strands import Agent, tool
+        from strands.models import BedrockModel
+        from strands.tools.executors import ConcurrentToolExecutor
+        from strands.agent.conversation_manager import NullConversationManager
+
+        self.Agent = Agent
+        self.ConcurrentToolExecutor = ConcurrentToolExecutor
+        self.NullConversationManager = NullConversationManager
+        self.model = BedrockModel(model_id=BEDROCK_MODEL_ID, temperature=0.0, boto_session=boto3.Session(region_name="us-west-2"))
+
+        # Build tools list based on available services
+        functions = [execute_sql_query, describe_table, create_downloadable_url, recall_query_result, execute_chart_code]
+        if USE_PERSONALIZE:
+            functions.extend([create_personalize_item_based_segment, check_personalize_segment_status])
+        self.tools = [tool(function) for function in functions]
+
+
+_agent_runtime = None
+_agent_runtime_lock = threading.Lock()
+
+
+def get_agent_runtime() -> AgentRuntime:
+    """
+    Get the agent runtime, loading it on the first call of the container.
+
+    Returns:
+        The AgentRuntime
+    """
+    global _agent_runtime
+    with _agent_runtime_lock:
+        if _agent_runtime is None:
+            started = time.perf_counter()
+            _agent_runtime = AgentRuntime()
+            logger.info(f"Agent runtime loaded in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return _agent_runtime
+
+
+def preload_agent_runtime() -> None:
+    """Start loading the agent runtime in a background thread (no-op in a warm container)."""
+    if _agent_runtime is None:
+        threading.Thread(target=get_agent_runtime, daemon=True).start()
+
+
+def summarize_conversation(previous_summary: str, messages: list) -> str:
+    """
+    Fold turns into the rolling conversation summary.
+
+    Args:
+        previous_summary: The current summary ("" if none)
+        messages: The messages of the turns to add to the summary
+
+    Returns:
+        The updated summary
+    """
+    runtime = get_agent_runtime()
+    summarizer = runtime.Agent(model=runtime.model, system_prompt=SUMMARY_INSTRUCTION, callback_handler=None)
+    prompt = (
+        f"PREVIOUS SUMMARY:\n{previous_summary or '(none)'}\n\n"
+        f"NEW TURNS:\n{render_transcript(messages)}\n\n"
+        "Output the updated summary."
+    )
+    return str(summarizer(prompt)).strip()
+
+
+def compact_conversation(user_id: str, session_id: str, messages: list, summary: str, summary_message_count: int) -> None:
+    """
+    Fold old turns into the stored summary when the replayed conversation exceeds COMPACTION_TRIGGER_TOKENS.
+    The last COMPACTION_KEEP_TURNS turns stay verbatim. Only the turns that are not in the summary yet
+    are summarized, together with the previous summary, so each compaction costs a bounded amount of input.
+    The raw transcript is not changed.
+
+    Args:
+        user_id: The ID of the user
+        session_id: The ID of the session
+        messages: The full raw transcript
+        summary: The current summary
+        summary_message_count: The number of leading messages covered by the current summary
+    """
+    try:
+        replayed_tokens = estimate_messages_tokens(messages[summary_message_count:]) + estimate_tokens(summary)
+        if replayed_tokens <= COMPACTION_TRIGGER_TOKENS:
+            return
+
+        boundary = select_compaction_boundary(messages, summary_message_count, COMPACTION_KEEP_TURNS)
+        if boundary is None:
+            return
+
+        new_summary = summarize_conversation(summary, messages[summary_message_count:boundary])
+        if new_summary:
+            save_conversation_summary(user_id, session_id, new_summary, boundary)
+            logger.info(
+                f"Compacted messages {summary_message_count}-{boundary - 1} into the summary "
+                f"(replayed tokens before: {replayed_tokens}, after: {estimate_messages_tokens(messages[boundary:]) + estimate_tokens(new_summary)})"
+            )
+    except Exception as e:
+        logger.error(f"Error compacting conversation: {str(e)}")
+
+
 def send_to_connection(connection_id, data, api_gateway_endpoint):
     """
     Send a message to a WebSocket connection.
@@ -765,40 +1176,52 @@ def send_to_connection(connection_id, data, api_gateway_endpoint):
         data: The data to send (will be converted to JSON)
         api_gateway_endpoint: The API Gateway endpoint URL
     """
-    gateway_api = boto3.client("apigatewaymanagementapi", endpoint_url=api_gateway_endpoint)
-
     try:
-        gateway_api.post_to_connection(ConnectionId=connection_id, Data=json.dumps(data).encode("utf-8"))
+        post_to_connection(api_gateway_endpoint, connection_id, data)
     except Exception as e:
         logger.error(f"Error sending message to connection {connection_id}: {str(e)}")
 
 
-def extract_chart_urls_from_messages(messages):
+def extract_turn_charts(messages):
     """
-    Extract chart image URLs from execute_chart_code tool results.
-    The tool returns presigned S3 URLs in its text output.
+    Collect the charts generated in a turn from the metadata of its execute_chart_code results.
+    Only the messages of the turn are passed, so the cost does not grow with the conversation.
 
     Args:
-        messages: The agent's conversation messages
+        messages: The messages added in this turn
 
     Returns:
-        List of presigned URLs for chart images
+        List of charts as {"sha256": ..., "key": ..., "url": ...}, in the order they were generated
     """
-    import re
-    image_urls = []
+    charts = []
     for message in messages:
         for content_item in message.get("content", []):
             if "toolResult" not in content_item:
                 continue
-            tool_result = content_item["toolResult"]
-            for result_content in tool_result.get("content", []):
-                text = result_content.get("text", "")
-                if "Chart" in text and "URL:" in text:
-                    # Extract URLs from "Chart N URL: https://..." lines
-                    url_matches = re.findall(r'Chart \d+ URL: (https://[^\s]+)', text)
-                    image_urls.extend(url_matches)
-    logger.info(f"Extracted {len(image_urls)} chart URLs from messages")
-    return image_urls
+            for result_content in content_item["toolResult"].get("content", []):
+                charts.extend(result_content.get("json", {}).get("charts", []))
+    logger.info(f"Extracted {len(charts)} charts from this turn")
+    return charts
+
+
+def timed_stage(timings: dict, stage: str, function, *args):
+    """
+    Call function(*args) and record how long it took.
+
+    Args:
+        timings: The dictionary of stage timings in milliseconds
+        stage: The name of the stage
+        function: The function to call
+        *args: The arguments of the function
+
+    Returns:
+        The return value of the function
+    """
+    started = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000)
 
 
 def handler(event, context):
@@ -807,7 +1230,7 @@ def handler(event, context):
     Processes user messages asynchronously and sends responses via WebSocket.
 
     Args:
-        event: The event data containing connection_id, user_id, session_id, and message
+        event: The event data containing connection_id, user_id, session_id, message, and optionally last_seq
         context: The Lambda context
 
     Returns:
@@ -820,20 +1243,47 @@ def handler(event, context):
     session_id = event.get("session_id", "")
     user_input = event.get("message", "")
     api_gateway_endpoint = event.get("api_gateway_endpoint", "")
+    # The sequence number of the last history message the client has (only newer messages are sent)
+    last_seq = event.get("last_seq")
 
     if not connection_id or not user_input or not session_id or not user_id or not api_gateway_endpoint:
         logger.error("Missing required parameters")
         return {"statusCode": 400, "body": "Missing required parameters"}
 
+    # Load strands and the model while the session and the schemas are read (first invocation of a container)
+    handler_started = time.perf_counter()
+    timings = {}
+    preload_agent_runtime()
+
+    # Messages sent while the agent runs (processing, stream frames, progress events) are queued and
+    # posted from a background thread; a gone connection is removed from the session
+    pusher = ConnectionPusher(
+        get_management_client(api_gateway_endpoint),
+        connection_id,
+        on_gone=lambda: mark_connection_stale(user_id, session_id, connection_id),
+    )
+
     try:
         # Send processing message to client
-        send_to_connection(connection_id, {"type": "processing", "message": "Processing your request..."}, api_gateway_endpoint)
-
-        # Get conversation history
-        agent_messages = get_conversation_history(user_id, session_id)
-
-        # Get all table information before initializing the agent
-        table_information = get_all_table_information()
+        pusher.push({"type": "processing", "message": "Processing your request..."})
+
+        # The conversation history and the schema catalog are independent reads, so they run concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            session_future = executor.submit(timed_stage, timings, "session", get_session_state, user_id, session_id)
+            schema_future = executor.submit(timed_stage, timings, "schema", get_all_table_information)
+            session_state = session_future.result()
+            all_table_information = schema_future.result()
+
+        # Turns folded into the summary are not replayed to the model
+        summary = session_state["summary"]
+        summary_message_count = session_state["summary_message_count"]
+        # Large tool results of earlier turns are replaced with stubs (recall_query_result reads them again)
+        agent_messages = elide_tool_results(session_state["messages"][summary_message_count:], len(session_state["messages"]))
+
+        # Get the relevant table information before initializing the agent
+        table_information = timed_stage(
+            timings, "schema_selection", get_relevant_table_information, user_input, agent_messages, all_table_information
+        )
 
         # Get current date information
         current_date = datetime.now().strftime("%Y-%m-%d")
@@ -842,34 +1292,69 @@ def handler(event, context):
         enhanced_system_prompt = (
             f"{AGENT_INSTRUCTION}\n\nCURRENT DATE:\nToday's date: {current_date}\n\nAVAILABLE DATABASE INFORMATION:\n{table_information}"
         )
-
-        # Build tools list based on available services
-        tools = [execute_sql_query, create_downloadable_url, execute_chart_code]
-        if USE_PERSONALIZE:
-            tools.extend([create_personalize_item_based_segment, check_personalize_segment_status])
-
-        # Create the agent with conditional tools and conversation history
-        agent = Agent(
-            model=bedrock_model,
-            tools=tools,
+        if summary:
+            enhanced_system_prompt += f"\n\nSUMMARY OF THE EARLIER CONVERSATION (older turns are not included in the messages):\n{summary}"
+
+        # Create the agent with conditional tools and conversation history.
+        # Independent tool calls in the same model response (e.g., one query per brand) run concurrently.
+        # The history is bounded by compact_conversation, so the agent must not trim it: new messages
+        # are appended after the replayed ones and saved as this turn.
+        replayed_count = len(agent_messages)
+        # The text is streamed to the connection that sent the message; the final response below is still
+        # sent in full, so clients that ignore the stream frames keep working.
+        streamer = None
+        if STREAM_RESPONSES:
+            streamer = ResponseStreamer(
+                pusher.push,
+                session_id,
+                STREAM_FRAME_INTERVAL_MS / 1000,
+            )
+        runtime = timed_stage(timings, "runtime_wait", get_agent_runtime)
+        agent = runtime.Agent(
+            model=runtime.model,
+            tools=runtime.tools,
             system_prompt=enhanced_system_prompt,
             messages=agent_messages,
+            tool_executor=runtime.ConcurrentToolExecutor(),
+            conversation_manager=runtime.NullConversationManager(),
+            callback_handler=streamer,
         )
 
         # Get the agent's response
-        agent_response = agent(user_input)
-
-        # Extract chart image URLs from execute_chart_code tool results
-        chart_image_urls = extract_chart_urls_from_messages(agent.messages)
+        progress.bind(pusher.push)
+        chart_sessions.bind(session_id)
+        timings["first_model_call"] = round((time.perf_counter() - handler_started) * 1000)
+        try:
+            agent_response = timed_stage(timings, "agent", agent, user_input)
+        finally:
+            progress.unbind()
+            chart_sessions.unbind()
+            if streamer:
+                streamer.close()
+
+        # The full raw transcript is the summarized messages followed by the messages the agent saw
+        messages = session_state["messages"][:summary_message_count] + agent.messages
+
+        # Charts of this turn are shown with their URLs; charts of earlier turns are presigned from their key
+        new_messages = agent.messages[replayed_count:]
+        turn_charts = extract_turn_charts(new_messages)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Append this turn to the session (only the new turn item and the header are written)
+            save_future = executor.submit(
+                timed_stage, timings, "save", save_conversation_turn, user_id, session_id, new_messages, session_state, turn_charts
+            )
+            # 最新のconnection_idを取得（接続が切れて再接続した場合に備えて）
+            connection_future = executor.submit(timed_stage, timings, "connection", get_active_connection_id, user_id, session_id)
 
-        # Save the updated messages directly from the agent
-        save_conversation_history(user_id, session_id, agent.messages)
+            # Filter messages for response, and keep only the ones the client does not have
+            delta = history_delta(filter_messages_for_response(messages, session_state["charts"] + turn_charts), last_seq)
 
-        # Filter messages for response
-        conversation_history = filter_messages_for_response(agent.messages, chart_image_urls)
+            # Deliver the queued stream frames and progress events before the final message
+            pusher.close()
 
-        # 最新のconnection_idを取得（接続が切れて再接続した場合に備えて）
-        current_connection_id = get_active_connection_id(user_id, session_id) or connection_id
+            current_connection_id = connection_future.result() or connection_id
+            save_future.result()
 
         # Send the response to the client
         try:
@@ -880,20 +1365,30 @@ def handler(event, context):
                     "user_id": user_id,
                     "session_id": session_id,
                     "response": str(agent_response),
-                    "conversation_history": conversation_history,
+                    "conversation_history": presign_chart_references(delta["messages"]),
+                    "base_seq": delta["base_seq"],
+                    "last_seq": delta["last_seq"],
                 },
                 api_gateway_endpoint,
             )
             logger.info(f"Response sent to connection {current_connection_id}")
+            timings["response"] = round((time.perf_counter() - handler_started) * 1000)
+            logger.info(f"Handler stage timings (ms): {json.dumps(timings)}")
         except Exception as e:
             logger.warning(f"Could not send response to connection {current_connection_id}: {str(e)}")
             # 接続エラーが発生した場合、結果は既にDynamoDBに保存されているので問題ない
 
+        # Compact after the response is sent, so the summarization does not delay the user
+        compact_conversation(user_id, session_id, messages, summary, summary_message_count)
+
         return {"statusCode": 200, "body": "Processing complete"}
 
     except Exception as e:
         logger.error(f"Error in agent processor: {str(e)}")
 
+        # Deliver the queued stream frames and progress events before the final message
+        pusher.close()
+
         # 最新のconnection_idを取得（接続が切れて再接続した場合に備えて）
         current_connection_id = get_active_connection_id(user_id, session_id) or connection_id
 
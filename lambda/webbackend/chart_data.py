@@ -0,0 +1,114 @@
+import json
+import logging
+from code_interpreter_pool import write_files
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Query results are written into the sandbox under this directory, one CSV per query execution
+SANDBOX_DATA_DIR = "query_results"
+
+
+def iter_csv_parts(body, part_bytes: int, max_bytes: int):
+    """
+    Split a CSV stream into text parts that end at line boundaries, so a part never splits a
+    row or a multibyte character. The stream is read chunk by chunk and never held in memory as a whole.
+
+    Args:
+        body: The S3 object body (botocore StreamingBody)
+        part_bytes: The approximate size of each part
+        max_bytes: Stop after this many bytes (at a line boundary)
+
+    Yields:
+        Tuples (text, truncated), where truncated is True for the last part if the CSV was cut at max_bytes
+    """
+    pending = b""
+    total = 0
+    for chunk in body.iter_chunks(part_bytes):
+        pending += chunk
+        if total + len(pending) > max_bytes:
+            cut = pending.rfind(b"\n", 0, max_bytes - total) + 1
+            if cut:
+                yield pending[:cut].decode("utf-8"), True
+            else:
+                yield "", True
+            return
+        cut = pending.rfind(b"\n") + 1
+        if cut and cut >= part_bytes // 2:
+            yield pending[:cut].decode("utf-8"), False
+            total += cut
+            pending = pending[cut:]
+    if pending:
+        yield pending.decode("utf-8"), False
+
+
+def load_query_results(client, session_id: str, s3_client, sources: list, part_bytes: int, max_bytes: int) -> tuple:
+    """
+    Stream Athena result CSVs from S3 into a code interpreter session, and build the code that loads
+    them as pandas DataFrames.
+
+    Each CSV is written in parts (writeFiles has a request size limit); the loader code joins the parts
+    into {SANDBOX_DATA_DIR}/<query_execution_id>.csv and reads it. The DataFrames are available to the
+    chart code as dfs[query_execution_id], and the first one also as df.
+
+    Args:
+        client: The boto3 bedrock-agentcore client
+        session_id: The ID of the code interpreter session
+        s3_client: The boto3 S3 client
+        sources: The results to load, as [{"query_execution_id": ..., "bucket": ..., "key": ...}]
+        part_bytes: The approximate size of each written part
+        max_bytes: The maximum number of bytes loaded per result
+
+    Returns:
+        A tuple (loader_code, notes), where notes describe the loaded results for the tool output
+        (results that could not be loaded are left out of dfs and noted)
+    """
+    loaded = []
+    notes = []
+    for source in sources:
+        query_execution_id = source["query_execution_id"]
+        body = s3_client.get_object(Bucket=source["bucket"], Key=source["key"])["Body"]
+        parts = []
+        size = 0
+        truncated = False
+        for index, (text, truncated) in enumerate(iter_csv_parts(body, part_bytes, max_bytes)):
+            if not text:
+                continue
+            path = f"{SANDBOX_DATA_DIR}/{query_execution_id}.part{index:04d}"
+            write_files(client, session_id, [{"path": path, "text": text}])
+            parts.append(path)
+            size += len(text.encode("utf-8"))
+        body.close()
+
+        if not parts:
+            # The first line (the header) alone is larger than max_bytes, so no row boundary fits
+            logger.warning(f"Result {query_execution_id} was not loaded: its first line exceeds {max_bytes} bytes")
+            notes.append(
+                f"dfs[{json.dumps(query_execution_id)}]: not loaded, the result of query {query_execution_id} is too large to load "
+                f"(its first line alone exceeds the {max_bytes}-byte limit); select fewer or shorter columns"
+            )
+            continue
+
+        loaded.append((query_execution_id, parts))
+        logger.info(f"Loaded result {query_execution_id} into the sandbox: {size} bytes in {len(parts)} parts")
+        note = f"dfs[{json.dumps(query_execution_id)}]: result of query {query_execution_id} ({size} bytes)"
+        if truncated:
+            note += ", truncated at a row boundary to fit the size limit"
+        notes.append(note)
+
+    lines = ["import os", "import pandas as pd", "dfs = {}"]
+    for query_execution_id, parts in loaded:
+        path = f"{SANDBOX_DATA_DIR}/{query_execution_id}.csv"
+        lines.extend(
+            [
+                f"with open({json.dumps(path)}, 'wb') as _out:",
+                f"    for _part in {json.dumps(parts)}:",
+                "        with open(_part, 'rb') as _in:",
+                "            _out.write(_in.read())",
+                "        os.remove(_part)",
+                f"dfs[{json.dumps(query_execution_id)}] = pd.read_csv({json.dumps(path)})",
+            ]
+        )
+    if loaded:
+        lines.append(f"df = dfs[{json.dumps(loaded[0][0])}]")
+    return "\n".join(lines) + "\n", notes
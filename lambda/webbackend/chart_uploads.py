@@ -0,0 +1,164 @@
+import binascii
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CHART_MARKER_START = "__CHART_IMG__"
+CHART_MARKER_END = "__CHART_END__"
+
+MAX_CHART_FILE_SIZE = 10 * 1024 * 1024  # 10MB limit per chart image
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+# Image formats the sandbox can emit: extension, content type, and the savefig pil_kwargs (both lossless)
+CHART_FORMATS = {
+    "png": {"extension": "png", "content_type": "image/png", "pil_kwargs": {"optimize": True}},
+    "webp": {"extension": "webp", "content_type": "image/webp", "pil_kwargs": {"lossless": True}},
+}
+
+# Parallel S3 uploads per execute_chart_code call
+MAX_PARALLEL_UPLOADS = 8
+
+
+def iter_chart_images(stdout: str):
+    """
+    Decode the chart images printed by the sandbox wrapper, one image at a time.
+    Each image is printed as __CHART_IMG__<base64>__CHART_END__, so an image is decoded straight from
+    its slice of stdout, without building an intermediate JSON document of all images.
+
+    Args:
+        stdout: The output of the chart code
+
+    Yields:
+        The image bytes
+    """
+    position = stdout.find(CHART_MARKER_START)
+    while position >= 0:
+        start = position + len(CHART_MARKER_START)
+        end = stdout.find(CHART_MARKER_END, start)
+        if end < 0:
+            logger.error("Chart image data is not terminated")
+            return
+        try:
+            yield binascii.a2b_base64(stdout[start:end])
+        except binascii.Error as e:
+            logger.error(f"Error decoding chart image data: {str(e)}")
+        position = stdout.find(CHART_MARKER_START, end)
+
+
+def strip_chart_output(stdout: str) -> str:
+    """The output of the chart code without the image data."""
+    position = stdout.find(CHART_MARKER_START)
+    return (stdout if position < 0 else stdout[:position]).strip()
+
+
+def validate_chart_image(data: bytes, image_format: str) -> bool:
+    """Validate that data has the header of the image format and is within size limit."""
+    if len(data) > MAX_CHART_FILE_SIZE:
+        logger.warning(f"Chart image too large: {len(data)} bytes (limit: {MAX_CHART_FILE_SIZE})")
+        return False
+    if image_format == "png" and not data.startswith(PNG_HEADER):
+        logger.warning("Chart image does not have valid PNG header")
+        return False
+    if image_format == "webp" and not (data[:4] == b"RIFF" and data[8:12] == b"WEBP"):
+        logger.warning("Chart image does not have valid WebP header")
+        return False
+    return True
+
+
+class ChartUploader:
+    """
+    Uploads chart images to S3 under content-addressed keys (SHA-256 of the image) and presigns them.
+
+    Identical images (e.g., a figure captured by both savefig and show, or the same chart drawn again
+    in a later turn) are stored and presigned once. Uploads of one call run in parallel. Keys uploaded
+    by this container are remembered with their presigned URL, which is reused while it is valid for
+    at least half of url_expires_seconds.
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str, url_expires_seconds: int, cache_entries: int = 256):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_expires_seconds = url_expires_seconds
+        self.cache_entries = cache_entries
+        self.urls = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _cached_url(self, key: str):
+        with self.lock:
+            if key in self.urls:
+                url, presigned_at = self.urls[key]
+                self.urls.move_to_end(key)
+                if time.time() - presigned_at < self.url_expires_seconds / 2:
+                    return url
+        return None
+
+    def _presign(self, key: str) -> str:
+        url = self.s3.generate_presigned_url("get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_expires_seconds)
+        with self.lock:
+            self.urls[key] = (url, time.time())
+            self.urls.move_to_end(key)
+            while len(self.urls) > self.cache_entries:
+                self.urls.popitem(last=False)
+        return url
+
+    def _put(self, chart: dict) -> bool:
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=chart["key"],
+                Body=chart["data"],
+                ContentType=chart["content_type"],
+                CacheControl="private, max-age=31536000, immutable",
+            )
+            logger.info(f"Uploaded chart to s3://{self.bucket}/{chart['key']} ({len(chart['data'])} bytes)")
+            return True
+        except Exception as e:
+            logger.error(f"Error uploading chart image: {str(e)}")
+            return False
+
+    def upload(self, images, image_format: str) -> list:
+        """
+        Upload chart images.
+
+        Args:
+            images: The image bytes, in order (e.g., from iter_chart_images)
+            image_format: The format of the images ("png" or "webp")
+
+        Returns:
+            The unique valid charts in order, as [{"key": ..., "url": ..., "sha256": ..., "bytes": ...}]
+        """
+        chart_format = CHART_FORMATS[image_format]
+        charts = OrderedDict()
+        for data in images:
+            if not validate_chart_image(data, image_format):
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            if digest not in charts:
+                key = f"{self.prefix}{digest}.{chart_format['extension']}"
+                charts[digest] = {"key": key, "sha256": digest, "data": data, "content_type": chart_format["content_type"]}
+
+        pending = []
+        for chart in charts.values():
+            chart["url"] = self._cached_url(chart["key"])
+            if chart["url"] is None:
+                pending.append(chart)
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_UPLOADS, len(pending))) as executor:
+                uploaded = list(executor.map(self._put, pending))
+            for chart, ok in zip(pending, uploaded):
+                if ok:
+                    chart["url"] = self._presign(chart["key"])
+        logger.info(f"Charts: {len(charts)} unique, {len(pending)} uploaded")
+
+        return [
+            {"key": chart["key"], "url": chart["url"], "sha256": chart["sha256"], "bytes": len(chart["data"])}
+            for chart in charts.values()
+            if chart["url"]
+        ]
@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CODE_INTERPRETER_IDENTIFIER = "aws.codeinterpreter.v1"
+
+# A pooled session is not reused when it would expire within this many seconds
+EXPIRY_MARGIN_SECONDS = 60
+
+
+def run_code(client, session_id: str, code: str) -> tuple:
+    """
+    Execute Python code in a code interpreter session.
+
+    Args:
+        client: The boto3 bedrock-agentcore client
+        session_id: The ID of the code interpreter session
+        code: The Python code to execute
+
+    Returns:
+        A tuple (stdout, is_error), where is_error tells whether the code raised an exception
+    """
+    exec_resp = client.invoke_code_interpreter(
+        codeInterpreterIdentifier=CODE_INTERPRETER_IDENTIFIER,
+        sessionId=session_id,
+        name="executeCode",
+        arguments={"language": "python", "code": code},
+    )
+
+    # Collect output from stream
+    all_text = []
+    is_error = False
+    for event in exec_resp.get("stream", []):
+        logger.info(f"CodeInterpreter event: {json.dumps(event, default=str)[:2000]}")
+        if "result" in event:
+            result = event["result"]
+            is_error = is_error or bool(result.get("isError"))
+            for c in result.get("content", []):
+                if c.get("type") == "text" and c.get("text"):
+                    all_text.append(c["text"])
+            sc = result.get("structuredContent", {})
+            if sc.get("stdout"):
+                all_text.append(sc["stdout"])
+
+    return "\n".join(all_text), is_error
+
+
+def write_files(client, session_id: str, files: list) -> None:
+    """
+    Write text files into a code interpreter session.
+
+    Args:
+        client: The boto3 bedrock-agentcore client
+        session_id: The ID of the code interpreter session
+        files: The files to write, as [{"path": ..., "text": ...}] (paths relative to the working directory)
+    """
+    response = client.invoke_code_interpreter(
+        codeInterpreterIdentifier=CODE_INTERPRETER_IDENTIFIER,
+        sessionId=session_id,
+        name="writeFiles",
+        arguments={"content": files},
+    )
+    for event in response.get("stream", []):
+        result = event.get("result", {})
+        if result.get("isError"):
+            raise RuntimeError(f"Error writing files: {json.dumps(result.get('content', []), default=str)[:500]}")
+
+
+class PooledSession:
+    def __init__(self, session_id: str, key: str, expires_at: float):
+        self.session_id = session_id
+        self.key = key
+        self.expires_at = expires_at
+        self.last_used = time.time()
+
+
+class CodeInterpreterPool:
+    """
+    Reuses code interpreter sessions across execute_chart_code calls of the same conversation.
+
+    Starting a session and importing matplotlib take seconds, so sessions are kept running after a call
+    and reused by the next call with the same key (the conversation session_id, set with bind()).
+    New sessions run warmup_code first, so matplotlib is already imported when the chart code runs.
+    A session is used by one call at a time; concurrent chart calls start additional sessions.
+
+    Sessions are stopped when a call fails with an API error, when they were idle for idle_seconds,
+    when they are about to reach their timeout, or when more than max_sessions are idle (least recently
+    used first). A session idle for more than health_check_seconds is checked with get_code_interpreter_session
+    before it is reused. Times are wall-clock, because a Lambda container can be frozen between invocations.
+    """
+
+    def __init__(
+        self,
+        client,
+        session_timeout_seconds: int,
+        idle_seconds: float,
+        max_sessions: int,
+        warmup_code: str,
+        health_check_seconds: float = 30,
+    ):
+        self.client = client
+        self.session_timeout_seconds = session_timeout_seconds
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.warmup_code = warmup_code
+        self.health_check_seconds = health_check_seconds
+        self.lock = threading.Lock()
+        self.idle = []
+        self.key = None
+
+    def bind(self, key: str) -> None:
+        """
+        Pool the sessions used until unbind() under this key.
+
+        Args:
+            key: The conversation session_id
+        """
+        self.key = key
+
+    def unbind(self) -> None:
+        """Stop pooling under the current key, and stop the sessions that expired."""
+        self.key = None
+        self._stop_all(self._take_expired())
+
+    def _expired(self, session: PooledSession, now: float) -> bool:
+        return now - session.last_used > self.idle_seconds or now + EXPIRY_MARGIN_SECONDS > session.expires_at
+
+    def _take_expired(self) -> list:
+        now = time.time()
+        with self.lock:
+            expired = [session for session in self.idle if self._expired(session, now)]
+            self.idle = [session for session in self.idle if not self._expired(session, now)]
+        return expired
+
+    def _stop(self, session: PooledSession) -> None:
+        try:
+            self.client.stop_code_interpreter_session(codeInterpreterIdentifier=CODE_INTERPRETER_IDENTIFIER, sessionId=session.session_id)
+            logger.info(f"CodeInterpreter session stopped: {session.session_id}")
+        except Exception:
+            pass
+
+    def _stop_all(self, sessions: list) -> None:
+        for session in sessions:
+            self._stop(session)
+
+    def _healthy(self, session: PooledSession) -> bool:
+        try:
+            response = self.client.get_code_interpreter_session(codeInterpreterIdentifier=CODE_INTERPRETER_IDENTIFIER, sessionId=session.session_id)
+            return response.get("status") == "READY"
+        except Exception as e:
+            logger.warning(f"CodeInterpreter session {session.session_id} failed the health check: {str(e)}")
+            return False
+
+    def _start(self, key: str) -> PooledSession:
+        started = time.time()
+        response = self.client.start_code_interpreter_session(
+            codeInterpreterIdentifier=CODE_INTERPRETER_IDENTIFIER,
+            name=f"chart-{uuid.uuid4().hex[:8]}",
+            sessionTimeoutSeconds=self.session_timeout_seconds,
+        )
+        session = PooledSession(response["sessionId"], key, started + self.session_timeout_seconds)
+        try:
+            _, is_error = run_code(self.client, session.session_id, self.warmup_code)
+            if is_error:
+                logger.warning(f"CodeInterpreter warm-up code failed in session {session.session_id}")
+        except Exception:
+            self._stop(session)
+            raise
+        logger.info(f"CodeInterpreter session started: {session.session_id} ({(time.time() - started) * 1000:.0f}ms)")
+        return session
+
+    def acquire(self) -> PooledSession:
+        """
+        Get an idle session of the bound key, or start a new session.
+
+        Returns:
+            The session, to be given back with release()
+        """
+        key = self.key
+        self._stop_all(self._take_expired())
+        while key is not None:
+            with self.lock:
+                candidates = [session for session in self.idle if session.key == key]
+                if not candidates:
+                    break
+                session = candidates[-1]
+                self.idle.remove(session)
+            if time.time() - session.last_used <= self.health_check_seconds or self._healthy(session):
+                logger.info(f"CodeInterpreter session reused: {session.session_id}")
+                return session
+            self._stop(session)
+        return self._start(key)
+
+    def release(self, session: PooledSession, healthy: bool = True) -> None:
+        """
+        Give a session back to the pool.
+
+        Args:
+            session: The session from acquire()
+            healthy: False if the call failed with an API error, in which case the session is stopped
+        """
+        session.last_used = time.time()
+        if not healthy or session.key is None or self._expired(session, session.last_used):
+            self._stop(session)
+            return
+        with self.lock:
+            self.idle.append(session)
+            self.idle.sort(key=lambda pooled: pooled.last_used)
+            evicted = self.idle[: max(0, len(self.idle) - self.max_sessions)]
+            self.idle = self.idle[len(evicted) :]
+        self._stop_all(evicted)
+
+    @contextmanager
+    def session(self):
+        """
+        Use a pooled session for one call.
+
+        Yields:
+            The ID of the code interpreter session
+        """
+        session = self.acquire()
+        try:
+            yield session.session_id
+        except Exception:
+            self.release(session, healthy=False)
+            raise
+        self.release(session)
@@ -0,0 +1,28 @@
+import threading
+
+# boto3 sessions are not thread-safe, so clients are created one at a time
+_create_lock = threading.Lock()
+
+
+class LazyClient:
+    """
+    A boto3 client or resource that is created on first use.
+
+    Creating a client loads its service model and costs tens of milliseconds, so clients that an
+    invocation does not need (e.g., Step Functions in a deployment without Personalize) are never created.
+    Attribute access is forwarded to the client, so the proxy is used like the client itself.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+
+    def _get(self):
+        if self._client is None:
+            with _create_lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
@@ -0,0 +1,80 @@
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class ProgressReporter:
+    """
+    Pushes progress events of long-running tool calls to the client.
+
+    Events have the form {"type": "progress", "tool": ..., "task_id": ..., "stage": ..., "elapsed_ms": ..., ...details}.
+    task_id tells concurrent calls of the same tool apart. Every event is also logged, so slow stages
+    can be found in the logs by task_id.
+
+    The events sent to a connection are limited by a token bucket (rate_per_second, up to burst at once).
+    Updates within the same stage (e.g., bytes scanned while a query runs) are dropped when the bucket is
+    empty; the first event of a new stage is always sent, so the client never misses a transition.
+    A Lambda invocation serves one connection, so the handler binds the reporter to it for the invocation.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.send = None
+        self.tokens = burst
+        self.refilled = time.monotonic()
+        self.tasks = {}
+
+    def bind(self, send) -> None:
+        """
+        Send the events of this invocation with send(event).
+
+        Args:
+            send: A function that sends an event dictionary to the connection
+        """
+        with self.lock:
+            self.send = send
+            self.tokens = self.burst
+            self.refilled = time.monotonic()
+            self.tasks = {}
+
+    def unbind(self) -> None:
+        with self.lock:
+            self.send = None
+            self.tasks = {}
+
+    def report(self, tool: str, task_id: str, stage: str, **details) -> None:
+        """
+        Report the current stage of a tool call.
+
+        Args:
+            tool: The name of the tool
+            task_id: The ID of the tool call
+            stage: The current stage (e.g., 'queued', 'running', 'succeeded')
+            **details: Additional JSON-serializable fields of the event
+        """
+        now = time.monotonic()
+        with self.lock:
+            started, last_stage = self.tasks.get(task_id, (now, None))
+            self.tasks[task_id] = (started, stage)
+            event = {"type": "progress", "tool": tool, "task_id": task_id, "stage": stage, "elapsed_ms": int((now - started) * 1000), **details}
+            logger.info(f"Progress: {json.dumps(event)}")
+
+            send = self.send
+            if send is None:
+                return
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate_per_second)
+            self.refilled = now
+            if stage == last_stage and self.tokens < 1:
+                return
+            self.tokens = max(0, self.tokens - 1)
+
+        try:
+            send(event)
+        except Exception as e:
+            logger.warning(f"Error sending progress event: {str(e)}")
@@ -0,0 +1,135 @@
+import threading
+import time
+
+THINKING_OPEN = "<thinking>"
+THINKING_CLOSE = "</thinking>"
+
+
+def _partial_tag_length(text: str, tags: tuple) -> int:
+    """Length of the longest suffix of text that is the beginning of one of the tags."""
+    for length in range(min(len(text), max(len(tag) for tag in tags) - 1), 0, -1):
+        suffix = text[-length:]
+        if any(tag.startswith(suffix) for tag in tags):
+            return length
+    return 0
+
+
+class ThinkingTagFilter:
+    """
+    Streaming version of remove_thinking_tags.
+    Text inside <thinking>...</thinking> is dropped, and stray </thinking> tags are removed.
+    A tag split across deltas is held back until the next delta shows whether it is a tag.
+    """
+
+    def __init__(self):
+        self.inside = False
+        self.pending = ""
+
+    def feed(self, text: str) -> str:
+        """
+        Add a text delta.
+
+        Args:
+            text: The next text delta from the model
+
+        Returns:
+            The text that can be shown to the user
+        """
+        self.pending += text
+        visible = []
+        while True:
+            if self.inside:
+                index = self.pending.find(THINKING_CLOSE)
+                if index < 0:
+                    keep = _partial_tag_length(self.pending, (THINKING_CLOSE,))
+                    self.pending = self.pending[len(self.pending) - keep :]
+                    break
+                self.pending = self.pending[index + len(THINKING_CLOSE) :]
+                self.inside = False
+                continue
+
+            positions = [(self.pending.find(tag), tag) for tag in (THINKING_OPEN, THINKING_CLOSE)]
+            positions = [(index, tag) for index, tag in positions if index >= 0]
+            if not positions:
+                keep = _partial_tag_length(self.pending, (THINKING_OPEN, THINKING_CLOSE))
+                visible.append(self.pending[: len(self.pending) - keep])
+                self.pending = self.pending[len(self.pending) - keep :]
+                break
+            index, tag = min(positions)
+            visible.append(self.pending[:index])
+            self.pending = self.pending[index + len(tag) :]
+            self.inside = tag == THINKING_OPEN
+
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """
+        End the text. Returns the held-back text, unless it is inside an unclosed thinking block.
+        """
+        rest = "" if self.inside else self.pending
+        self.inside = False
+        self.pending = ""
+        return rest
+
+
+class ResponseStreamer:
+    """
+    Strands callback handler that pushes the agent's visible text to the client while it is generated.
+
+    Text deltas are scrubbed of <thinking> blocks and coalesced into frames sent at most every
+    frame_interval seconds. Each assistant message of the turn (the text before a tool call,
+    the text after it, ...) is a segment; segments without visible text are skipped, so the client can
+    map segment N to the Nth visible assistant message of the turn.
+    send must not block (websocket_push.ConnectionPusher.push queues the frame), so a slow post
+    does not hold up the model stream.
+
+    Frames have the form {"type": "stream", "session_id": ..., "segment": N, "delta": "..."}.
+    """
+
+    def __init__(self, send, session_id: str, frame_interval: float):
+        self.send = send
+        self.session_id = session_id
+        self.frame_interval = frame_interval
+        self.filter = ThinkingTagFilter()
+        self.buffer = []
+        self.last_frame = time.monotonic()
+        self.segment = 0
+        self.segment_has_text = False
+        self.lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self.lock:
+            if "data" in kwargs:
+                self._add(self.filter.feed(kwargs["data"]))
+                if time.monotonic() - self.last_frame >= self.frame_interval:
+                    self._flush()
+            elif "current_tool_use" in kwargs:
+                # The model stopped writing text to call a tool, so show what it wrote so far
+                self._flush()
+            elif "message" in kwargs and kwargs["message"].get("role") == "assistant":
+                self._end_segment()
+
+    def _add(self, text: str) -> None:
+        if not self.segment_has_text:
+            text = text.lstrip()
+        if text:
+            self.buffer.append(text)
+            self.segment_has_text = True
+
+    def _flush(self) -> None:
+        if self.buffer:
+            self.send({"type": "stream", "session_id": self.session_id, "segment": self.segment, "delta": "".join(self.buffer)})
+            self.buffer = []
+        self.last_frame = time.monotonic()
+
+    def _end_segment(self) -> None:
+        self._add(self.filter.flush())
+        self._flush()
+        if self.segment_has_text:
+            self.segment += 1
+            self.segment_has_text = False
+
+    def close(self) -> None:
+        """Send the remaining text."""
+        with self.lock:
+            self._end_segment()
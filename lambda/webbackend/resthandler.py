@@ -1,5 +1,6 @@
 import boto3
 import os
+import time
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.event_handler.api_gateway import (
     APIGatewayRestResolver,
@@ -8,8 +9,27 @@ from aws_lambda_powertools.event_handler.api_gateway import (
 )
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools.logging import correlation_paths
-from aws_lambda_powertools.event_handler.exceptions import InternalServerError
-from sessionutils import filter_messages_for_response
+from aws_lambda_powertools.event_handler.exceptions import BadRequestError, InternalServerError
+from sessionutils import (
+    STORED_CHART_URL_EXPIRES_SECONDS,
+    delete_session_payload,
+    filter_messages_for_response,
+    get_message_count,
+    history_delta,
+    load_messages,
+    load_session_with_charts,
+    presign_chart_references,
+    session_title,
+)
+from session_view import (
+    SessionViewCache,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    paginate_view,
+    session_etag,
+    session_version,
+)
 
 
 logger = Logger()
@@ -20,77 +40,181 @@ SESSION_TABLE = os.environ["SESSION_TABLE"]
 dynamodb = boto3.resource("dynamodb")
 session_table = dynamodb.Table(SESSION_TABLE)
 
+# ユーザーのセッションを最終更新日時の降順で返すGSI（パーティションキー: user_id、ソートキー: last_updated）
+SESSION_RECENCY_INDEX = os.environ.get("SESSION_RECENCY_INDEX", "LastUpdatedIndex")
+# セッション一覧のページサイズ（既定値と上限）
+SESSION_LIST_PAGE_SIZE = int(os.environ.get("SESSION_LIST_PAGE_SIZE", "50"))
+SESSION_LIST_PAGE_MAX_SIZE = int(os.environ.get("SESSION_LIST_PAGE_MAX_SIZE", "200"))
+
+# セッション詳細のページサイズ（既定値と上限）
+SESSION_PAGE_SIZE = int(os.environ.get("SESSION_PAGE_SIZE", "50"))
+SESSION_PAGE_MAX_SIZE = int(os.environ.get("SESSION_PAGE_MAX_SIZE", "200"))
+# フィルタリング済みのメッセージを保持するセッション数（コンテナ内のキャッシュ）
+SESSION_VIEW_CACHE_ENTRIES = int(os.environ.get("SESSION_VIEW_CACHE_ENTRIES", "32"))
+session_views = SessionViewCache(SESSION_VIEW_CACHE_ENTRIES)
+
 # APIGatewayRestResolverの初期化
 app = APIGatewayRestResolver(cors=CORSConfig(allow_origin=ALLOW_ORIGIN))
 
 
+def parse_page_size(default: int, maximum: int) -> int:
+    """
+    クエリパラメータからpage_sizeを取得する
+    """
+    page_size = app.current_event.get_query_string_value("page_size")
+    try:
+        page_size = int(page_size) if page_size else default
+    except ValueError:
+        raise BadRequestError("page_size must be an integer")
+    if page_size < 1 or page_size > maximum:
+        raise BadRequestError(f"page_size must be between 1 and {maximum}")
+    return page_size
+
+
+def backfill_session_metadata(user_id: str, session_id: str) -> dict:
+    """
+    移行前のセッションのタイトルとメッセージ数を求め、ヘッダーに保存する（次回からはGSIのみで一覧を返せる）
+    """
+    response = session_table.get_item(Key={"user_id": user_id, "session_id": session_id})
+    item = response.get("Item", {})
+    # S3に退避されたメッセージは最初のチャンクのみ読み込む
+    metadata = {"title": session_title(load_messages(item, 0, 1)), "message_count": get_message_count(item)}
+    # メッセージのないセッション（接続のみ）は、最初のターンの保存時にタイトルが設定されるため保存しない
+    if metadata["message_count"] > 0:
+        session_table.update_item(
+            Key={"user_id": user_id, "session_id": session_id},
+            UpdateExpression="SET title = if_not_exists(title, :title), message_count = if_not_exists(message_count, :count)",
+            ExpressionAttributeValues={":title": metadata["title"], ":count": metadata["message_count"]},
+        )
+    return metadata
+
+
 @app.get("/sessions")
 def get_user_sessions():
     """
-    ユーザーのすべてのセッション履歴を取得するエンドポイント
+    ユーザーのセッション履歴を最終更新日時の降順で取得するエンドポイント
+    保存時に更新されるtitle、message_count、last_updatedのみをGSIから読み込み、cursorでページングする。
     """
-    try:
-        # リクエストからユーザーIDを取得
-        user_id = app.current_event.request_context.authorizer.get("claims", {}).get("sub")
+    page_size = parse_page_size(SESSION_LIST_PAGE_SIZE, SESSION_LIST_PAGE_MAX_SIZE)
+    cursor = app.current_event.get_query_string_value("cursor")
 
-        if not user_id:
-            return {"statusCode": 400, "body": "User ID not found in token"}
+    # リクエストからユーザーIDを取得
+    user_id = app.current_event.request_context.authorizer.get("claims", {}).get("sub")
 
-        # ユーザーのセッションをDynamoDBから取得
-        response = session_table.query(KeyConditionExpression="user_id = :user_id", ExpressionAttributeValues={":user_id": user_id})
+    if not user_id:
+        return {"statusCode": 400, "body": "User ID not found in token"}
+
+    query_kwargs = {
+        "IndexName": SESSION_RECENCY_INDEX,
+        "KeyConditionExpression": "user_id = :user_id",
+        "ExpressionAttributeValues": {":user_id": user_id},
+        "ProjectionExpression": "#session_id, #title, #message_count, #last_updated",
+        "ExpressionAttributeNames": {
+            "#session_id": "session_id",
+            "#title": "title",
+            "#message_count": "message_count",
+            "#last_updated": "last_updated",
+        },
+        "ScanIndexForward": False,
+        "Limit": page_size,
+    }
+    if cursor:
+        try:
+            start_key = decode_cursor(cursor)
+        except ValueError:
+            raise BadRequestError("Invalid cursor")
+        # 他のユーザーのcursorは受け付けない
+        if start_key.get("user_id") != user_id:
+            raise BadRequestError("Invalid cursor")
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    try:
+        # ユーザーのセッションを最終更新日時の降順でDynamoDBから取得
+        response = session_table.query(**query_kwargs)
 
         # セッション情報を整形
         sessions = []
         for item in response.get("Items", []):
-            # 最初のメッセージがあれば、それをセッションのタイトルとして使用
-            title = "New Chat"
-            messages = item.get("messages", [])
-            if messages and len(messages) > 0:
-                # ユーザーの最初のメッセージを探す
-                for msg in messages:
-                    if msg.get("role") == "user" and msg.get("content"):
-                        content = msg.get("content", [])
-                        if content and len(content) > 0 and "text" in content[0]:
-                            # 最初の50文字をタイトルとして使用
-                            title = content[0]["text"][:50]
-                            if len(content[0]["text"]) > 50:
-                                title += "..."
-                            break
+            # タイトルとメッセージ数を持たない移行前のセッションのみヘッダーを読み込む
+            if "title" not in item or "message_count" not in item:
+                item = {**item, **backfill_session_metadata(user_id, item["session_id"])}
 
             # セッション情報を追加
             sessions.append(
-                {"session_id": item.get("session_id"), "title": title, "last_updated": item.get("last_updated"), "message_count": len(messages)}
+                {
+                    "session_id": item.get("session_id"),
+                    "title": item.get("title"),
+                    "last_updated": item.get("last_updated"),
+                    "message_count": int(item.get("message_count", 0)),
+                }
             )
 
-        # 最終更新日時で降順ソート（None値を適切に処理）
-        sessions.sort(key=lambda x: (x.get("last_updated") or ""), reverse=True)
-
-        return Response(status_code=200, content_type="application/json", body={"sessions": sessions})
+        return Response(
+            status_code=200,
+            content_type="application/json",
+            body={"sessions": sessions, "next_cursor": encode_cursor(response.get("LastEvaluatedKey"))},
+        )
 
     except Exception as e:
         logger.exception("Error retrieving user sessions")
         raise InternalServerError("Error retrieving user sessions")
 
 
+def parse_page_parameters():
+    """
+    クエリパラメータからページのcursorとpage_sizeを取得する
+    """
+    page_size = parse_page_size(SESSION_PAGE_SIZE, SESSION_PAGE_MAX_SIZE)
+    cursor = app.current_event.get_query_string_value("cursor")
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        raise BadRequestError("cursor must be an integer")
+    return cursor, page_size
+
+
 @app.get("/sessions/<session_id>")
 def get_session_details(session_id):
     """
     特定のセッションの詳細を取得するエンドポイント
+    メッセージは新しいページから順にcursorでページングして返す（ページ内は会話の順）。
+    セッションが更新されていない場合は、If-None-Matchに対して304を返す。
     """
+    cursor, page_size = parse_page_parameters()
     try:
         # リクエストからユーザーIDを取得
         user_id = app.current_event.request_context.authorizer.get("claims", {}).get("sub")
 
         response = session_table.get_item(Key={"user_id": user_id, "session_id": session_id})
-        if "Item" in response:
-            conversation_history = response["Item"].get("messages", [])
-            last_updated = response["Item"].get("last_updated")
-        else:
-            conversation_history = []
-            last_updated = None
+        item = response.get("Item")
+        if not item:
+            return Response(
+                status_code=200,
+                content_type="application/json",
+                body={"session_id": session_id, "last_updated": None, "messages": [], "next_cursor": None, "last_seq": 0},
+            )
+
+        # ヘッダーのみで判断できるため、変更がなければメッセージを読み込まずに304を返す
+        version = session_version(item)
+        # レスポンスにはチャートの署名付きURLが含まれるため、有効期限の半分ごとにETagを変えて期限切れのURLを再利用させない
+        url_window = int(time.time() // max(STORED_CHART_URL_EXPIRES_SECONDS // 2, 1))
+        etag = session_etag(session_id, version, cursor, page_size, url_window)
+        # ブラウザのキャッシュは毎回ETagで再検証する
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(app.current_event.get_header_value("If-None-Match", case_sensitive=False), etag):
+            return Response(status_code=304, headers=headers)
 
-        # sessionutils.pyのfilter_messages_for_responseを使用してメッセージをフィルタリング
-        filtered_messages = filter_messages_for_response(conversation_history)
+        def build_view():
+            turns, charts = load_session_with_charts(item, user_id, session_id)
+            conversation_history = [message for _, messages in turns for message in messages]
+            # sessionutils.pyのfilter_messages_for_responseを使用してメッセージをフィルタリングし、連番を付与
+            return history_delta(filter_messages_for_response(conversation_history, charts))["messages"]
+
+        # フィルタリング済みのメッセージはセッションが更新されるまで再利用する
+        view = session_views.get(user_id, session_id, version, build_view)
+        messages, next_cursor = paginate_view(view, cursor, page_size)
+        # 以前のターンのチャートは、キャッシュしたビューではなく返すページでS3キーから署名付きURLを発行する
+        messages = presign_chart_references(messages)
 
         # 必要な情報のみを返す
         return Response(
@@ -98,9 +222,12 @@ def get_session_details(session_id):
             content_type="application/json",
             body={
                 "session_id": session_id,
-                "last_updated": last_updated,
-                "messages": filtered_messages,
+                "last_updated": item.get("last_updated"),
+                "messages": messages,
+                "next_cursor": next_cursor,
+                "last_seq": len(view),
             },
+            headers=headers,
         )
 
     except Exception as e:
@@ -123,6 +250,10 @@ def delete_session(session_id):
         # セッションを削除
         session_table.delete_item(Key={"user_id": user_id, "session_id": session_id})
 
+        # S3に退避されたメッセージを削除
+        delete_session_payload(user_id, session_id)
+        session_views.invalidate(user_id, session_id)
+
         logger.info(f"Session {session_id} deleted successfully for user {user_id}")
 
         return Response(
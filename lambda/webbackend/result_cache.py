@@ -0,0 +1,362 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from schema_cache import table_version
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Functions whose result changes between executions; queries using them are never cached
+NON_DETERMINISTIC_PATTERN = re.compile(
+    r"\b(current_timestamp|current_date|current_time|localtimestamp|localtime|now|rand|random|uuid|shuffle)\b"
+)
+SQL_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<number>\d+(?:\.\d+)?(?:e[+-]?\d+)?)
+    |(?P<word>[A-Za-z_][\w$]*)
+    |(?P<space>\s+)
+    |(?P<symbol><>|!=|<=|>=|\|\||.)
+    """,
+    re.DOTALL | re.VERBOSE | re.IGNORECASE,
+)
+
+
+def _tokenize_sql(sql: str) -> list:
+    """
+    Split SQL into normalized tokens.
+    Comments and whitespace are dropped, and everything except string literals is lowercased.
+    """
+    tokens = []
+    for match in SQL_TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        value = match.group()
+        tokens.append(value if kind == "string" else value.lower())
+    return tokens
+
+
+def _sort_in_lists(tokens: list) -> list:
+    """Sort the values of IN (...) lists that contain only literals, so their order does not matter."""
+    result = []
+    i = 0
+    while i < len(tokens):
+        result.append(tokens[i])
+        if tokens[i] == "in" and i + 1 < len(tokens) and tokens[i + 1] == "(":
+            end = tokens.index(")", i + 1) if ")" in tokens[i + 1 :] else -1
+            values = tokens[i + 2 : end] if end > 0 else []
+            literals = values[0::2]
+            separators = values[1::2]
+            if literals and all(sep == "," for sep in separators) and all(
+                token.startswith("'") or token[0].isdigit() for token in literals
+            ):
+                result.append("(")
+                result.append(",".join(sorted(set(literals))))
+                result.append(")")
+                i = end + 1
+                continue
+        i += 1
+    return result
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Build a normalized fingerprint of a SQL query.
+    Whitespace, comments, keyword/identifier casing, a trailing semicolon and the order of
+    literal values in IN lists do not change the fingerprint.
+
+    Args:
+        sql: The SQL query
+
+    Returns:
+        The normalized SQL text
+    """
+    tokens = _tokenize_sql(sql)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(_sort_in_lists(tokens))
+
+
+# Functions whose arguments use FROM as a keyword (e.g., extract(year from d)), not as a table reference
+FROM_KEYWORD_FUNCTIONS = ("extract", "trim", "substring", "position", "overlay")
+# Words that end a table reference in a FROM list, so they are not taken as its alias
+CLAUSE_KEYWORDS = {
+    "where", "group", "order", "having", "limit", "offset", "fetch", "union", "intersect", "except", "window",
+    "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "tablesample", "for",
+}
+# Table functions that read no catalog table
+CATALOG_FREE_FUNCTIONS = ("unnest",)
+
+
+def _identifier(token: str) -> str:
+    """The name of an identifier token, without the quotes of a quoted identifier."""
+    if token.startswith('"') and token.endswith('"'):
+        return token[1:-1].replace('""', '"').lower()
+    return token
+
+
+def _cte_names(tokens: list) -> set:
+    """Names defined by WITH clauses (name AS ( after WITH, WITH RECURSIVE or a comma)."""
+    names = set()
+    for i in range(1, len(tokens) - 2):
+        if tokens[i - 1] in ("with", "recursive", ",") and tokens[i + 1] == "as" and tokens[i + 2] == "(":
+            names.add(_identifier(tokens[i]))
+    return names
+
+
+def _table_references(tokens: list) -> list:
+    """
+    Get every table reference of a tokenized query, as lists of name parts (e.g., ["otherdb", "t"]).
+    Table functions are returned as ["function(", name].
+    """
+    references = []
+    functions = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "(":
+            functions.append(tokens[i - 1] if i else "")
+        elif token == ")":
+            if functions:
+                functions.pop()
+        elif token in ("from", "join") and not (token == "from" and functions and functions[-1] in FROM_KEYWORD_FUNCTIONS):
+            i += 1
+            while i < len(tokens) and tokens[i] != "(":
+                parts = [_identifier(tokens[i])]
+                while i + 2 < len(tokens) and tokens[i + 1] == ".":
+                    parts.append(_identifier(tokens[i + 2]))
+                    i += 2
+                if i + 1 < len(tokens) and tokens[i + 1] == "(":
+                    references.append(["function(", parts[-1]])
+                    break
+                references.append(parts)
+                # Skip the alias, then continue with the next table of a comma separated FROM list
+                i += 1
+                if i < len(tokens) and tokens[i] == "as":
+                    i += 1
+                if i < len(tokens) and tokens[i] not in CLAUSE_KEYWORDS and tokens[i] not in (",", ")", ";"):
+                    i += 1
+                if i < len(tokens) and tokens[i] == "(":
+                    depth = 0
+                    while i < len(tokens):
+                        depth += {"(": 1, ")": -1}.get(tokens[i], 0)
+                        i += 1
+                        if depth == 0:
+                            break
+                if token != "from" or i >= len(tokens) or tokens[i] != ",":
+                    break
+                i += 1
+            continue
+        i += 1
+    return references
+
+
+def referenced_tables(normalized_sql: str, known_tables, database: str):
+    """
+    Get the catalog tables referenced by a normalized query.
+    Every table after FROM or JOIN (including comma joins and subqueries) must resolve to a known
+    table of the database; names defined by the query's WITH clauses are skipped.
+
+    Args:
+        normalized_sql: SQL normalized with normalize_sql
+        known_tables: The table names in the Glue database
+        database: The Glue database the query runs in
+
+    Returns:
+        A sorted list of unique table names, or None if a reference cannot be resolved to a known table
+        (another database, an unknown table or view, a table function, or a WITH name that shadows a table)
+    """
+    known = {name.lower() for name in known_tables}
+    tokens = normalized_sql.split(" ")
+    ctes = _cte_names(tokens)
+    tables = set()
+    for parts in _table_references(tokens):
+        if parts[0] == "function(":
+            if parts[1] in CATALOG_FREE_FUNCTIONS:
+                continue
+            return None
+        name = parts[-1]
+        qualifiers = parts[:-1]
+        if qualifiers and qualifiers[-1] != database.lower():
+            return None
+        if len(qualifiers) == 2 and qualifiers[0] != "awsdatacatalog":
+            return None
+        if len(qualifiers) > 2:
+            return None
+        if not qualifiers and name in ctes:
+            if name in known:
+                return None
+            continue
+        if name not in known:
+            return None
+        tables.add(name)
+    return sorted(tables)
+
+
+def is_cacheable(normalized_sql: str) -> bool:
+    """
+    Check if the result of a normalized query can be cached.
+    Only read queries without non-deterministic functions are cached.
+
+    Args:
+        normalized_sql: SQL normalized with normalize_sql
+
+    Returns:
+        True if the query result can be cached
+    """
+    if not (normalized_sql.startswith("select ") or normalized_sql.startswith("with ")):
+        return False
+    return not NON_DETERMINISTIC_PATTERN.search(normalized_sql)
+
+
+def cache_key(normalized_sql: str, data_versions: dict) -> str:
+    """
+    Build the cache key from the normalized query and the data version of each referenced table.
+
+    Args:
+        normalized_sql: SQL normalized with normalize_sql
+        data_versions: Table name to data version
+
+    Returns:
+        A hex digest usable as a file name
+    """
+    payload = json.dumps({"sql": normalized_sql, "versions": data_versions}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DataVersionResolver:
+    """
+    Resolve the data version of Glue tables from their catalog metadata (one glue.get_table call per table).
+
+    The version combines the Glue VersionId/UpdateTime with a marker of the data itself:
+    - Iceberg tables: the metadata_location parameter, which changes on every commit
+    - Other tables: files can be added under the location without any catalog change, so the version
+      also contains the current max_age_seconds time window, and their cached results expire within it
+    Views and tables without a location are not versioned, so queries on them are not cached.
+    """
+
+    def __init__(self, glue_client, database: str, max_age_seconds: int):
+        self.glue = glue_client
+        self.database = database
+        self.max_age_seconds = max_age_seconds
+
+    def get(self, table_name: str):
+        """
+        Get the data version of a table.
+
+        Args:
+            table_name: The name of the table
+
+        Returns:
+            The data version string, or None if the table is unknown or cannot be versioned
+        """
+        try:
+            table = self.glue.get_table(DatabaseName=self.database, Name=table_name)["Table"]
+        except self.glue.exceptions.EntityNotFoundException:
+            return None
+
+        if table.get("TableType") == "VIRTUAL_VIEW":
+            return None
+        parameters = table.get("Parameters", {})
+        if "metadata_location" in parameters:
+            data_marker = parameters["metadata_location"]
+        elif table.get("StorageDescriptor", {}).get("Location"):
+            data_marker = f"window:{int(time.time() // self.max_age_seconds)}"
+        else:
+            return None
+
+        return f"{table_version(table)}:{data_marker}"
+
+
+class QueryResultCache:
+    """
+    Two-tier cache of formatted query results.
+    - Memory: LRU with at most max_entries entries, reused across warm invocations
+    - Disk: JSON files in the Lambda /tmp directory, evicted oldest first above max_disk_bytes
+
+    The memory tier is guarded by a lock because concurrent tool calls share the cache.
+    """
+
+    def __init__(self, max_entries: int, directory: str, max_disk_bytes: int):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        """
+        Get a cached entry.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached entry dictionary, or None on a miss
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Error reading cached query result {key}: {str(e)}")
+            return None
+
+        self._put_memory(key, entry)
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """
+        Store an entry in both tiers.
+
+        Args:
+            key: The cache key
+            entry: A JSON-serializable dictionary
+        """
+        self._put_memory(key, entry)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(key), "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            self._evict_disk()
+        except Exception as e:
+            logger.warning(f"Error writing cached query result {key}: {str(e)}")
+
+    def _put_memory(self, key: str, entry: dict) -> None:
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """Remove the least recently used files until the directory fits in max_disk_bytes."""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,190 @@
+import json
+from tokenutils import estimate_tokens
+
+ENCODING_MODES = ("table", "tsv", "columnar")
+
+# Values of long text columns are cut to these lengths, one step at a time, until the result fits the token budget
+TRUNCATION_STEPS = (None, 200, 80, 40, 20)
+# Columns whose average value is longer than this are long text columns: they are moved after
+# the short columns and only their values are cut (IDs and other short values are never cut)
+LONG_COLUMN_CHARS = 40
+# In table and TSV mode, a value repeated from the previous row is replaced with REPEAT_MARK
+# only when it is at least this long (shorter values do not save tokens)
+REPEAT_MIN_CHARS = 6
+REPEAT_MARK = "^"
+# Part of the token budget kept for the encoding notes
+NOTES_RESERVE_TOKENS = 120
+NULL_VALUE = "NULL"
+
+
+def _minify(value):
+    """Render a value on one line, minifying JSON objects and arrays."""
+    if value is None:
+        return NULL_VALUE
+    stripped = value.strip()
+    if stripped[:1] in ("{", "[") and stripped[-1:] in ("}", "]"):
+        try:
+            return json.dumps(json.loads(stripped), ensure_ascii=False, separators=(",", ":"))
+        except ValueError:
+            pass
+    return value.replace("\r", "").replace("\n", "\\n")
+
+
+def _truncate(value: str, limit) -> tuple:
+    """Cut a value to limit characters. Returns the value and whether it was cut."""
+    if limit is None or len(value) <= limit:
+        return value, False
+    return f"{value[:limit]}…(+{len(value) - limit} chars)", True
+
+
+def _escape(value: str, mode: str) -> str:
+    if mode == "tsv":
+        value = value.replace("\t", "\\t")
+    elif mode == "columnar":
+        value = value.replace("|", "\\|")
+    if value == REPEAT_MARK:
+        return "\\" + REPEAT_MARK
+    return value
+
+
+def _render(columns: list, values: list, mode: str, row_count: int) -> tuple:
+    """
+    Render the first row_count rows of prepared column values.
+    Returns the text and whether REPEAT_MARK was used.
+    """
+    if mode == "columnar":
+        lines = []
+        for name, column in zip(columns, values):
+            runs = []
+            for value in column[:row_count]:
+                if runs and runs[-1][0] == value:
+                    runs[-1][1] += 1
+                else:
+                    runs.append([value, 1])
+            rendered = (_escape(value, mode) if count == 1 else f"{_escape(value, mode)} ×{count}" for value, count in runs)
+            lines.append(f"{name}: " + " | ".join(rendered))
+        return "\n".join(lines), False
+
+    separator = "\t" if mode == "tsv" else " | "
+    header = separator.join(columns)
+    lines = [header] if mode == "tsv" else [header, "-" * len(header)]
+    previous = None
+    repeated = False
+    for row in zip(*(column[:row_count] for column in values)):
+        cells = []
+        for index, value in enumerate(row):
+            if previous is not None and previous[index] == value and len(value) >= REPEAT_MIN_CHARS:
+                cells.append(REPEAT_MARK)
+                repeated = True
+            else:
+                cells.append(_escape(value, mode))
+        lines.append(separator.join(cells))
+        previous = row
+    return "\n".join(lines), repeated
+
+
+def encode_result(
+    columns: list, data: list, token_budget: int, mode: str = "table", result_rows: int = None, more_rows_hint: str = ""
+) -> str:
+    """
+    Encode query results for the agent within a token budget.
+
+    The encoder collapses columns that hold a single value, minifies JSON values,
+    moves long text columns after the short ones and marks values repeated from the previous row.
+    If the result is still over budget, values of long text columns are cut step by step
+    (TRUNCATION_STEPS), and then trailing rows are dropped; a marker line right after the last row shown
+    tells how many rows were left out. Everything else that is not shown verbatim is listed in the
+    encoding notes at the end, so the agent knows exactly what was elided.
+
+    Args:
+        columns: The column names
+        data: One list of values per column (None for NULL)
+        token_budget: The maximum estimated tokens of the encoded result
+        mode: 'table' (" | " separated rows), 'tsv' (tab separated rows) or
+              'columnar' (one line per column with run-length encoded repeats)
+        result_rows: The number of rows of the whole result, if data holds only part of it (e.g., a preview)
+        more_rows_hint: A sentence appended to the marker of dropped rows (e.g., how to get them)
+
+    Returns:
+        The encoded result followed by the encoding notes
+    """
+    if mode not in ENCODING_MODES:
+        raise ValueError(f"Unknown result encoding: {mode}")
+
+    row_count = len(data[0]) if data else 0
+    minified = [[_minify(value) for value in column] for column in data]
+
+    # Collapse columns with one value in every row
+    constants = []
+    kept = []
+    for index, (name, column) in enumerate(zip(columns, minified)):
+        if row_count > 1 and all(value == column[0] for value in column):
+            constants.append((name, column[0]))
+        else:
+            average = sum(len(value) for value in column) / row_count if row_count else 0
+            kept.append((average > LONG_COLUMN_CHARS, index, name, column))
+
+    # Short columns first, so a truncated long text does not hide the identifying columns
+    kept.sort(key=lambda item: (item[0], item[1]))
+    names = [name for _, _, name, _ in kept]
+    moved = [name for is_long, _, name, _ in kept if is_long]
+    if moved and all(is_long for is_long, _, _, _ in kept):
+        moved = []
+
+    prefix = ""
+    if constants:
+        prefix = "Constant columns: " + ", ".join(f"{name}={_escape(value, mode)}" for name, value in constants) + "\n"
+
+    body_budget = max(0, token_budget - NOTES_RESERVE_TOKENS)
+    for limit in TRUNCATION_STEPS:
+        values = []
+        cut_flags = []
+        for is_long, _, _, column in kept:
+            cut_column = [_truncate(value, limit if is_long else None) for value in column]
+            values.append([value for value, _ in cut_column])
+            cut_flags.append([cut for _, cut in cut_column])
+        body, repeated = _render(names, values, mode, row_count)
+        text = prefix + body
+        if estimate_tokens(text) <= body_budget:
+            break
+
+    def omitted_marker(shown: int) -> str:
+        marker = f"\n[{row_count - shown} more rows (rows {shown + 1}-{row_count}) omitted to fit the token budget]"
+        return f"{marker[:-1]}. {more_rows_hint}]" if more_rows_hint else marker
+
+    shown = row_count
+    if estimate_tokens(text) > body_budget:
+        # Even the shortest values do not fit: keep as many leading rows as the budget allows
+        low, high = 0, row_count
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(prefix + _render(names, values, mode, middle)[0] + omitted_marker(middle)) <= body_budget:
+                low = middle
+            else:
+                high = middle - 1
+        shown = low
+        body, repeated = _render(names, values, mode, shown)
+        text = prefix + body + omitted_marker(shown)
+
+    truncated = {name: sum(flags[:shown]) for name, flags in zip(names, cut_flags) if any(flags[:shown])}
+
+    notes = []
+    if constants:
+        if result_rows is not None and result_rows > row_count:
+            scope = f"the {row_count} rows encoded here (not necessarily in the rest of the result)"
+        else:
+            scope = f"all {row_count} rows"
+        notes.append(f"- Constant columns have the same value in {scope} and are shown once above the rows")
+    if moved:
+        notes.append(f"- Long text columns were moved to the end: {', '.join(moved)}")
+    if mode == "columnar":
+        notes.append("- Each line is one column in row order; 'value ×n' is the value repeated in n consecutive rows")
+    elif repeated:
+        notes.append(f"- {REPEAT_MARK} means the same value as the previous row in that column")
+    if truncated:
+        cut = ", ".join(f"{name} ({count} values)" for name, count in truncated.items())
+        notes.append(f"- Values cut to {limit} characters, marked with …(+N chars): {cut}")
+
+    if notes:
+        text += "\n\nEncoding notes:\n" + "\n".join(notes)
+    return text
@@ -0,0 +1,169 @@
+import math
+import re
+from collections import Counter
+
+NUMERIC_TYPES = ("tinyint", "smallint", "integer", "int", "bigint", "float", "real", "double", "decimal")
+ORDERED_TYPES = ("date", "timestamp", "time")
+
+# Values are counted exactly until a column has this many distinct values, then HyperLogLog takes over
+EXACT_DISTINCT_LIMIT = 1024
+# HyperLogLog precision (2^11 registers, about 2.3% standard error)
+HLL_PRECISION = 11
+TOP_K = 5
+# Top values are cut to this many characters (marked with …(+N chars), as result_encoder does),
+# so a column of long texts does not blow up the profile
+TOP_VALUE_MAX_CHARS = 40
+
+
+class HyperLogLog:
+    """HyperLogLog cardinality estimator over Python's 64-bit string hash."""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self.alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value: str) -> None:
+        h = hash(value) & 0xFFFFFFFFFFFFFFFF
+        index = h >> (64 - self.precision)
+        rest = (h << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = 64 - self.precision + 1 if rest == 0 else 65 - rest.bit_length()
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        total = sum(2.0 ** -r for r in self.registers)
+        estimate = self.alpha * self.size * self.size / total
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class ColumnProfile:
+    """Single-pass statistics of one result column."""
+
+    def __init__(self, name: str, column_type: str):
+        self.name = name
+        self.type = column_type.lower()
+        # The base type name without parameters, e.g. "decimal" for "decimal(10,2)" and
+        # "timestamp" for "timestamp(3) with time zone" (so "interval day to second" is not numeric)
+        base_type = re.split(r"[(\s]", self.type.strip(), maxsplit=1)[0]
+        self.numeric = base_type in NUMERIC_TYPES
+        self.ordered = self.numeric or base_type in ORDERED_TYPES
+        self.nulls = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.numeric_count = 0
+        self.counts = Counter()
+        self.exact = True
+        self.hll = HyperLogLog()
+
+    def add(self, value) -> None:
+        if value is None:
+            self.nulls += 1
+            return
+
+        self.hll.add(value)
+        if value in self.counts or len(self.counts) < EXACT_DISTINCT_LIMIT:
+            self.counts[value] += 1
+        else:
+            # Past the limit only already-seen values are counted, so top values become approximate
+            self.exact = False
+
+        if self.numeric:
+            try:
+                number = float(value)
+            except ValueError:
+                return
+            self.total += number
+            self.numeric_count += 1
+        elif not self.ordered:
+            return
+        else:
+            number = value
+        if self.minimum is None or number < self.minimum:
+            self.minimum = number
+        if self.maximum is None or number > self.maximum:
+            self.maximum = number
+
+    def distinct(self) -> str:
+        return str(len(self.counts)) if self.exact else f"~{self.hll.estimate()}"
+
+    def render(self) -> str:
+        """Render the statistics of the column as one line."""
+        parts = [f"nulls={self.nulls}", f"distinct={self.distinct()}"]
+        if self.minimum is not None:
+            parts.append(f"min={_format_number(self.minimum)}")
+            parts.append(f"max={_format_number(self.maximum)}")
+        if self.numeric_count:
+            parts.append(f"mean={_format_number(self.total / self.numeric_count)}")
+        top = self.counts.most_common(TOP_K)
+        if top and top[0][1] > 1:
+            prefix = "top" if self.exact else "top(approx)"
+            parts.append(f"{prefix}=[" + ", ".join(f"{_truncate(value)} ({count})" for value, count in top) + "]")
+        return f"{self.name} ({self.type}): " + ", ".join(parts)
+
+
+def _truncate(value: str) -> str:
+    if len(value) <= TOP_VALUE_MAX_CHARS:
+        return value
+    return f"{value[:TOP_VALUE_MAX_CHARS]}…(+{len(value) - TOP_VALUE_MAX_CHARS} chars)"
+
+
+def _format_number(value) -> str:
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else f"{value:.6g}"
+    return str(value)
+
+
+def profile_rows(rows, column_types: list, max_rows: int) -> dict:
+    """
+    Compute per-column statistics in one pass over result rows.
+
+    Args:
+        rows: An iterator of rows whose first row is the header
+        column_types: The Athena type of each column (from ResultSetMetadata)
+        max_rows: The maximum number of data rows to profile
+
+    Returns:
+        A dictionary containing:
+        - row_count: The number of rows profiled
+        - complete: False if profiling stopped at max_rows
+        - columns: One ColumnProfile per column
+    """
+    header = next(rows, None) or []
+    types = list(column_types) + ["varchar"] * (len(header) - len(column_types))
+    profiles = [ColumnProfile(name, column_type) for name, column_type in zip(header, types)]
+
+    row_count = 0
+    complete = True
+    for row in rows:
+        if row_count >= max_rows:
+            complete = False
+            break
+        for profile, value in zip(profiles, row):
+            profile.add(value)
+        row_count += 1
+
+    return {"row_count": row_count, "complete": complete, "columns": profiles}
+
+
+def render_profile(profile: dict) -> str:
+    """
+    Render a result profile for the agent.
+
+    Args:
+        profile: The result of profile_rows
+
+    Returns:
+        The profile as text, one line per column
+    """
+    if profile["complete"]:
+        lines = [f"Column profile of the full result ({profile['row_count']} rows):"]
+    else:
+        lines = [f"Column profile of the first {profile['row_count']} rows (the result has more rows):"]
+    lines.extend(column.render() for column in profile["columns"])
+    return "\n".join(lines)
@@ -0,0 +1,144 @@
+import codecs
+import csv
+import logging
+import re
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# The first ranged GET is small so that short results need a single request; later ranges grow
+FIRST_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 1024 * 1024
+
+# Athena quotes every non-NULL value, so an unquoted empty field is NULL.
+# QUOTE_NOTNULL makes csv.reader return None for those fields (Python 3.12+).
+CSV_QUOTING = getattr(csv, "QUOTE_NOTNULL", csv.QUOTE_MINIMAL)
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+def parse_s3_uri(uri: str) -> tuple:
+    """
+    Split an s3://bucket/key URI into bucket and key.
+
+    Args:
+        uri: The S3 URI
+
+    Returns:
+        A tuple of (bucket, key)
+    """
+    bucket, _, key = uri.replace("s3://", "", 1).partition("/")
+    return bucket, key
+
+
+def iter_object_lines(s3, bucket: str, key: str):
+    """
+    Stream the lines of an S3 object using ranged GETs.
+    Only as many ranges are fetched as the consumer reads lines.
+
+    Args:
+        s3: The boto3 S3 client
+        bucket: The bucket name
+        key: The object key
+
+    Yields:
+        Decoded lines including their line endings
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    position = 0
+    chunk_size = FIRST_CHUNK_BYTES
+    total_size = None
+    pending = ""
+
+    while total_size is None or position < total_size:
+        response = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={position}-{position + chunk_size - 1}")
+        body = response["Body"].read()
+        if total_size is None:
+            match = CONTENT_RANGE_PATTERN.match(response.get("ContentRange", ""))
+            total_size = int(match.group(1)) if match else len(body)
+        position += len(body)
+        chunk_size = min(chunk_size * 2, MAX_CHUNK_BYTES)
+        if not body:
+            break
+
+        # Split on "\n" only, so other line separators inside quoted values are kept as they are
+        lines = (pending + decoder.decode(body)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_result_rows(s3, output_location: str):
+    """
+    Stream the rows of an Athena result CSV. The first row is the header.
+
+    Args:
+        s3: The boto3 S3 client
+        output_location: The OutputLocation of the query execution
+
+    Yields:
+        Lists of values, where NULL values are None
+    """
+    bucket, key = parse_s3_uri(output_location)
+    yield from csv.reader(iter_object_lines(s3, bucket, key), quoting=CSV_QUOTING)
+
+
+def read_result_columns(s3, output_location: str, max_rows: int) -> dict:
+    """
+    Read up to max_rows rows of an Athena result CSV into column arrays.
+    Reading stops as soon as enough rows have been parsed, so large results are not fully downloaded.
+
+    Args:
+        s3: The boto3 S3 client
+        output_location: The OutputLocation of the query execution
+        max_rows: The maximum number of data rows to read
+
+    Returns:
+        A dictionary containing:
+        - columns: The column names
+        - data: One list of values per column (None for NULL)
+        - row_count: The number of data rows read
+    """
+    rows = iter_result_rows(s3, output_location)
+    header = next(rows, None)
+    if header is None:
+        return {"columns": [], "data": [], "row_count": 0}
+
+    data = [[] for _ in header]
+    row_count = 0
+    for row in rows:
+        if row_count >= max_rows:
+            break
+        for values, value in zip(data, row):
+            values.append(value)
+        row_count += 1
+    rows.close()
+
+    return {"columns": header, "data": data, "row_count": row_count}
+
+
+def columns_from_query_results(results: dict) -> dict:
+    """
+    Convert a GetQueryResults response into the column array format of read_result_columns.
+    Used for statements whose output is not a CSV file (e.g., SHOW or DESCRIBE).
+
+    Args:
+        results: The response of athena.get_query_results
+
+    Returns:
+        The result as column arrays
+    """
+    rows = results["ResultSet"]["Rows"]
+    if not rows:
+        return {"columns": [], "data": [], "row_count": 0}
+
+    header = [col.get("VarCharValue", "") for col in rows[0]["Data"]]
+    data = [[] for _ in header]
+    for row in rows[1:]:
+        for values, col in zip(data, row["Data"]):
+            values.append(col.get("VarCharValue"))
+    return {"columns": header, "data": data, "row_count": len(rows) - 1}
@@ -0,0 +1,181 @@
+import json
+import logging
+import time
+from schema_retrieval import BM25Index
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def table_version(table: dict) -> str:
+    """
+    Build a version marker for a Glue table from its VersionId and UpdateTime.
+
+    Args:
+        table: A table dictionary as returned by glue.get_tables / glue.get_table
+
+    Returns:
+        A string that changes whenever the table definition changes
+    """
+    update_time = table.get("UpdateTime") or table.get("CreateTime") or ""
+    if hasattr(update_time, "isoformat"):
+        update_time = update_time.isoformat()
+    return f"{table.get('VersionId', '')}:{update_time}"
+
+
+def render_table_schema(table: dict) -> str:
+    """
+    Render the schema of a Glue table definition as text.
+    Includes column descriptions/comments, partition keys and table properties.
+
+    Args:
+        table: A table dictionary as returned by glue.get_tables / glue.get_table
+
+    Returns:
+        A string containing the detailed table schema with comments
+    """
+    table_name = table["Name"]
+
+    # Format the results
+    schema = []
+
+    # Add table information
+    schema.append(f"Schema for table '{table_name}':")
+    table_description = table.get("Description", "No description available")
+    schema.append(f"Table Description: {table_description}")
+    schema.append("")
+
+    # Add column information
+    schema.append("Column Name | Data Type | Description")
+    schema.append("------------|-----------|------------")
+
+    # Get columns from StorageDescriptor
+    if "StorageDescriptor" in table and "Columns" in table["StorageDescriptor"]:
+        columns = table["StorageDescriptor"]["Columns"]
+        for column in columns:
+            column_name = column["Name"]
+            column_type = column["Type"]
+            column_comment = column.get("Comment", "No description available")
+            schema.append(f"{column_name} | {column_type} | {column_comment}")
+
+    # Add partition keys if any
+    if "PartitionKeys" in table and table["PartitionKeys"]:
+        schema.append("")
+        schema.append("Partition Keys:")
+        schema.append("Column Name | Data Type | Description")
+        schema.append("------------|-----------|------------")
+
+        for column in table["PartitionKeys"]:
+            column_name = column["Name"]
+            column_type = column["Type"]
+            column_comment = column.get("Comment", "No description available")
+            schema.append(f"{column_name} | {column_type} | {column_comment}")
+
+    # Add additional table properties if available
+    if "Parameters" in table and table["Parameters"]:
+        schema.append("")
+        schema.append("Table Properties:")
+        for key, value in table["Parameters"].items():
+            schema.append(f"{key}: {value}")
+
+    return "\n".join(schema)
+
+
+class SchemaCatalogCache:
+    """
+    Cache of the rendered schema prompt text for a Glue database.
+
+    The cache has two tiers:
+    - In memory, reused across warm invocations until ttl_seconds elapse
+    - A JSON snapshot in S3, loaded on cold start so the first turn does not re-describe every table
+
+    Once the TTL has elapsed the cache is revalidated against the table versions (VersionId/UpdateTime).
+    Only tables whose version changed are rendered again.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, ttl_seconds: int):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.ttl_seconds = ttl_seconds
+        self.versions = {}
+        self.schemas = {}
+        self.listing = None
+        self.text = None
+        self.index = None
+        self.checked_at = 0.0
+        self.snapshot_loaded = False
+
+    def is_fresh(self) -> bool:
+        """Return True if the in-memory text can be used without revalidation."""
+        return self.text is not None and time.time() - self.checked_at < self.ttl_seconds
+
+    def load_snapshot(self) -> None:
+        """Load the serialized snapshot from S3 into memory (once per container)."""
+        if self.snapshot_loaded:
+            return
+        self.snapshot_loaded = True
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+            snapshot = json.loads(response["Body"].read())
+            self.versions = snapshot.get("versions", {})
+            self.schemas = snapshot.get("schemas", {})
+            self.listing = snapshot.get("listing")
+            self.text = snapshot.get("text")
+            logger.info(f"Loaded schema cache snapshot with {len(self.schemas)} tables from s3://{self.bucket}/{self.key}")
+        except self.s3.exceptions.NoSuchKey:
+            logger.info(f"No schema cache snapshot found at s3://{self.bucket}/{self.key}")
+        except Exception as e:
+            logger.warning(f"Error loading schema cache snapshot: {str(e)}")
+
+    def save_snapshot(self) -> None:
+        """Write the current cache contents to S3."""
+        try:
+            snapshot = {"versions": self.versions, "schemas": self.schemas, "listing": self.listing, "text": self.text}
+            body = json.dumps(snapshot, ensure_ascii=False)
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body.encode("utf-8"), ContentType="application/json")
+        except Exception as e:
+            logger.warning(f"Error saving schema cache snapshot: {str(e)}")
+
+    def cached_schema(self, table_name: str, version: str):
+        """
+        Get the rendered schema for a table if the cached one matches the given version.
+
+        Args:
+            table_name: The name of the table
+            version: The current version marker of the table
+
+        Returns:
+            The cached schema text, or None if the table is unknown or has changed
+        """
+        if self.versions.get(table_name) == version:
+            return self.schemas.get(table_name)
+        return None
+
+    def get_index(self) -> BM25Index:
+        """Get the BM25 index over the cached table schemas, building it on first use."""
+        if self.index is None:
+            self.index = BM25Index(self.schemas)
+        return self.index
+
+    def update(self, versions: dict, schemas: dict, listing: str, text: str) -> None:
+        """
+        Replace the cache contents after revalidation.
+        The snapshot is written back to S3 only when something actually changed.
+
+        Args:
+            versions: Table name to version marker
+            schemas: Table name to rendered schema text
+            listing: The rendered table list with descriptions
+            text: The full rendered schema prompt text
+        """
+        changed = versions != self.versions or text != self.text
+        self.versions = versions
+        self.schemas = schemas
+        self.listing = listing
+        self.text = text
+        self.checked_at = time.time()
+        if changed:
+            self.index = None
+            logger.info(f"Schema catalog changed, saving snapshot with {len(schemas)} tables")
+            self.save_snapshot()
@@ -0,0 +1,129 @@
+import math
+import re
+from collections import Counter
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Table names are repeated in the indexed document so that matching a table name outweighs a column comment
+TABLE_NAME_BOOST = 3
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff66-\uff9f]+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Split text into terms for BM25.
+    ASCII words are split on non-alphanumerics (so snake_case names become separate words),
+    and runs of Japanese characters are split into character bigrams.
+
+    Args:
+        text: The text to tokenize
+
+    Returns:
+        A list of terms
+    """
+    if not text:
+        return []
+    text = text.lower()
+    terms = WORD_PATTERN.findall(text)
+    for run in CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over rendered table schemas.
+    The documents are the schema texts (table name, description, column names and comments).
+    """
+
+    def __init__(self, documents: dict):
+        """
+        Args:
+            documents: Table name to schema text
+        """
+        self.names = list(documents.keys())
+        self.term_freqs = []
+        self.doc_lengths = []
+        doc_freqs = Counter()
+        for name in self.names:
+            terms = tokenize(documents[name]) + tokenize(name) * TABLE_NAME_BOOST
+            freqs = Counter(terms)
+            self.term_freqs.append(freqs)
+            self.doc_lengths.append(len(terms))
+            doc_freqs.update(freqs.keys())
+
+        doc_count = len(self.names)
+        self.avg_doc_length = sum(self.doc_lengths) / doc_count if doc_count else 0.0
+        self.idf = {term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def score(self, query: str) -> dict:
+        """
+        Score every table against a query.
+
+        Args:
+            query: The query text
+
+        Returns:
+            Table name to BM25 score
+        """
+        query_terms = set(tokenize(query))
+        scores = {}
+        for name, freqs, length in zip(self.names, self.term_freqs, self.doc_lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_doc_length) if self.avg_doc_length else BM25_K1
+            for term in query_terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            scores[name] = score
+        return scores
+
+    def top_k(self, query: str, k: int) -> list:
+        """
+        Get the k most relevant tables for a query, most relevant first.
+        Tables with a zero score are never returned.
+
+        Args:
+            query: The query text
+            k: The maximum number of tables to return
+
+        Returns:
+            A list of table names
+        """
+        scores = self.score(query)
+        ranked = sorted((name for name in self.names if scores[name] > 0), key=lambda name: scores[name], reverse=True)
+        return ranked[:k]
+
+
+def build_retrieval_query(user_input: str, messages: list, recent_messages: int = 4) -> str:
+    """
+    Build the retrieval query from the user's question and the recent conversation.
+    Text blocks and SQL from execute_sql_query tool calls in the recent messages are included,
+    so follow-up questions keep the tables used in the previous turns.
+
+    Args:
+        user_input: The user's current message
+        messages: The conversation history
+        recent_messages: How many of the most recent messages to include
+
+    Returns:
+        The query text
+    """
+    parts = [user_input]
+    recent = messages[-recent_messages:] if recent_messages > 0 else []
+    for message in recent:
+        for content_item in message.get("content", []):
+            if "text" in content_item:
+                parts.append(content_item["text"])
+            elif "toolUse" in content_item:
+                sql_query = content_item["toolUse"].get("input", {}).get("sql_query")
+                if sql_query:
+                    parts.append(sql_query)
+    return "\n".join(parts)
@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Parallel S3 requests when reading or writing the chunks of one session
+MAX_PARALLEL_REQUESTS = 8
+
+
+def _json_default(value):
+    """Convert the Decimal numbers returned by DynamoDB to int or float."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def restore_numbers(value):
+    """
+    Convert the Decimal numbers in messages read from DynamoDB back to int or float.
+    Messages are replayed to the model, and the Bedrock request validation rejects Decimal
+    (e.g., the row_count in the metadata block of a query result).
+
+    Args:
+        value: A message list, dictionary, or value as returned by DynamoDB
+
+    Returns:
+        The same structure with plain numbers
+    """
+    if isinstance(value, Decimal):
+        return _json_default(value)
+    if isinstance(value, dict):
+        return {key: restore_numbers(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [restore_numbers(item) for item in value]
+    return value
+
+
+def serialize_messages(messages: list) -> bytes:
+    """
+    Serialize messages as compact UTF-8 JSON.
+
+    Args:
+        messages: The list of message dictionaries
+
+    Returns:
+        The JSON bytes
+    """
+    return json.dumps(messages, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+class SessionPayloadStore:
+    """
+    Stores the message bodies of large sessions in S3, so the DynamoDB session item stays small.
+
+    Messages are split into chunks of chunk_messages messages at fixed positions, so the chunks of
+    earlier turns stay the same as the conversation grows. Each chunk is gzip-compressed JSON stored
+    under a content-addressed key (SHA-256 of the chunk), so an unchanged chunk is never uploaded twice
+    and a key always refers to the same content. Chunks are immutable, so decoded chunks are also
+    kept in an in-memory LRU that warm invocations reuse.
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str, chunk_messages: int, cache_entries: int = 64):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.chunk_messages = chunk_messages
+        self.cache_entries = cache_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def session_prefix(self, user_id: str, session_id: str) -> str:
+        return f"{self.prefix}{user_id}/{session_id}/"
+
+    def _cache_get(self, key: str):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        return None
+
+    def _cache_put(self, key: str, messages: list) -> None:
+        with self.lock:
+            self.cache[key] = messages
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+
+    def _put_chunk(self, key: str, body: bytes, messages: list) -> None:
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType="application/json", ContentEncoding="gzip")
+        self._cache_put(key, messages)
+
+    def _get_chunk(self, key: str) -> list:
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        body = self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        messages = json.loads(gzip.decompress(body))
+        self._cache_put(key, messages)
+        return messages
+
+    def write(self, user_id: str, session_id: str, messages: list) -> list:
+        """
+        Upload the chunks of a session's messages. Chunks already in S3 are not uploaded again.
+
+        Args:
+            user_id: The ID of the user
+            session_id: The ID of the session
+            messages: The list of message dictionaries
+
+        Returns:
+            The chunk references to store in the session item: [{"key": ..., "count": ...}, ...]
+        """
+        chunks = []
+        uploads = []
+        for start in range(0, len(messages), self.chunk_messages):
+            chunk = messages[start : start + self.chunk_messages]
+            data = serialize_messages(chunk)
+            key = f"{self.session_prefix(user_id, session_id)}{hashlib.sha256(data).hexdigest()}.json.gz"
+            chunks.append({"key": key, "count": len(chunk)})
+            if self._cache_get(key) is None:
+                # Decode the serialized chunk, so the cache holds the same types as a read from S3
+                uploads.append((key, gzip.compress(data, compresslevel=6), json.loads(data)))
+
+        if uploads:
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(uploads))) as executor:
+                list(executor.map(lambda upload: self._put_chunk(*upload), uploads))
+        logger.info(f"Session payload: {len(chunks)} chunks, {len(uploads)} uploaded")
+        return chunks
+
+    def read(self, chunks: list, start: int = 0, stop: int = None) -> list:
+        """
+        Read messages[start:stop] of a session, fetching only the chunks that overlap the range.
+
+        Args:
+            chunks: The chunk references from the session item
+            start: Index of the first message to read
+            stop: Index after the last message to read (None reads to the end)
+
+        Returns:
+            The list of message dictionaries in the range
+        """
+        needed = []
+        position = 0
+        for chunk in chunks:
+            count = int(chunk["count"])
+            if position + count > start and (stop is None or position < stop):
+                needed.append((position, chunk["key"]))
+            position += count
+
+        if not needed:
+            return []
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(needed))) as executor:
+            loaded = list(executor.map(lambda item: self._get_chunk(item[1]), needed))
+
+        first = needed[0][0]
+        messages = [message for chunk in loaded for message in chunk]
+        return messages[start - first : None if stop is None else stop - first]
+
+    def delete_keys(self, keys) -> None:
+        """
+        Delete chunks that are no longer referenced.
+
+        Args:
+            keys: The S3 keys of the chunks
+        """
+        keys = list(keys)
+        for start in range(0, len(keys), 1000):
+            batch = keys[start : start + 1000]
+            self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True})
+        with self.lock:
+            for key in keys:
+                self.cache.pop(key, None)
+
+    def delete_session(self, user_id: str, session_id: str) -> None:
+        """
+        Delete all chunks of a session.
+
+        Args:
+            user_id: The ID of the user
+            session_id: The ID of the session
+        """
+        paginator = self.s3.get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.session_prefix(user_id, session_id)):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        if keys:
+            self.delete_keys(keys)
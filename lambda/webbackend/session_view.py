@@ -0,0 +1,170 @@
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def session_version(item: dict) -> str:
+    """
+    Build a version marker for a session from its header item.
+    Every saved turn increments turn_count and message_count and sets last_updated, so the marker
+    changes whenever the conversation does (last_updated alone has a resolution of one second).
+
+    Args:
+        item: The session header item from DynamoDB
+
+    Returns:
+        A string that changes whenever a turn is saved
+    """
+    message_count = item.get("message_count", len(item.get("messages", [])))
+    return f"{item.get('turn_count', '')}:{message_count}:{item.get('last_updated', '')}"
+
+
+def session_etag(session_id: str, version: str, *parts) -> str:
+    """
+    Build the strong ETag of a session detail response.
+
+    Args:
+        session_id: The ID of the session
+        version: The version from session_version
+        *parts: The request parameters that select the representation (e.g., cursor and page size)
+
+    Returns:
+        The quoted ETag value
+    """
+    source = "\n".join(str(part) for part in (session_id, version, *parts))
+    return f'"{hashlib.sha256(source.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag (weak comparison, as If-None-Match uses).
+
+    Args:
+        if_none_match: The header value, e.g., '"abc", W/"def"' or '*' (None if absent)
+        etag: The quoted ETag of the current representation
+
+    Returns:
+        True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in [candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates]
+
+
+def encode_cursor(last_evaluated_key: dict) -> str:
+    """
+    Encode the LastEvaluatedKey of a DynamoDB query as an opaque page cursor.
+
+    Args:
+        last_evaluated_key: The LastEvaluatedKey (None if the query returned the last page)
+
+    Returns:
+        The URL-safe cursor, or None if there is no next page
+    """
+    if not last_evaluated_key:
+        return None
+    key = {name: int(value) if isinstance(value, Decimal) else value for name, value in last_evaluated_key.items()}
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Decode a page cursor from encode_cursor back into an ExclusiveStartKey.
+
+    Args:
+        cursor: The cursor sent by the client
+
+    Returns:
+        The ExclusiveStartKey
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    if not isinstance(key, dict):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def paginate_view(view: list, cursor, page_size: int) -> tuple:
+    """
+    Select one page of a session view, newest page first.
+
+    The messages of the view carry their sequence number ("seq"). The first page holds the latest
+    page_size messages; the cursor of the next page is the seq of the oldest message returned, and that
+    page holds the page_size messages before it. Messages within a page stay in conversation order,
+    so a client prepends each page to what it shows.
+
+    Args:
+        view: The sequenced messages of the session, in conversation order
+        cursor: The seq before which the page ends (None for the first page)
+        page_size: The maximum number of messages per page
+
+    Returns:
+        A tuple (messages, next_cursor), where next_cursor is None for the oldest page
+    """
+    end = len(view) if cursor is None else min(max(cursor - 1, 0), len(view))
+    start = max(end - page_size, 0)
+    return view[start:end], (view[start]["seq"] if start > 0 else None)
+
+
+class SessionViewCache:
+    """
+    Caches the filtered, sequenced message view of recently read sessions in the Lambda container.
+
+    Building a view reads every turn item and runs the filter over the whole conversation, so a client
+    that pages through a session, or reopens it, would pay for it on every request. The view is stored
+    with the session version it was built from and rebuilt only when a new turn changes the version.
+    At most max_entries sessions are kept (least recently used first).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.views = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id: str, session_id: str, version: str, build) -> list:
+        """
+        Get the view of a session, building it with build() if the cached view is missing or outdated.
+
+        Args:
+            user_id: The ID of the user
+            session_id: The ID of the session
+            version: The current version from session_version
+            build: A function without arguments that returns the view
+
+        Returns:
+            The view of the session
+        """
+        key = (user_id, session_id)
+        with self.lock:
+            cached = self.views.get(key)
+            if cached and cached[0] == version:
+                self.views.move_to_end(key)
+                logger.info(f"Session view cache hit: {session_id}")
+                return cached[1]
+
+        view = build()
+        with self.lock:
+            self.views[key] = (version, view)
+            self.views.move_to_end(key)
+            while len(self.views) > self.max_entries:
+                self.views.popitem(last=False)
+        return view
+
+    def invalidate(self, user_id: str, session_id: str) -> None:
+        """Drop the cached view of a session (e.g., after it was deleted)."""
+        with self.lock:
+            self.views.pop((user_id, session_id), None)
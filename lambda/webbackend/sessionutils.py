@@ -1,22 +1,256 @@
 import boto3
+import hashlib
 import json
 import logging
 import os
 import re
 from datetime import datetime
-from boto3.dynamodb.conditions import Attr
+from urllib.parse import unquote, urlparse
+from boto3.dynamodb.conditions import Attr, Key
+from tokenutils import estimate_tokens
+from session_storage import SessionPayloadStore, restore_numbers, serialize_messages
+from lazy_clients import LazyClient
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# DynamoDB clients
-dynamodb = boto3.resource("dynamodb")
-
 # Environment variables
 SESSION_TABLE = os.environ["SESSION_TABLE"]
+SESSION_PAYLOAD_BUCKET = os.environ.get("SESSION_PAYLOAD_BUCKET")
+
+# DynamoDB tables (the resource is created on first use, not at import)
+session_table = LazyClient(lambda: boto3.resource("dynamodb").Table(SESSION_TABLE))
+
+# S3 client (created on first use)
+s3 = LazyClient(lambda: boto3.client("s3"))
+
+# Messages larger than SESSION_INLINE_MAX_BYTES (serialized JSON) are moved from the session item
+# to S3 chunks of SESSION_CHUNK_MESSAGES messages. Without SESSION_PAYLOAD_BUCKET all messages stay inline.
+SESSION_INLINE_MAX_BYTES = int(os.environ.get("SESSION_INLINE_MAX_BYTES", str(32 * 1024)))
+SESSION_CHUNK_MESSAGES = int(os.environ.get("SESSION_CHUNK_MESSAGES", "20"))
+payload_store = (
+    SessionPayloadStore(s3, SESSION_PAYLOAD_BUCKET, "session-messages/", SESSION_CHUNK_MESSAGES) if SESSION_PAYLOAD_BUCKET else None
+)
+
+# Charts of stored turns are presigned from their key in CHART_IMAGE_BUCKET each time they are sent,
+# with URLs valid for STORED_CHART_URL_EXPIRES_SECONDS. Without CHART_IMAGE_BUCKET they stay references.
+CHART_IMAGE_BUCKET = os.environ.get("CHART_IMAGE_BUCKET")
+STORED_CHART_URL_EXPIRES_SECONDS = int(os.environ.get("STORED_CHART_URL_EXPIRES_SECONDS", "900"))
+
+# Each turn is stored as its own item: user_id = "<user_id>#<session_id>", session_id = "turn#<index>".
+# The item keyed by the real user_id/session_id is the small session header.
+TURN_SORT_PREFIX = "turn#"
+TURN_PAGE_SIZE = int(os.environ.get("TURN_PAGE_SIZE", "50"))
+
+# Rolling compaction: when the messages replayed to the model exceed COMPACTION_TRIGGER_TOKENS (estimated),
+# all but the last COMPACTION_KEEP_TURNS turns are folded into the stored conversation summary
+COMPACTION_TRIGGER_TOKENS = int(os.environ.get("COMPACTION_TRIGGER_TOKENS", "30000"))
+COMPACTION_KEEP_TURNS = int(os.environ.get("COMPACTION_KEEP_TURNS", "4"))
+
+# Tool inputs and results are cut to this length in the transcript given to the summarizer
+TRANSCRIPT_TOOL_CHARS = 1000
+
+# Results of these tools are replaced with a compact stub once their turn is over
+ELIDED_QUERY_TOOLS = ("execute_sql_query", "recall_query_result")
+ELIDED_CHART_TOOLS = ("execute_chart_code",)
+# Results shorter than this (e.g., error messages) are kept as they are
+ELIDE_MIN_CHARS = 500
+ELIDED_RESULT_PREFIX = "[Result elided from history]"
+
+QUERY_EXECUTION_ID_PATTERN = re.compile(r"Query Execution ID: (\S+)")
+ROW_COUNT_PATTERN = re.compile(r"Results: (more than )?(\d+) rows")
+CHART_URL_PATTERN = re.compile(r"Chart \d+ URL: ")
+
+# Chart images are stored under CHART_KEY_PREFIX. Turns saved without chart records get them rebuilt from
+# the "Chart N URL: <presigned URL>" lines of their execute_chart_code results.
+CHART_KEY_PREFIX = "chart-images/"
+CHART_URL_LINE_PATTERN = re.compile(r"Chart \d+ URL: (\S+)")
+CHART_DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def load_messages(item: dict, start: int = 0, stop: int = None) -> list:
+    """
+    Load messages[start:stop] of a session or turn item, whether they are stored inline or in S3 chunks.
+    Only the S3 chunks overlapping the range are read. Numbers of inline messages are returned as int or float.
+
+    Args:
+        item: The session item from DynamoDB
+        start: Index of the first message to load
+        stop: Index after the last message to load (None loads to the end)
+
+    Returns:
+        The list of message dictionaries
+    """
+    if "message_chunks" in item:
+        if not payload_store:
+            logger.error("Session messages are stored in S3 but SESSION_PAYLOAD_BUCKET is not set")
+            return []
+        return payload_store.read(item["message_chunks"], start, stop)
+    return restore_numbers(item.get("messages", [])[start:stop])
+
+
+def get_message_count(item: dict) -> int:
+    """
+    Get the number of messages of a session or turn item without loading them.
+
+    Args:
+        item: The session item from DynamoDB
+
+    Returns:
+        The number of messages
+    """
+    if "message_count" in item:
+        return int(item["message_count"])
+    return len(item.get("messages", []))
+
+
+def turn_partition_key(user_id: str, session_id: str) -> str:
+    """Partition key (user_id attribute) of the turn items of a session."""
+    return f"{user_id}#{session_id}"
+
+
+def turn_sort_key(turn_index: int) -> str:
+    """Sort key (session_id attribute) of a turn item."""
+    return f"{TURN_SORT_PREFIX}{turn_index:06d}"
+
+
+def iter_turn_items(user_id: str, session_id: str, newest_first: bool = False, page_size: int = TURN_PAGE_SIZE):
+    """
+    Page through the turn items of a session with Query and Limit.
+
+    Args:
+        user_id: The ID of the user
+        session_id: The ID of the session
+        newest_first: Return the latest turn first
+        page_size: The Limit of each Query
+
+    Yields:
+        Turn items in turn order (or reverse turn order)
+    """
+    kwargs = {
+        "KeyConditionExpression": Key("user_id").eq(turn_partition_key(user_id, session_id)) & Key("session_id").begins_with(TURN_SORT_PREFIX),
+        "ScanIndexForward": not newest_first,
+        "Limit": page_size,
+    }
+    while True:
+        response = session_table.query(**kwargs)
+        yield from response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def load_session(item: dict, user_id: str, session_id: str) -> list:
+    """
+    Load the turns of a session.
+    Sessions saved before per-turn storage keep all messages in the header item and are returned as one turn.
+
+    Args:
+        item: The session header item from DynamoDB
+        user_id: The ID of the user
+        session_id: The ID of the session
+
+    Returns:
+        A list of (turn_index, messages) tuples; turn_index is None for a session that has not been migrated
+    """
+    if "turn_count" not in item:
+        messages = load_messages(item)
+        return [(None, messages)] if messages else []
+    return [(int(turn["turn_index"]), load_messages(turn)) for turn in iter_turn_items(user_id, session_id)]
+
+
+def load_session_with_charts(item: dict, user_id: str, session_id: str) -> tuple:
+    """
+    Load the turns of a session together with the chart records of its turn items.
+
+    Args:
+        item: The session header item from DynamoDB
+        user_id: The ID of the user
+        session_id: The ID of the session
+
+    Returns:
+        A tuple (turns, charts): the turns as load_session returns them, and the charts as
+        [{"turn": ..., "sha256": ..., "key": ...}] (rebuilt from the chart URLs for turns saved without them)
+    """
+    if "turn_count" not in item:
+        turns = load_session(item, user_id, session_id)
+        messages = turns[0][1] if turns else []
+        charts = [
+            chart
+            for turn_index, (start, stop) in enumerate(turn_bounds(messages))
+            for chart in extract_chart_records(turn_index, messages[start:stop])
+        ]
+        return turns, charts
+    turn_items = list(iter_turn_items(user_id, session_id))
+    turns = [(int(turn["turn_index"]), load_messages(turn)) for turn in turn_items]
+    charts = []
+    for turn, (turn_index, messages) in zip(turn_items, turns):
+        if "charts" in turn:
+            charts.extend({"turn": int(chart["turn"]), "sha256": chart["sha256"], "key": chart["key"]} for chart in turn["charts"])
+        else:
+            # Turns migrated before chart records were kept on turn items
+            charts.extend(extract_chart_records(turn_index, messages))
+    return turns, charts
+
+
+def chart_key_from_url(url: str) -> str:
+    """The S3 key of a presigned chart URL (virtual-hosted or path style), or None if it is not a chart image."""
+    path = unquote(urlparse(url).path)
+    position = path.find(CHART_KEY_PREFIX)
+    return path[position:] if position >= 0 else None
+
+
+def extract_chart_records(turn_index: int, messages: list) -> list:
+    """
+    Rebuild the chart records of a turn saved without them, from the chart URLs in its execute_chart_code results.
+    Content-addressed keys ("<sha256>.<ext>") carry the hash of the image. Keys of the earlier
+    "<timestamp>_<id>.png" format do not, so the hash of the key identifies those charts instead.
+
+    Args:
+        turn_index: The index of the turn
+        messages: The messages of the turn
 
-# DynamoDB tables
-session_table = dynamodb.Table(SESSION_TABLE)
+    Returns:
+        The charts of the turn as [{"turn": ..., "sha256": ..., "key": ...}], in the order they were generated
+    """
+    chart_tool_uses = set()
+    charts = {}
+    for message in messages:
+        for content_item in message.get("content", []):
+            if "toolUse" in content_item and content_item["toolUse"].get("name") in ELIDED_CHART_TOOLS:
+                chart_tool_uses.add(content_item["toolUse"].get("toolUseId"))
+            if "toolResult" not in content_item or content_item["toolResult"].get("toolUseId") not in chart_tool_uses:
+                continue
+            for result_content in content_item["toolResult"].get("content", []):
+                for url in CHART_URL_LINE_PATTERN.findall(result_content.get("text", "")):
+                    key = chart_key_from_url(url)
+                    if not key or key in charts:
+                        continue
+                    stem = key[len(CHART_KEY_PREFIX) :].rsplit(".", 1)[0]
+                    digest = stem if CHART_DIGEST_PATTERN.fullmatch(stem) else hashlib.sha256(key.encode("utf-8")).hexdigest()
+                    charts[key] = {"turn": turn_index, "sha256": digest, "key": key}
+    return list(charts.values())
+
+
+def session_title(messages: list) -> str:
+    """
+    Build the session title from the first user message (its first 50 characters).
+
+    Args:
+        messages: The first messages of the session
+
+    Returns:
+        The title, or "New Chat" if there is no user message
+    """
+    for msg in messages:
+        if msg.get("role") == "user" and msg.get("content"):
+            content = msg.get("content", [])
+            if content and "text" in content[0]:
+                title = content[0]["text"][:50]
+                if len(content[0]["text"]) > 50:
+                    title += "..."
+                return title
+    return "New Chat"
 
 
 def get_conversation_history(user_id: str, session_id: str) -> list:
@@ -32,42 +266,389 @@ def get_conversation_history(user_id: str, session_id: str) -> list:
     """
     try:
         response = session_table.get_item(Key={"user_id": user_id, "session_id": session_id})
-
-        if "Item" in response and "messages" in response["Item"]:
-            return response["Item"]["messages"]
-        else:
-            return []
+        turns = load_session(response.get("Item", {}), user_id, session_id)
+        return [message for _, messages in turns for message in messages]
 
     except Exception as e:
         logger.error(f"Error retrieving conversation history: {str(e)}")
         return []
 
 
-def save_conversation_history(user_id: str, session_id: str, messages: list) -> bool:
+def _put_turn_item(user_id: str, session_id: str, turn_index: int, messages: list, charts: list = None) -> None:
+    """
+    Write one turn item with the charts generated in the turn. Turns larger than SESSION_INLINE_MAX_BYTES
+    are written to S3 chunks, and chunks the item no longer references are deleted.
+    """
+    item = {
+        "user_id": turn_partition_key(user_id, session_id),
+        "session_id": turn_sort_key(turn_index),
+        "turn_index": turn_index,
+        "message_count": len(messages),
+    }
+    if charts:
+        item["charts"] = [{"turn": turn_index, "sha256": chart["sha256"], "key": chart["key"]} for chart in charts]
+    if payload_store and len(serialize_messages(messages)) > SESSION_INLINE_MAX_BYTES:
+        item["message_chunks"] = payload_store.write(user_id, session_id, messages)
+    else:
+        item["messages"] = messages
+
+    old_item = session_table.put_item(Item=item, ReturnValues="ALL_OLD").get("Attributes", {})
+    _delete_stale_chunks(old_item.get("message_chunks", []), item.get("message_chunks", []))
+
+
+def _delete_stale_chunks(old_chunks: list, new_chunks: list) -> None:
+    current_keys = {chunk["key"] for chunk in new_chunks}
+    stale_keys = [chunk["key"] for chunk in old_chunks if chunk["key"] not in current_keys]
+    if stale_keys and payload_store:
+        try:
+            payload_store.delete_keys(stale_keys)
+        except Exception as e:
+            logger.warning(f"Error deleting stale session chunks: {str(e)}")
+
+
+def _migrate_legacy_session(user_id: str, session_id: str, messages: list) -> int:
+    """
+    Move the messages of a session saved before per-turn storage into turn items, with the chart records
+    rebuilt from the chart URLs of each turn. Returns the number of turns written, or None if another writer migrated the session first.
+    """
+    bounds = turn_bounds(messages)
+    for turn_index, (start, stop) in enumerate(bounds):
+        turn = messages[start:stop]
+        _put_turn_item(user_id, session_id, turn_index, turn, extract_chart_records(turn_index, turn))
+
+    try:
+        response = session_table.update_item(
+            Key={"user_id": user_id, "session_id": session_id},
+            UpdateExpression="SET turn_count = :turns, message_count = :count, title = if_not_exists(title, :title) REMOVE messages, message_chunks",
+            ConditionExpression=Attr("turn_count").not_exists(),
+            ExpressionAttributeValues={":turns": len(bounds), ":count": len(messages), ":title": session_title(messages)},
+            ReturnValues="UPDATED_OLD",
+        )
+    except session_table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"Session {session_id} was already migrated to per-turn storage")
+        return None
+
+    _delete_stale_chunks(response.get("Attributes", {}).get("message_chunks", []), [])
+    logger.info(f"Migrated session {session_id} to {len(bounds)} turn items")
+    return len(bounds)
+
+
+def save_conversation_turn(user_id: str, session_id: str, new_messages: list, session_state: dict, charts: list = None) -> bool:
     """
-    Save conversation history for a specific user and session to DynamoDB.
+    Append the messages of a new turn to the session.
+
+    Only the new turn item and the small header item are written, so the write cost does not grow
+    with the length of the conversation. The turn index is reserved with an atomic counter on the header,
+    so concurrent writers never overwrite each other's turns. Turns are stored in full; large tool results of
+    earlier turns are replaced by stubs only in the messages replayed to the model (see elide_tool_results).
+    Sessions saved before per-turn storage are migrated to turn items on their first new turn.
+    The hashes and S3 keys of the charts generated in the turn are stored on the turn item.
 
     Args:
         user_id: The ID of the user
         session_id: The ID of the session
-        messages: The list of message dictionaries from the Agent
+        new_messages: The messages added in this turn
+        session_state: The state returned by get_session_state before the turn
+        charts: The charts generated in this turn, as [{"sha256": ..., "key": ...}]
 
     Returns:
         True if successful, False otherwise
     """
     try:
-        session_table.update_item(
+        turns = session_state.get("turns", [])
+        migrated = None
+        if turns and turns[0][0] is None:
+            migrated = _migrate_legacy_session(user_id, session_id, turns[0][1])
+
+        response = session_table.update_item(
             Key={"user_id": user_id, "session_id": session_id},
-            UpdateExpression="SET messages = :messages, last_updated = :updated",
-            ExpressionAttributeValues={":messages": messages, ":updated": int(datetime.now().timestamp())},
+            UpdateExpression=(
+                "SET turn_count = if_not_exists(turn_count, :zero) + :one, "
+                "message_count = if_not_exists(message_count, :zero) + :count, "
+                "title = if_not_exists(title, :title), last_updated = :updated"
+            ),
+            ExpressionAttributeValues={
+                ":zero": 0,
+                ":one": 1,
+                ":count": len(new_messages),
+                ":title": session_title(new_messages),
+                ":updated": int(datetime.now().timestamp()),
+            },
+            ReturnValues="UPDATED_NEW",
         )
+        turn_index = int(response["Attributes"]["turn_count"]) - 1
+        if migrated is not None and turn_index != migrated:
+            logger.warning(f"Turn index {turn_index} was reserved after migrating {migrated} turns")
+
+        _put_turn_item(user_id, session_id, turn_index, new_messages, charts)
         return True
 
     except Exception as e:
-        logger.error(f"Error saving conversation history: {str(e)}")
+        logger.error(f"Error saving conversation turn: {str(e)}")
         return False
 
 
+def get_session_state(user_id: str, session_id: str) -> dict:
+    """
+    Retrieve the full conversation and its compaction state for a specific user and session.
+
+    Args:
+        user_id: The ID of the user
+        session_id: The ID of the session
+
+    Returns:
+        A dictionary containing:
+        - messages: The full raw transcript
+        - turns: The stored turns as (turn_index, messages) tuples, for save_conversation_turn
+        - summary: The summary of the compacted turns ("" if none)
+        - summary_message_count: The number of leading messages covered by the summary
+        - charts: The charts of the stored turns, as [{"turn": ..., "sha256": ..., "key": ...}]
+    """
+    state = {"messages": [], "turns": [], "summary": "", "summary_message_count": 0, "charts": []}
+    try:
+        response = session_table.get_item(Key={"user_id": user_id, "session_id": session_id})
+        item = response.get("Item", {})
+        state["turns"], state["charts"] = load_session_with_charts(item, user_id, session_id)
+        state["messages"] = [message for _, messages in state["turns"] for message in messages]
+
+        summary_message_count = int(item.get("summary_message_count", 0))
+        # Ignore a summary that does not match the stored transcript (e.g., the history was replaced)
+        if item.get("summary") and 0 < summary_message_count <= len(state["messages"]):
+            state["summary"] = item["summary"]
+            state["summary_message_count"] = summary_message_count
+    except Exception as e:
+        logger.error(f"Error retrieving session state: {str(e)}")
+
+    return state
+
+
+def save_conversation_summary(user_id: str, session_id: str, summary: str, summary_message_count: int) -> bool:
+    """
+    Save the rolling summary of the compacted turns.
+    The update is skipped if a summary covering more messages was saved in the meantime.
+
+    Args:
+        user_id: The ID of the user
+        session_id: The ID of the session
+        summary: The summary of the compacted turns
+        summary_message_count: The number of leading messages covered by the summary
+
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        session_table.update_item(
+            Key={"user_id": user_id, "session_id": session_id},
+            UpdateExpression="SET summary = :summary, summary_message_count = :count",
+            ConditionExpression=Attr("summary_message_count").not_exists() | Attr("summary_message_count").lt(summary_message_count),
+            ExpressionAttributeValues={":summary": summary, ":count": summary_message_count},
+        )
+        return True
+    except session_table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info("A newer conversation summary is already saved")
+        return False
+    except Exception as e:
+        logger.error(f"Error saving conversation summary: {str(e)}")
+        return False
+
+
+def estimate_messages_tokens(messages: list) -> int:
+    """
+    Estimate the model input tokens of a list of messages.
+
+    Args:
+        messages: The list of message dictionaries
+
+    Returns:
+        The estimated token count
+    """
+    return estimate_tokens(json.dumps(messages, ensure_ascii=False, default=str))
+
+
+def find_turn_starts(messages: list) -> list:
+    """
+    Find where each conversation turn starts.
+    A turn starts with a user message containing text; user messages that only carry tool results
+    belong to the turn in progress.
+
+    Args:
+        messages: The list of message dictionaries
+
+    Returns:
+        The indexes of the first message of each turn
+    """
+    return [index for index, message in enumerate(messages) if is_turn_start(message)]
+
+
+def turn_bounds(messages: list) -> list:
+    """
+    Split messages into turns.
+
+    Args:
+        messages: The list of message dictionaries
+
+    Returns:
+        The (start, stop) indexes of each turn; messages before the first turn start belong to the first turn
+    """
+    turn_starts = find_turn_starts(messages) or [0]
+    if turn_starts[0] != 0:
+        turn_starts.insert(0, 0)
+    return list(zip(turn_starts, turn_starts[1:] + [len(messages)]))
+
+
+def is_turn_start(message: dict) -> bool:
+    """Whether a message starts a turn (a user message that does not carry tool results)."""
+    return message.get("role") == "user" and all("toolResult" not in item for item in message.get("content", []))
+
+
+def select_compaction_boundary(messages: list, summary_message_count: int, keep_turns: int = COMPACTION_KEEP_TURNS):
+    """
+    Select the message index up to which turns are folded into the summary,
+    keeping the last keep_turns turns verbatim.
+
+    Args:
+        messages: The full raw transcript
+        summary_message_count: The number of leading messages already covered by the summary
+        keep_turns: The number of recent turns kept verbatim
+
+    Returns:
+        The new summary_message_count, or None if there is nothing to compact
+    """
+    turn_starts = [index for index in find_turn_starts(messages) if index >= summary_message_count]
+    if len(turn_starts) <= keep_turns:
+        return None
+    return turn_starts[-keep_turns] if keep_turns > 0 else len(messages)
+
+
+def render_transcript(messages: list) -> str:
+    """
+    Render messages as plain text for the summarizer.
+    <thinking> blocks are removed and tool inputs/results are cut to TRANSCRIPT_TOOL_CHARS.
+
+    Args:
+        messages: The list of message dictionaries
+
+    Returns:
+        The transcript, one block per message content item
+    """
+    lines = []
+    for message in messages:
+        role = message.get("role", "")
+        for content_item in message.get("content", []):
+            if "text" in content_item:
+                text = remove_thinking_tags(content_item["text"])
+                if text:
+                    lines.append(f"[{role}] {text}")
+            elif "toolUse" in content_item:
+                tool_use = content_item["toolUse"]
+                tool_input = json.dumps(tool_use.get("input", {}), ensure_ascii=False, default=str)
+                lines.append(f"[tool call: {tool_use.get('name')}] {tool_input[:TRANSCRIPT_TOOL_CHARS]}")
+            elif "toolResult" in content_item:
+                texts = [item.get("text", "") for item in content_item["toolResult"].get("content", []) if "text" in item]
+                result = "\n".join(texts)
+                if len(result) > TRANSCRIPT_TOOL_CHARS:
+                    result = f"{result[:TRANSCRIPT_TOOL_CHARS]}... (+{len(result) - TRANSCRIPT_TOOL_CHARS} chars)"
+                lines.append(f"[tool result] {result}")
+    return "\n".join(lines)
+
+
+def _query_result_stub(tool_use: dict, tool_result: dict) -> str:
+    """Build the stub of an execute_sql_query or recall_query_result result."""
+    text = "\n".join(item["text"] for item in tool_result.get("content", []) if "text" in item)
+    metadata = next((item["json"] for item in tool_result.get("content", []) if "json" in item), {})
+
+    lines = [ELIDED_RESULT_PREFIX]
+    tool_input = tool_use.get("input", {})
+    if tool_input.get("sql_query"):
+        lines.append(f"SQL Query: {tool_input['sql_query']}")
+
+    query_execution_id = metadata.get("query_execution_id")
+    if not query_execution_id:
+        # Sessions saved before results carried metadata only have the text
+        match = QUERY_EXECUTION_ID_PATTERN.search(text)
+        query_execution_id = match.group(1) if match else tool_input.get("query_execution_id")
+    if query_execution_id:
+        lines.append(f"Query Execution ID: {query_execution_id}")
+
+    if "row_count" in metadata:
+        more = " or more" if metadata.get("more_rows") else ""
+        lines.append(f"Rows: {metadata['row_count']}{more}")
+    else:
+        match = ROW_COUNT_PATTERN.search(text)
+        if match:
+            lines.append(f"Rows: {match.group(2)}{' or more' if match.group(1) else ''}")
+    if metadata.get("columns"):
+        lines.append(f"Columns: {', '.join(metadata['columns'])}")
+
+    if query_execution_id:
+        lines.append("Use recall_query_result with this query_execution_id to read the rows again.")
+    return "\n".join(lines)
+
+
+def _chart_result_stub(tool_use: dict, tool_result: dict) -> str:
+    """Build the stub of an execute_chart_code result."""
+    text = "\n".join(item["text"] for item in tool_result.get("content", []) if "text" in item)
+    description = tool_use.get("input", {}).get("description") or "chart"
+    chart_count = len(CHART_URL_PATTERN.findall(text))
+    return (
+        f"{ELIDED_RESULT_PREFIX}\nexecute_chart_code ({description}) generated {chart_count} chart(s). "
+        "The chart URLs were removed from this result; refer to the charts in your earlier answer."
+    )
+
+
+def elide_tool_results(messages: list, keep_from: int) -> list:
+    """
+    Replace large tool results before keep_from with compact stubs.
+
+    Query results keep the SQL text, query_execution_id, row count and column list,
+    so the agent can re-read the rows with recall_query_result when it needs them.
+    Chart results keep the chart description and count. Small results are kept as they are.
+    The messages are not modified; changed messages are copied.
+
+    Args:
+        messages: The list of message dictionaries
+        keep_from: Index of the first message whose tool results are kept verbatim
+
+    Returns:
+        The messages with old tool results replaced
+    """
+    tool_uses = {}
+    for message in messages:
+        for content_item in message.get("content", []):
+            if "toolUse" in content_item:
+                tool_uses[content_item["toolUse"].get("toolUseId")] = content_item["toolUse"]
+
+    elided = []
+    for index, message in enumerate(messages):
+        if index >= keep_from or not any("toolResult" in item for item in message.get("content", [])):
+            elided.append(message)
+            continue
+
+        contents = []
+        for content_item in message.get("content", []):
+            tool_result = content_item.get("toolResult")
+            tool_use = tool_uses.get(tool_result.get("toolUseId")) if tool_result else None
+            if not tool_use or tool_result.get("status") == "error":
+                contents.append(content_item)
+                continue
+
+            size = sum(len(json.dumps(item, ensure_ascii=False, default=str)) for item in tool_result.get("content", []))
+            texts = [item.get("text", "") for item in tool_result.get("content", [])]
+            if size < ELIDE_MIN_CHARS or any(text.startswith(ELIDED_RESULT_PREFIX) for text in texts):
+                contents.append(content_item)
+            elif tool_use.get("name") in ELIDED_QUERY_TOOLS:
+                stub = _query_result_stub(tool_use, tool_result)
+                contents.append({"toolResult": {**tool_result, "content": [{"text": stub}]}})
+            elif tool_use.get("name") in ELIDED_CHART_TOOLS:
+                stub = _chart_result_stub(tool_use, tool_result)
+                contents.append({"toolResult": {**tool_result, "content": [{"text": stub}]}})
+            else:
+                contents.append(content_item)
+        elided.append({**message, "content": contents})
+
+    return elided
+
+
 def set_session_connection(user_id: str, session_id: str, connection_id: str) -> bool:
     """
     セッションにWebSocket接続IDを設定する
@@ -94,6 +675,29 @@ def set_session_connection(user_id: str, session_id: str, connection_id: str) ->
         return False
 
 
+def mark_connection_stale(user_id: str, session_id: str, connection_id: str) -> None:
+    """
+    切断済み（GoneException）のWebSocket接続IDをセッションから削除する。
+    その間に再接続して別の接続IDが設定されている場合は何もしない。
+
+    Args:
+        user_id: ユーザーID
+        session_id: セッションID
+        connection_id: 切断済みのWebSocket接続ID
+    """
+    try:
+        session_table.update_item(
+            Key={"user_id": user_id, "session_id": session_id},
+            UpdateExpression="REMOVE connection_id",
+            ConditionExpression=Attr("connection_id").eq(connection_id),
+        )
+        logger.info(f"Marked connection {connection_id} of session {session_id} as stale")
+    except session_table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    except Exception as e:
+        logger.error(f"Error marking connection as stale: {str(e)}")
+
+
 def get_active_connection_id(user_id: str, session_id: str) -> str:
     """
     指定されたuser_idとsession_idに関連付けられた最新のconnection_idを取得する
@@ -106,7 +710,7 @@ def get_active_connection_id(user_id: str, session_id: str) -> str:
         最新のconnection_id、または見つからない場合はNone
     """
     try:
-        response = session_table.get_item(Key={"user_id": user_id, "session_id": session_id})
+        response = session_table.get_item(Key={"user_id": user_id, "session_id": session_id}, ProjectionExpression="connection_id")
 
         if "Item" in response and "connection_id" in response["Item"]:
             return response["Item"]["connection_id"]
@@ -117,6 +721,21 @@ def get_active_connection_id(user_id: str, session_id: str) -> str:
         return None
 
 
+def delete_session_payload(user_id: str, session_id: str) -> None:
+    """
+    Delete the turn items and S3 chunks of a session. Call this when the session header item is deleted.
+
+    Args:
+        user_id: The ID of the user
+        session_id: The ID of the session
+    """
+    with session_table.batch_writer() as batch:
+        for turn in iter_turn_items(user_id, session_id):
+            batch.delete_item(Key={"user_id": turn["user_id"], "session_id": turn["session_id"]})
+    if payload_store:
+        payload_store.delete_session(user_id, session_id)
+
+
 def remove_thinking_tags(text: str) -> str:
     """
     Remove <thinking> tags and their content from text for client display.
@@ -145,26 +764,75 @@ def remove_thinking_tags(text: str) -> str:
     return cleaned_text
 
 
-def filter_messages_for_response(messages, chart_image_urls=None):
+def chart_message(chart: dict) -> dict:
+    """
+    Build the image message of a chart.
+    Charts of the current turn carry their presigned URL; charts of earlier turns are references
+    (an empty content) with their S3 key, which presign_chart_references turns into a URL when they are sent.
+    """
+    if chart.get("url"):
+        return {"role": "image", "content": [{"text": chart["url"]}], "chart": {"sha256": chart["sha256"]}}
+    return {"role": "image", "content": [], "chart": {"sha256": chart["sha256"], "key": chart["key"]}}
+
+
+def presign_chart_references(messages: list) -> list:
+    """
+    Give the chart references among messages a fresh presigned URL of their S3 key.
+    This is done on the messages being sent, not on cached views, so the URLs are never older than the response.
+    References that cannot be presigned are left empty; the client resolves them by sha256 from the charts it shows.
+
+    Args:
+        messages: The messages to send (e.g., a page of the session view or a history delta)
+
+    Returns:
+        The messages, with the chart references replaced by copies without their key
+    """
+    urls = {}
+    presigned = []
+    for message in messages:
+        chart = message.get("chart") or {}
+        key = chart.get("key")
+        if not key:
+            presigned.append(message)
+            continue
+        if key not in urls:
+            urls[key] = None
+            if CHART_IMAGE_BUCKET:
+                try:
+                    urls[key] = s3.generate_presigned_url(
+                        "get_object", Params={"Bucket": CHART_IMAGE_BUCKET, "Key": key}, ExpiresIn=STORED_CHART_URL_EXPIRES_SECONDS
+                    )
+                except Exception as e:
+                    logger.warning(f"Error presigning chart {key}: {str(e)}")
+        content = [{"text": urls[key]}] if urls[key] else []
+        presigned.append({**message, "content": content, "chart": {"sha256": chart["sha256"]}})
+    return presigned
+
+
+def filter_messages_for_response(messages, charts=None):
     """
     Filter and process messages for client response, maintaining original message order.
 
     This function processes the conversation messages and handles special cases:
     - Keeps regular conversation messages
     - Converts downloadable URL tool results to special URL messages
-    - Appends chart image URLs as special image messages
+    - Adds chart image messages after the turn that generated them
     - Filters out other tool use and tool result messages
     - Removes <thinking> tags from message content for clean client display
 
     Args:
         messages: List of message dictionaries from the conversation
-        chart_image_urls: Optional list of presigned URLs for chart images
+        charts: Optional list of charts; charts with a "turn" are references to the charts of that stored turn,
+            charts without one belong to the current (last) turn and carry their "url"
 
     Returns:
         List of filtered messages in their original order
     """
     filtered_messages = []
     tool_use_map = {}
+    charts_by_turn = {}
+    for chart in charts or []:
+        charts_by_turn.setdefault(chart.get("turn"), []).append(chart)
 
     # First pass: identify all downloadable URL tool uses
     for message in messages:
@@ -175,9 +843,15 @@ def filter_messages_for_response(messages, chart_image_urls=None):
                     tool_use_map[tool_use_id] = True
 
     # Second pass: process messages in original order
+    turn = -1
     for message in messages:
         contents = message.get("content", [])
 
+        # The charts of a turn follow its last message
+        if is_turn_start(message):
+            filtered_messages.extend(chart_message(chart) for chart in charts_by_turn.pop(turn, []))
+            turn += 1
+
         # Check if this is a regular message (no tool use/result)
         if all("toolUse" not in item and "toolResult" not in item for item in contents):
             # Clean the message content by removing <thinking> tags
@@ -205,9 +879,32 @@ def filter_messages_for_response(messages, chart_image_urls=None):
                 filtered_messages.append({"role": "url", "content": [{"text": url_text}]})
                 break
 
-    # Append chart image URLs as special image messages
-    if chart_image_urls:
-        for url in chart_image_urls:
-            filtered_messages.append({"role": "image", "content": [{"text": url}]})
+    # The charts of the last stored turn and of the current turn come last
+    for chart_turn in sorted(charts_by_turn, key=lambda chart_turn: (chart_turn is None, chart_turn or 0)):
+        filtered_messages.extend(chart_message(chart) for chart in charts_by_turn[chart_turn])
 
     return filtered_messages
+
+
+def history_delta(filtered_messages: list, last_seq=None) -> dict:
+    """
+    Select the messages of the filtered conversation that a client has not seen yet.
+
+    The filtered conversation only grows at its end (turns are appended and the charts of a turn are
+    placed right after it), so the 1-based position of a message is its sequence number in the session.
+    The client sends the last sequence number it has; an unknown or missing number gets the whole conversation.
+
+    Args:
+        filtered_messages: The messages from filter_messages_for_response
+        last_seq: The sequence number of the last message the client has
+
+    Returns:
+        A dictionary containing:
+        - base_seq: The sequence number the messages follow (0 if they are the whole conversation)
+        - last_seq: The sequence number of the last message of the conversation
+        - messages: The messages after base_seq, each with its "seq"
+    """
+    count = len(filtered_messages)
+    base_seq = last_seq if type(last_seq) is int and 0 <= last_seq <= count else 0
+    messages = [{**message, "seq": base_seq + offset + 1} for offset, message in enumerate(filtered_messages[base_seq:])]
+    return {"base_seq": base_seq, "last_seq": count, "messages": messages}
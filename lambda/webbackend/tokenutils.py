@@ -0,0 +1,17 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of model tokens in a text without calling a tokenizer.
+    ASCII text averages about 4 characters per token, while Japanese and other
+    non-ASCII characters are counted as about one token each.
+
+    Args:
+        text: The text to estimate
+
+    Returns:
+        The estimated token count
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    ascii_chars = len(text) - non_ascii
+    return (ascii_chars + 3) // 4 + non_ascii
@@ -4,10 +4,13 @@ import logging
 import os
 from datetime import datetime
 from sessionutils import (
-    get_conversation_history,
     filter_messages_for_response,
+    get_session_state,
+    history_delta,
+    presign_chart_references,
     set_session_connection,
 )
+from websocket_push import post_to_connection
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -142,6 +145,7 @@ def handle_chat(event, connection_id):
                     "session_id": session_id,
                     "message": user_input,
                     "api_gateway_endpoint": api_gateway_endpoint,
+                    "last_seq": body.get("last_seq"),
                 }
             ),
         )
@@ -178,6 +182,7 @@ def handle_ping(connection_id, event):
 def handle_fetch_history(event, connection_id):
     """
     会話履歴を取得するためのハンドラー
+    クライアントが持っている最後のメッセージのlast_seqが送られた場合は、それより新しいメッセージのみを返す
     """
     try:
         # メッセージボディを解析
@@ -193,18 +198,26 @@ def handle_fetch_history(event, connection_id):
 
         logger.info(f"Fetching conversation history for user_id={user_id}, session_id={session_id}")
 
-        # 会話履歴を取得
-        conversation_history = get_conversation_history(user_id, session_id)
+        # 会話履歴とチャートの記録を取得
+        session_state = get_session_state(user_id, session_id)
 
-        # フィルタリングされた会話履歴を取得
-        filtered_history = filter_messages_for_response(conversation_history)
+        # フィルタリングされた会話履歴のうち、クライアントが持っていないメッセージを取得
+        delta = history_delta(filter_messages_for_response(session_state["messages"], session_state["charts"]), body.get("last_seq"))
 
         api_gateway_endpoint = get_api_endpoint(event)
 
         # 会話履歴を送信
         send_to_connection(
             connection_id,
-            {"type": "history", "user_id": user_id, "session_id": session_id, "conversation_history": filtered_history},
+            {
+                "type": "history",
+                "user_id": user_id,
+                "session_id": session_id,
+                # 以前のターンのチャートはS3キーから署名付きURLを発行して送る
+                "conversation_history": presign_chart_references(delta["messages"]),
+                "base_seq": delta["base_seq"],
+                "last_seq": delta["last_seq"],
+            },
             api_gateway_endpoint,
         )
 
@@ -241,10 +254,8 @@ def send_to_connection(connection_id, data, api_gateway_endpoint):
         logger.error(f"No API Gateway endpoint provided for connection {connection_id}")
         return
 
-    gateway_api = boto3.client("apigatewaymanagementapi", endpoint_url=api_gateway_endpoint)
-
     try:
-        gateway_api.post_to_connection(ConnectionId=connection_id, Data=json.dumps(data).encode("utf-8"))
-        logger.info(f"Message sent to connection {connection_id}: {json.dumps(data)}")
+        if post_to_connection(api_gateway_endpoint, connection_id, data):
+            logger.info(f"Message sent to connection {connection_id}: {json.dumps(data)}")
     except Exception as e:
         logger.error(f"Error sending message to connection {connection_id}: {str(e)}")
@@ -0,0 +1,235 @@
+import boto3
+import json
+import logging
+import queue
+import threading
+import uuid
+from botocore.config import Config
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Management API clients are created once per endpoint and reused by warm invocations,
+# keeping their HTTP connections open between posts
+CLIENT_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=10,
+    connect_timeout=2,
+    read_timeout=5,
+    retries={"max_attempts": 3, "mode": "standard"},
+)
+
+# Messages up to COALESCE_MAX_BYTES that are queued behind each other are sent in one post,
+# as {"type": "batch", "messages": [...]} frames of up to MAX_FRAME_BYTES
+COALESCE_MAX_BYTES = 4 * 1024
+MAX_FRAME_BYTES = 32 * 1024
+
+# Messages larger than MAX_FRAME_BYTES (e.g., a long conversation history) are sent as ordered
+# {"type": "chunk", "chunk_id", "index", "count", "data"} frames that the client joins and parses.
+# The JSON text is ASCII and escaping at most doubles it, so each chunk stays within MAX_FRAME_BYTES.
+CHUNK_DATA_CHARS = (MAX_FRAME_BYTES - 256) // 2
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_management_client(endpoint: str):
+    """
+    Get the API Gateway management API client of a WebSocket endpoint.
+
+    Args:
+        endpoint: The API Gateway endpoint URL (https://{domain}/{stage})
+
+    Returns:
+        The cached boto3 apigatewaymanagementapi client
+    """
+    with _clients_lock:
+        if endpoint not in _clients:
+            _clients[endpoint] = boto3.client("apigatewaymanagementapi", endpoint_url=endpoint, config=CLIENT_CONFIG)
+        return _clients[endpoint]
+
+
+def encode_message(data) -> bytes:
+    return json.dumps(data).encode("utf-8")
+
+
+def encode_frames(data) -> list:
+    """
+    Encode a message as the frames to post: the message itself, or its chunks if it exceeds MAX_FRAME_BYTES.
+
+    Args:
+        data: The data to send (will be converted to JSON)
+
+    Returns:
+        The encoded frames, in the order they must be posted
+    """
+    text = json.dumps(data)
+    if len(text) <= MAX_FRAME_BYTES:
+        return [text.encode("utf-8")]
+    chunk_id = uuid.uuid4().hex
+    pieces = [text[start : start + CHUNK_DATA_CHARS] for start in range(0, len(text), CHUNK_DATA_CHARS)]
+    logger.info(f"Splitting a {len(text)} byte message into {len(pieces)} chunks")
+    return [
+        encode_message({"type": "chunk", "chunk_id": chunk_id, "index": index, "count": len(pieces), "data": piece})
+        for index, piece in enumerate(pieces)
+    ]
+
+
+def post_to_connection(endpoint: str, connection_id: str, data) -> bool:
+    """
+    Send one message to a WebSocket connection (in chunks if it is large).
+
+    Args:
+        endpoint: The API Gateway endpoint URL
+        connection_id: The WebSocket connection ID
+        data: The data to send (will be converted to JSON)
+
+    Returns:
+        False if the connection is gone, True otherwise
+    """
+    client = get_management_client(endpoint)
+    try:
+        for frame in encode_frames(data):
+            client.post_to_connection(ConnectionId=connection_id, Data=frame)
+        return True
+    except client.exceptions.GoneException:
+        logger.warning(f"Connection {connection_id} is gone")
+        return False
+
+
+def _merge_stream_frame(batch: list, data: dict) -> bool:
+    """Append the delta of a stream frame to the previous frame of the batch if it continues the same segment."""
+    if not batch or data.get("type") != "stream":
+        return False
+    previous = batch[-1]
+    if previous.get("type") != "stream" or previous.get("session_id") != data.get("session_id") or previous.get("segment") != data.get("segment"):
+        return False
+    batch[-1] = {**previous, "delta": previous["delta"] + data["delta"]}
+    return True
+
+
+def coalesce_messages(messages: list) -> list:
+    """
+    Combine consecutive small messages into batch frames.
+    Consecutive stream frames of the same segment are merged into one frame.
+
+    Args:
+        messages: The queued message dictionaries, in order
+
+    Returns:
+        The encoded frames to post, in order
+    """
+    frames = []
+    batch = []
+    batch_bytes = 0
+
+    def flush_batch():
+        nonlocal batch, batch_bytes
+        if len(batch) == 1:
+            frames.append(encode_message(batch[0]))
+        elif batch:
+            frames.append(encode_message({"type": "batch", "messages": batch}))
+        batch = []
+        batch_bytes = 0
+
+    for data in messages:
+        size = len(encode_message(data))
+        if size > COALESCE_MAX_BYTES:
+            flush_batch()
+            frames.extend(encode_frames(data))
+            continue
+        if batch_bytes + size > MAX_FRAME_BYTES:
+            flush_batch()
+        if not _merge_stream_frame(batch, data):
+            batch.append(data)
+        batch_bytes += size
+    flush_batch()
+    return frames
+
+
+class ConnectionPusher:
+    """
+    Sends messages to one WebSocket connection from a background thread.
+
+    push() only queues the message, so the agent's model stream and tools are never held up by a post.
+    While a post is in flight the next messages queue up, and they are sent together in the next post
+    (see coalesce_messages), so the number of posts adapts to the post latency without delaying
+    a message that arrives while the connection is idle.
+
+    When API Gateway reports the connection as gone, the remaining messages are dropped and
+    on_gone() is called once (e.g., to remove the connection from the session).
+    """
+
+    def __init__(self, client, connection_id: str, on_gone=None):
+        self.client = client
+        self.connection_id = connection_id
+        self.on_gone = on_gone
+        self.gone = False
+        self.posts = 0
+        self.messages = 0
+        self.closed = False
+        self.queue = queue.Queue()
+        self.sender = threading.Thread(target=self._send_queued, daemon=True)
+        self.sender.start()
+
+    def push(self, data) -> None:
+        """
+        Queue a message for the connection.
+
+        Args:
+            data: The data to send (will be converted to JSON)
+        """
+        if not self.gone and not self.closed:
+            self.queue.put(data)
+
+    def _post(self, frame: bytes) -> bool:
+        if self.gone:
+            return False
+        try:
+            self.client.post_to_connection(ConnectionId=self.connection_id, Data=frame)
+            self.posts += 1
+            return True
+        except self.client.exceptions.GoneException:
+            logger.warning(f"Connection {self.connection_id} is gone, dropping its messages")
+            self.gone = True
+            if self.on_gone:
+                self.on_gone()
+            return False
+        except Exception as e:
+            logger.error(f"Error sending message to connection {self.connection_id}: {str(e)}")
+            return False
+
+    def _send_queued(self) -> None:
+        while True:
+            messages = [self.queue.get()]
+            while True:
+                try:
+                    messages.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Keep the thread alive on any error (e.g., a message that is not JSON serializable),
+            # so that the later messages are still sent and close() does not wait for its timeout
+            try:
+                pending = [data for data in messages if data is not None]
+                self.messages += len(pending)
+                for frame in coalesce_messages(pending):
+                    self._post(frame)
+            except Exception as e:
+                logger.error(f"Error sending queued messages to connection {self.connection_id}: {str(e)}")
+            if None in messages:
+                break
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Send the queued messages and stop the background thread.
+
+        Args:
+            timeout: The maximum number of seconds to wait for the queued messages
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.sender.join(timeout)
+        logger.info(f"Connection {self.connection_id}: {self.messages} messages in {self.posts} posts")
@@ -1,4 +1,6 @@
 import * as cdk from 'aws-cdk-lib';
+import * as lambda from 'aws-cdk-lib/aws-lambda';
+import { PythonLayerVersion } from '@aws-cdk/aws-lambda-python-alpha';
 import { Construct } from 'constructs';
 import { DataStorage } from './data-storage';
 import { EntityResolutionService } from './entity-resolution-service';
@@ -26,6 +28,12 @@ export class AmtC360MarketingStack extends cdk.Stack {
       personalizeEnabled: props.personalizeEnabled
     });
 
+    // Athena query helpers (athena_executor) shared by the Lambda functions that run Athena queries
+    const athenaExecutorLayer = new PythonLayerVersion(this, 'AthenaExecutorLayer', {
+      entry: 'lambda/layers/athena_executor',
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_13]
+    });
+
     // Create Entity Resolution
 
     const entityResolutionService = props.entityResolutionEnabled
@@ -49,7 +57,8 @@ export class AmtC360MarketingStack extends cdk.Stack {
       entityResolutionService,
       dataStorage,
       personalizeService,
-      personalizeStore
+      personalizeStore,
+      athenaExecutorLayer
     });
 
     // Create personalize segment workflow
@@ -59,7 +68,8 @@ export class AmtC360MarketingStack extends cdk.Stack {
         ? new PersonalizeSegmentWorkflow(this, 'PersonalizeSegmentWorkflow', {
             dataStorage,
             personalizeService,
-            personalizeStore
+            personalizeStore,
+            athenaExecutorLayer
           })
         : undefined;
 
@@ -68,6 +78,7 @@ export class AmtC360MarketingStack extends cdk.Stack {
       dataStorage: dataStorage,
       personalizeSegmentWorkflow: personalizeSegmentWorkflow,
       personalizeStore: personalizeStore,
+      athenaExecutorLayer: athenaExecutorLayer,
       allowOrigin: props.allowOrigin
     });
 
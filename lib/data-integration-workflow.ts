@@ -18,6 +18,7 @@ export interface DataIntegrationWorkflowProps {
   dataStorage: DataStorage;
   personalizeService?: PersonalizeService;
   personalizeStore?: PersonalizeStore;
+  athenaExecutorLayer: lambda.ILayerVersion;
 }
 
 /**
@@ -32,7 +33,7 @@ export class DataIntegrationWorkflow extends Construct {
   constructor(scope: Construct, id: string, props: DataIntegrationWorkflowProps) {
     super(scope, id);
 
-    const { entityResolutionService, dataStorage, personalizeService, personalizeStore } = props;
+    const { entityResolutionService, dataStorage, personalizeService, personalizeStore, athenaExecutorLayer } = props;
 
     // 両方のサービスがない場合は何も作成しない
     if (!entityResolutionService && !(personalizeService && personalizeStore)) {
@@ -163,6 +164,7 @@ export class DataIntegrationWorkflow extends Construct {
         runtime: lambda.Runtime.PYTHON_3_13,
         entry: 'lambda/create_personalize_dataset_import_job',
         timeout: cdk.Duration.minutes(15),
+        layers: [athenaExecutorLayer],
         environment: {
           DATASET_ARN: personalizeService.interactionDataset.attrDatasetArn,
           OUTPUT_BUCKET: personalizeService.segmentOutputBucket.bucketName,
@@ -181,6 +183,7 @@ export class DataIntegrationWorkflow extends Construct {
             'athena:StartQueryExecution',
             'athena:GetQueryExecution',
             'athena:GetQueryResults',
+            'athena:StopQueryExecution',
             'glue:GetTable',
             'glue:GetPartitions',
             'glue:GetDatabase'
@@ -16,6 +16,7 @@ export interface PersonalizeSegmentWorkflowProps {
   dataStorage: DataStorage;
   personalizeService: PersonalizeService;
   personalizeStore: PersonalizeStore;
+  athenaExecutorLayer: lambda.ILayerVersion;
 }
 
 /**
@@ -34,13 +35,14 @@ export class PersonalizeSegmentWorkflow extends Construct {
   constructor(scope: Construct, id: string, props: PersonalizeSegmentWorkflowProps) {
     super(scope, id);
 
-    const { dataStorage, personalizeService, personalizeStore } = props;
+    const { dataStorage, personalizeService, personalizeStore, athenaExecutorLayer } = props;
 
     // Personalizeセグメント作成用のLambda関数を作成
     this.createPersonalizeSegmentFunction = new PythonFunction(this, 'CreatePersonalizeSegment', {
       runtime: lambda.Runtime.PYTHON_3_13,
       entry: 'lambda/create_personalize_segment',
       timeout: cdk.Duration.minutes(15),
+      layers: [athenaExecutorLayer],
       environment: {
         DATASET_GROUP_ARN: personalizeService.datasetGroup.attrDatasetGroupArn,
         DATASET_ARN: personalizeService.interactionDataset.attrDatasetArn,
@@ -73,6 +75,7 @@ export class PersonalizeSegmentWorkflow extends Construct {
           'athena:StartQueryExecution',
           'athena:GetQueryExecution',
           'athena:GetQueryResults',
+          'athena:StopQueryExecution',
           'glue:GetTable',
           'glue:GetPartitions',
           'glue:GetDatabase'
@@ -3,6 +3,7 @@ import { Construct } from 'constructs';
 import * as lambda from 'aws-cdk-lib/aws-lambda';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as iam from 'aws-cdk-lib/aws-iam';
+import * as s3 from 'aws-cdk-lib/aws-s3';
 import * as apigatewayv2 from 'aws-cdk-lib/aws-apigatewayv2';
 import * as apigatewayv2_integrations from 'aws-cdk-lib/aws-apigatewayv2-integrations';
 import * as apigatewayv2_authorizers from 'aws-cdk-lib/aws-apigatewayv2-authorizers';
@@ -20,6 +21,7 @@ interface WebBackendProps {
   dataStorage: DataStorage;
   personalizeSegmentWorkflow?: PersonalizeSegmentWorkflow;
   personalizeStore?: PersonalizeStore;
+  athenaExecutorLayer: lambda.ILayerVersion;
 }
 
 export class WebBackend extends Construct {
@@ -27,6 +29,7 @@ export class WebBackend extends Construct {
   public readonly websocketHandler: PythonFunction;
   public readonly restApiHandler: PythonFunction;
   public readonly sessionTable: dynamodb.Table;
+  public readonly sessionPayloadBucket: s3.Bucket;
   public readonly cognito: Cognito;
   public readonly webSocketApi: apigatewayv2.WebSocketApi;
   public readonly webSocketStage: apigatewayv2.WebSocketStage;
@@ -43,14 +46,34 @@ export class WebBackend extends Construct {
       removalPolicy: cdk.RemovalPolicy.DESTROY // For development only, use RETAIN for production
     });
 
+    // Session list of a user, newest first. Only session headers have last_updated, so turn items are not indexed.
+    this.sessionTable.addGlobalSecondaryIndex({
+      indexName: 'LastUpdatedIndex',
+      partitionKey: { name: 'user_id', type: dynamodb.AttributeType.STRING },
+      sortKey: { name: 'last_updated', type: dynamodb.AttributeType.NUMBER },
+      projectionType: dynamodb.ProjectionType.INCLUDE,
+      nonKeyAttributes: ['title', 'message_count']
+    });
+
+    // S3 bucket for the messages of large sessions (the session item keeps only the chunk references)
+    this.sessionPayloadBucket = new s3.Bucket(this, 'SessionPayloadBucket', {
+      blockPublicAccess: s3.BlockPublicAccess.BLOCK_ALL,
+      encryption: s3.BucketEncryption.S3_MANAGED,
+      enforceSSL: true,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+      autoDeleteObjects: true
+    });
+
     // Agent processor Lambda function (for async processing)
     const envs: any = {
       SESSION_TABLE: this.sessionTable.tableName,
       DDB_SESSION_TABLE: this.sessionTable.tableName,
+      SESSION_PAYLOAD_BUCKET: this.sessionPayloadBucket.bucketName,
       ATHENA_DATABASE: props.dataStorage.glueDatabase.databaseName,
       ATHENA_OUTPUT_LOCATION: `s3://${props.dataStorage.athenaResultBucket.bucketName}/athena-results/`,
       ATHENA_WORKGROUP: 'primary',
-      CODE_INTERPRETER_REGION: 'us-west-2'
+      CODE_INTERPRETER_REGION: 'us-west-2',
+      CHART_IMAGE_BUCKET: props.dataStorage.athenaResultBucket.bucketName
     };
     if (props.personalizeSegmentWorkflow && props.personalizeStore) {
       envs['SEGMENT_STATE_MACHINE_ARN'] = props.personalizeSegmentWorkflow.stateMachine.stateMachineArn;
@@ -63,6 +86,7 @@ export class WebBackend extends Construct {
       handler: 'handler',
       timeout: cdk.Duration.minutes(15),
       environment: envs,
+      layers: [props.athenaExecutorLayer],
       memorySize: 512
     });
 
@@ -75,6 +99,8 @@ export class WebBackend extends Construct {
       timeout: cdk.Duration.seconds(60),
       environment: {
         SESSION_TABLE: this.sessionTable.tableName,
+        SESSION_PAYLOAD_BUCKET: this.sessionPayloadBucket.bucketName,
+        CHART_IMAGE_BUCKET: props.dataStorage.athenaResultBucket.bucketName,
         AGENT_PROCESSOR_FUNCTION_NAME: this.agentProcessor.functionName
       }
     });
@@ -82,6 +108,10 @@ export class WebBackend extends Construct {
     // Grant permissions to the Lambda functions
     this.sessionTable.grantReadWriteData(this.websocketHandler);
     this.sessionTable.grantReadWriteData(this.agentProcessor);
+    this.sessionPayloadBucket.grantRead(this.websocketHandler);
+    this.sessionPayloadBucket.grantReadWrite(this.agentProcessor);
+    // Stored charts are presigned when the history is fetched
+    props.dataStorage.athenaResultBucket.grantRead(this.websocketHandler, 'chart-images/*');
 
     props.dataStorage.athenaResultBucket.grantReadWrite(this.agentProcessor);
 
@@ -145,12 +175,18 @@ export class WebBackend extends Construct {
       timeout: cdk.Duration.seconds(30),
       environment: {
         SESSION_TABLE: this.sessionTable.tableName,
+        SESSION_PAYLOAD_BUCKET: this.sessionPayloadBucket.bucketName,
+        CHART_IMAGE_BUCKET: props.dataStorage.athenaResultBucket.bucketName,
+        SESSION_RECENCY_INDEX: 'LastUpdatedIndex',
         ALLOW_ORIGIN: props.allowOrigin
       }
     });
 
     // セッションテーブルへの読み書き権限を付与
     this.sessionTable.grantReadWriteData(this.restApiHandler);
+    this.sessionPayloadBucket.grantReadWrite(this.restApiHandler);
+    // 保存済みのチャートの署名付きURLを発行するため、チャート画像の読み取り権限を付与
+    props.dataStorage.athenaResultBucket.grantRead(this.restApiHandler, 'chart-images/*');
 
     // Create Cognito resources
     this.cognito = new Cognito(this, 'Cognito');
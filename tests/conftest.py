@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "webbackend"))
+
+os.environ.setdefault("SESSION_TABLE", "test-sessions")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
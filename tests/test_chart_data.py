@@ -0,0 +1,51 @@
+import io
+
+from chart_data import load_query_results
+
+
+class FakeBody:
+    """A StreamingBody over bytes."""
+
+    def __init__(self, data: bytes):
+        self.stream = io.BytesIO(data)
+
+    def iter_chunks(self, chunk_size: int):
+        while chunk := self.stream.read(chunk_size):
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class FakeS3:
+    def __init__(self, objects: dict):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        return {"Body": FakeBody(self.objects[Key])}
+
+
+class FakeCodeInterpreter:
+    def __init__(self):
+        self.files = []
+
+    def invoke_code_interpreter(self, **kwargs):
+        self.files.extend(kwargs["arguments"]["content"])
+        return {"stream": []}
+
+
+def source(query_execution_id: str) -> dict:
+    return {"query_execution_id": query_execution_id, "bucket": "results", "key": f"{query_execution_id}.csv"}
+
+
+def test_load_query_results_skips_a_result_whose_first_line_exceeds_the_limit():
+    s3 = FakeS3({"wide.csv": b"a" * 200 + b"\n1\n", "small.csv": b"month,orders\n1,10\n2,20\n"})
+    client = FakeCodeInterpreter()
+
+    loader_code, notes = load_query_results(client, "session", s3, [source("wide"), source("small")], 64, 100)
+
+    assert [file["path"] for file in client.files] == ["query_results/small.part0000"]
+    assert "wide" not in loader_code
+    assert 'df = dfs["small"]' in loader_code
+    assert notes[0].startswith('dfs["wide"]: not loaded') and "too large to load" in notes[0]
+    assert notes[1].startswith('dfs["small"]: result of query small')
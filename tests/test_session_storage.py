@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+from session_storage import restore_numbers
+
+
+def test_restore_numbers_converts_integral_decimals_to_int():
+    value = restore_numbers(Decimal("1200"))
+    assert value == 1200
+    assert type(value) is int
+
+
+def test_restore_numbers_converts_fractional_decimals_to_float():
+    value = restore_numbers(Decimal("0.25"))
+    assert value == 0.25
+    assert type(value) is float
+
+
+def test_restore_numbers_walks_nested_messages():
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "toolResult": {
+                        "toolUseId": "tooluse_1",
+                        "status": "success",
+                        "content": [{"json": {"row_count": Decimal("1"), "more_rows": False, "columns": ["_col0"]}}],
+                    }
+                }
+            ],
+        }
+    ]
+
+    restored = restore_numbers(messages)
+
+    metadata = restored[0]["content"][0]["toolResult"]["content"][0]["json"]
+    assert metadata == {"row_count": 1, "more_rows": False, "columns": ["_col0"]}
+    assert type(metadata["row_count"]) is int
+
+
+def test_restore_numbers_keeps_other_values():
+    value = {"text": "1200", "flag": True, "missing": None, "ratio": 0.5}
+    assert restore_numbers(value) == value
@@ -0,0 +1,145 @@
+import hashlib
+import json
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+import sessionutils  # noqa: E402
+from sessionutils import (  # noqa: E402
+    elide_tool_results,
+    extract_chart_records,
+    filter_messages_for_response,
+    load_messages,
+    presign_chart_references,
+)
+
+# A turn with a small query result, which elide_tool_results keeps verbatim when it is replayed
+TURN = [
+    {"role": "user", "content": [{"text": "How many customers are there?"}]},
+    {
+        "role": "assistant",
+        "content": [{"toolUse": {"toolUseId": "tooluse_1", "name": "execute_sql_query", "input": {"sql_query": "SELECT count(*) FROM customers"}}}],
+    },
+    {
+        "role": "user",
+        "content": [
+            {
+                "toolResult": {
+                    "toolUseId": "tooluse_1",
+                    "status": "success",
+                    "content": [
+                        {"text": "Results: 1 rows returned\n\n_col0\n1200\n\nQuery Execution ID: qid-1"},
+                        {"json": {"query_execution_id": "qid-1", "row_count": 1, "more_rows": False, "columns": ["_col0"]}},
+                    ],
+                }
+            }
+        ],
+    },
+    {"role": "assistant", "content": [{"text": "There are 1,200 customers."}]},
+]
+NEXT_INPUT = {"role": "user", "content": [{"text": "And how many of them ordered last month?"}]}
+
+
+def through_dynamodb(messages: list) -> list:
+    """Convert messages to DynamoDB attribute values and back, as saving and loading a turn item does."""
+    attribute = TypeSerializer().serialize(json.loads(json.dumps(messages), parse_float=Decimal))
+    return TypeDeserializer().deserialize(attribute)
+
+
+def contains_decimal(value) -> bool:
+    if isinstance(value, Decimal):
+        return True
+    if isinstance(value, dict):
+        return any(contains_decimal(item) for item in value.values())
+    if isinstance(value, list):
+        return any(contains_decimal(item) for item in value)
+    return False
+
+
+def test_stored_messages_come_back_as_decimal():
+    assert contains_decimal(through_dynamodb(TURN))
+
+
+def test_load_messages_restores_the_saved_turn():
+    loaded = load_messages({"messages": through_dynamodb(TURN)})
+
+    assert loaded == TURN
+    assert not contains_decimal(loaded)
+
+
+def test_load_messages_restores_a_range():
+    loaded = load_messages({"messages": through_dynamodb(TURN)}, 2, 3)
+
+    assert loaded == TURN[2:3]
+    assert type(loaded[0]["content"][0]["toolResult"]["content"][1]["json"]["row_count"]) is int
+
+
+def test_replayed_history_passes_bedrock_validation():
+    botocore_session = pytest.importorskip("botocore.session")
+    validate = pytest.importorskip("botocore.validate")
+
+    loaded = load_messages({"messages": through_dynamodb(TURN)})
+    replayed = elide_tool_results(loaded, len(loaded)) + [NEXT_INPUT]
+
+    client = botocore_session.get_session().create_client(
+        "bedrock-runtime", region_name="us-west-2", aws_access_key_id="test", aws_secret_access_key="test"
+    )
+    shape = client.meta.service_model.operation_model("ConverseStream").input_shape
+    report = validate.ParamValidator().validate({"modelId": "model", "messages": replayed}, shape)
+    assert not report.has_errors(), report.generate_report()
+
+
+def chart_turn(text: str) -> list:
+    """A turn whose execute_chart_code result has the given text."""
+    return [
+        {"role": "user", "content": [{"text": "Chart the monthly orders"}]},
+        {"role": "assistant", "content": [{"toolUse": {"toolUseId": "tooluse_2", "name": "execute_chart_code", "input": {"python_code": "..."}}}]},
+        {"role": "user", "content": [{"toolResult": {"toolUseId": "tooluse_2", "status": "success", "content": [{"text": text}]}}]},
+        {"role": "assistant", "content": [{"text": "Here is the chart."}]},
+    ]
+
+
+def test_extract_chart_records_from_legacy_urls():
+    digest = "ab" * 32
+    turn = chart_turn(
+        "Generated 2 chart(s):\n"
+        "Chart 1 URL: https://results.s3.amazonaws.com/chart-images/20240101_120000_1a2b3c4d.png?X-Amz-Expires=3600\n"
+        f"Chart 2 URL: https://s3.us-west-2.amazonaws.com/results/chart-images/{digest}.png?X-Amz-Expires=3600"
+    )
+
+    charts = extract_chart_records(3, turn)
+
+    legacy_key = "chart-images/20240101_120000_1a2b3c4d.png"
+    assert charts == [
+        {"turn": 3, "sha256": hashlib.sha256(legacy_key.encode("utf-8")).hexdigest(), "key": legacy_key},
+        {"turn": 3, "sha256": digest, "key": f"chart-images/{digest}.png"},
+    ]
+
+
+def test_extract_chart_records_ignores_other_tools():
+    assert extract_chart_records(0, TURN) == []
+    assert extract_chart_records(0, chart_turn("Code output (no charts generated):\n")) == []
+
+
+class FakeS3:
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+def test_presign_chart_references_gives_stored_charts_a_url(monkeypatch):
+    monkeypatch.setattr(sessionutils, "s3", FakeS3())
+    monkeypatch.setattr(sessionutils, "CHART_IMAGE_BUCKET", "results")
+    digest = "cd" * 32
+    view = filter_messages_for_response(TURN, [{"turn": 0, "sha256": digest, "key": f"chart-images/{digest}.png"}])
+
+    messages = presign_chart_references(view)
+
+    assert messages[-1] == {
+        "role": "image",
+        "content": [{"text": f"https://results.s3.amazonaws.com/chart-images/{digest}.png?X-Amz-Expires=900"}],
+        "chart": {"sha256": digest},
+    }
+    assert view[-1]["content"] == [] and "key" in view[-1]["chart"]